@@ -0,0 +1,193 @@
+#! python3
+"""
+Estimate how fights with every kind of enemy go, to tune the settings
+
+    python -m rhizome.balance --levels 0 1 2 3 --duels 200000
+
+For each level number, enemy kind and trait an enemy of that kind can
+roll, plays many duels between a fresh player and such an enemy and
+prints a table of how often the player wins, how much damage the player
+takes and how many turns the kill takes. The `(any)` row of each kind
+weighs its traits by how likely they are to be rolled.
+
+The enemies' stats come from the same archetypes the game spawns from,
+with each trait's bonus and the level's `scale` applied, and every blow
+follows `combat.roll_damage` and the same health clamp as `combat.resolve`.
+No level or ECS is built: the duels are played as NumPy arrays, a round
+at a time for all of them at once.
+
+A duel is the player and the enemy trading blows, the player first,
+until one of them is dead or `--max-rounds` have been played. Give
+`--player-traits` to try a player who has eaten some traits already, and
+`--settings` to try another settings file.
+"""
+import argparse
+import json
+import time
+import tomllib
+from dataclasses import asdict, dataclass
+import numpy as np
+from rhizome.game.combat import roll_damage
+from rhizome.game.components import Stats, Trait
+from rhizome.game.config import Config, load_config
+from rhizome.game.world import CONFIG, add_bonus, compile_archetypes
+
+
+@dataclass
+class DuelStats:
+    level: int
+    kind: str
+    trait: str
+    """ The enemy's trait, "-" for none, or "(any)" for every trait weighed by its chance """
+    chance: float
+    """ How likely an enemy of the kind is to have the trait """
+    win_rate: float
+    loss_rate: float
+    damage_taken: float
+    """ The player's mean damage taken per duel """
+    turns_to_kill: float
+    """ The mean number of rounds the duels the player won took; nan if it never won """
+
+
+def duel(player: Stats, enemy: Stats, duels: int, rng: np.random.Generator,
+         max_rounds: int = 100) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Play `duels` duels between `player` and `enemy` at once
+
+    returns: (won, lost, taken, rounds) arrays over the duels: whether the
+        player killed the enemy, whether the enemy killed the player, the
+        damage the player took and how many rounds the duel lasted
+    """
+    player_health = np.full(duels, player.health, dtype=np.int64)
+    enemy_health = np.full(duels, enemy.health, dtype=np.int64)
+    taken = np.zeros(duels, dtype=np.int64)
+    rounds = np.zeros(duels, dtype=np.int64)
+    fighting = np.arange(duels)
+    for round in range(1, max_rounds + 1):
+        if not len(fighting):
+            break
+        rounds[fighting] = round
+        hit = roll_damage(rng, player.strength, *player.damage_range, enemy.toughness, size=len(fighting))
+        enemy_health[fighting] -= np.minimum(hit, enemy_health[fighting])
+        # only the enemies still standing strike back
+        fighting = fighting[enemy_health[fighting] > 0]
+        hit = roll_damage(rng, enemy.strength, *enemy.damage_range, player.toughness, size=len(fighting))
+        hit = np.minimum(hit, player_health[fighting])
+        player_health[fighting] -= hit
+        taken[fighting] += hit
+        fighting = fighting[player_health[fighting] > 0]
+    return enemy_health <= 0, player_health <= 0, taken, rounds
+
+
+def player_stats(config: Config, traits=()) -> Stats:
+    """ The stats of a new player who has gone on to eat `traits` """
+    stats = config.player.stats.copy()
+    for trait in traits:
+        add_bonus(stats, trait)
+    return stats
+
+
+def simulate(levels, duels: int = 100_000, config: Config = CONFIG, player_traits=(),
+             kinds=None, seed: int = 0, max_rounds: int = 100) -> list[DuelStats]:
+    """
+    Play `duels` duels against every kind and trait of enemy on each of `levels`
+
+    returns: a row for every level, kind and trait, and an `(any)` row per kind and level
+    """
+    rng = np.random.default_rng(seed)
+    player = player_stats(config, player_traits)
+    rows = []
+    for level in levels:
+        for kind, archetype in compile_archetypes(config, level).items():
+            if kinds and kind not in kinds:
+                continue
+            by_trait = []
+            for trait, chance in zip(archetype.traits, archetype.weights):
+                won, lost, taken, rounds = duel(player, archetype.stats[trait], duels, rng, max_rounds)
+                by_trait.append(DuelStats(
+                    level, kind, trait if trait is not None else "-", chance,
+                    win_rate=float(won.mean()),
+                    loss_rate=float(lost.mean()),
+                    damage_taken=float(taken.mean()),
+                    turns_to_kill=float(rounds[won].mean()) if won.any() else float("nan"),
+                ))
+            rows.extend(by_trait)
+            rows.append(weighted(by_trait))
+    return rows
+
+
+def weighted(rows: list[DuelStats]) -> DuelStats:
+    """ The `(any)` row of one kind: each trait's row weighed by its chance """
+    chances = np.array([row.chance for row in rows])
+
+    def mean(values) -> float:
+        values = np.array(values, dtype=float)
+        known = ~np.isnan(values)
+        return float(np.average(values[known], weights=chances[known])) if chances[known].sum() else float("nan")
+
+    # turns to kill only counts duels that were won, so weigh it by the wins too
+    wins = np.array([row.win_rate for row in rows])
+    turns = np.array([row.turns_to_kill for row in rows])
+    won = ~np.isnan(turns) & (chances * wins > 0)
+    return DuelStats(
+        rows[0].level, rows[0].kind, "(any)", float(chances.sum()),
+        win_rate=mean([row.win_rate for row in rows]),
+        loss_rate=mean([row.loss_rate for row in rows]),
+        damage_taken=mean([row.damage_taken for row in rows]),
+        turns_to_kill=float(np.average(turns[won], weights=(chances * wins)[won])) if won.any() else float("nan"),
+    )
+
+
+def format_table(rows: list[DuelStats]) -> str:
+    lines = []
+    for row in rows:
+        if not lines or row.level != level:
+            level = row.level
+            if lines:
+                lines.append("")
+            lines.append(f"level {level}")
+            lines.append(f"  {'kind':<12}{'trait':<12}{'chance':>7}{'win %':>8}{'loss %':>8}"
+                         f"{'damage taken':>14}{'turns to kill':>15}")
+        lines.append(f"  {row.kind:<12}{row.trait:<12}{row.chance:>7.2f}{row.win_rate * 100:>8.1f}"
+                     f"{row.loss_rate * 100:>8.1f}{row.damage_taken:>14.2f}{row.turns_to_kill:>15.2f}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[0, 1, 2, 3, 4])
+    parser.add_argument("--duels", type=int, default=100_000, help="duels per level, kind and trait")
+    parser.add_argument("--kinds", nargs="+", help="only these kinds of enemy; every kind by default")
+    parser.add_argument("--player-traits", nargs="+", default=[], choices=[trait.value for trait in Trait],
+                        help="traits the player has already eaten")
+    parser.add_argument("--max-rounds", type=int, default=100, help="call a duel a draw after this many rounds")
+    parser.add_argument("--settings", help="a settings file to use instead of the game's own")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="also write a JSON line per row to this file")
+    args = parser.parse_args()
+    config = CONFIG
+    if args.settings:
+        with open(args.settings, "rb") as file:
+            config = load_config(tomllib.load(file))
+    if args.kinds:
+        unknown = sorted(set(args.kinds) - set(config.enemies))
+        if unknown:
+            parser.error(f"unknown enemy kind {unknown[0]!r}")
+
+    start = time.perf_counter()
+    rows = simulate(args.levels, args.duels, config, [Trait(trait) for trait in args.player_traits],
+                    args.kinds, args.seed, args.max_rounds)
+    seconds = time.perf_counter() - start
+    print(format_table(rows))
+    played = args.duels * sum(row.trait != "(any)" for row in rows)
+    print(f"\n{played} duels in {seconds:.2f}s: {played / seconds:,.0f} duels/s")
+    if args.out:
+        with open(args.out, "w") as out:
+            for row in rows:
+                # NaN isn't JSON; a kind the player never beat has no turns to kill
+                record = {key: None if value != value else value for key, value in asdict(row).items()}
+                out.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+from dataclasses import asdict
+import numpy as np
+from tcod.ecs import Entity, Registry, callbacks
+from rhizome.game.components import BoundingBox, Position, Vector
+from rhizome.game.stats import get_stats_store
+from rhizome.game.strategies import Perception, StateMachine, Strategy, advance, situation
+import rhizome.game.world
+
+__all__ = ["EnemyAI", "get_enemy_ai", "on_strategy_changed"]
+
+
+class EnemyAI:
+    """
+    The AI state of every enemy on a level, stored as parallel arrays
+
+    Row `i` of `kind`, `state` and `timer` describes `entities[i]`, where
+    `kind` indexes `machines`. `step` evaluates the transition tables of
+    every `StateMachine` for the whole population at once with masked
+    array operations, with the same `advance` as `Strategy.next_state`.
+    Only the enemies whose state changed have their `Strategy` record
+    updated and written back to the ECS.
+
+    Rows are added and removed by `on_strategy_changed`, so the arrays
+    follow the `Strategy` components without any bookkeeping by callers.
+
+    Enemies far from the player are dormant: `schedule` leaves them out
+    of the turn except once every `dormant_period` turns. An enemy is
+    active while it is within `activation_radius` of the player, on
+    screen, in the same `region_size` block of the map as the player,
+    or for `dormant_period` turns after hearing a `noise`.
+    """
+
+    def __init__(self, activation_radius: int = 20, dormant_period: int = 8,
+                 noise_radius: int = 8, region_size: int = 16, capacity: int = 64):
+        self.activation_radius = activation_radius
+        self.dormant_period = max(dormant_period, 1)
+        self.noise_radius = noise_radius
+        self.region_size = region_size
+        self.turn = 0
+        self.entities: list[Entity] = []
+        self.rows: dict[Entity, int] = {}
+        self.machines: list[StateMachine] = []
+        self.kind = np.zeros(capacity, dtype=np.int8)
+        self.state = np.zeros(capacity, dtype=np.int8)
+        self.timer = np.zeros(capacity, dtype=np.int16)
+        self.x = np.zeros(capacity, dtype=np.int32)
+        self.y = np.zeros(capacity, dtype=np.int32)
+        self.awake_until = np.zeros(capacity, dtype=np.int32)
+        self._alert_radius = np.zeros(0, dtype=np.int32)
+        self._rules = []
+        self._writing = False
+
+    def __len__(self):
+        return len(self.entities)
+
+    def _columns(self):
+        return (self.kind, self.state, self.timer, self.x, self.y, self.awake_until)
+
+    def _kind_of(self, machine: StateMachine) -> int:
+        try:
+            return self.machines.index(machine)
+        except ValueError:
+            pass
+        kind = len(self.machines)
+        self.machines.append(machine)
+        self._alert_radius = np.array([machine.alert_radius for machine in self.machines], dtype=np.int32)
+        self._rules.extend(machine.rules(kind))
+        return kind
+
+    def add(self, entity: Entity, strategy: Strategy):
+        row = self.rows.get(entity)
+        if row is None:
+            row = self.rows[entity] = len(self.entities)
+            self.entities.append(entity)
+            if row >= len(self.kind):
+                (self.kind, self.state, self.timer,
+                 self.x, self.y, self.awake_until) = (np.resize(column, 2 * row) for column in self._columns())
+            position = entity.components.get(Position, Vector(0,0))
+            self.x[row], self.y[row] = position.x, position.y
+            self.awake_until[row] = self.turn
+        self.kind[row] = self._kind_of(strategy.machine)
+        self.state[row] = strategy.state
+        self.timer[row] = strategy.timer
+
+    def remove(self, entity: Entity):
+        row = self.rows.pop(entity, None)
+        if row is None:
+            return
+        last = len(self.entities) - 1
+        moved = self.entities.pop()
+        if row != last:
+            self.entities[row] = moved
+            self.rows[moved] = row
+            for column in self._columns():
+                column[row] = column[last]
+
+    def schedule(self, player: Vector, camera: BoundingBox | None = None) -> np.ndarray:
+        """
+        Start a new turn and decide which enemies take part in it
+
+        returns: a boolean mask over the rows, True for the enemies that
+            are active or whose periodic dormant update is due
+        """
+        self.turn += 1
+        count = len(self.entities)
+        x, y = self.x[:count], self.y[:count]
+        active = (np.maximum(np.abs(x - player.x), np.abs(y - player.y)) <= self.activation_radius)
+        active |= self.awake_until[:count] >= self.turn
+        if camera is not None:
+            active |= (camera.left <= x) & (x < camera.right) & (camera.top <= y) & (y < camera.bottom)
+        if self.region_size > 0:
+            size = self.region_size
+            active |= (x // size == player.x // size) & (y // size == player.y // size)
+        due = np.arange(count) % self.dormant_period == self.turn % self.dormant_period
+        return active | due
+
+    def noise(self, position: Vector):
+        """
+        Wake every enemy within `noise_radius` of `position` for a while
+        """
+        count = len(self.entities)
+        heard = np.maximum(np.abs(self.x[:count] - position.x),
+                           np.abs(self.y[:count] - position.y)) <= self.noise_radius
+        self.awake_until[:count][heard] = self.turn + self.dormant_period
+
+    def awake(self) -> np.ndarray:
+        """ The rows woken by noise since the turn was scheduled """
+        return self.awake_until[:len(self.entities)] >= self.turn
+
+    def gather(self, rows: np.ndarray):
+        """
+        Read the positions of the enemies in `rows` from the ECS, refreshing
+        the stored positions, and their health from the level's stats arrays
+
+        returns: (health, max_health) arrays aligned with `rows`
+        """
+        entities = [self.entities[row] for row in rows]
+        for row, entity in zip(rows, entities):
+            position = entity.components[Position]
+            self.x[row], self.y[row] = position.x, position.y
+        if not entities:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+        store = get_stats_store(entities[0].registry)
+        stats_rows = store.rows_of(entities)
+        return store.health[stats_rows], store.max_health[stats_rows]
+
+    def step(self, context: Perception, rows: np.ndarray, health, max_health) -> np.ndarray:
+        """
+        Advance the state of the enemies in `rows` by one turn
+
+        returns: the rows whose state changed
+        """
+        kind, state, timer = self.kind[rows], self.state[rows], self.timer[rows]
+        facts = situation(context, self.x[rows], self.y[rows], self._alert_radius[kind],
+                          health, max_health, timer)
+        new_state, new_timer = advance(self._rules, kind, state, timer, facts)
+
+        changed = rows[(new_state != state) | (new_timer != timer)]
+        self.state[rows], self.timer[rows] = new_state, new_timer
+
+        self._writing = True
+        try:
+            for row in changed:
+                entity = self.entities[row]
+                strategy = entity.components[Strategy]
+                strategy.state, strategy.timer = int(self.state[row]), int(self.timer[row])
+                entity.components[Strategy] = strategy
+        finally:
+            self._writing = False
+        return changed
+
+
+def get_enemy_ai(world: Registry) -> EnemyAI:
+    """
+    Return the AI state arrays for the level in `world`, creating them on first use
+    """
+    ai = world[None].components.get(EnemyAI)
+    if ai is None:
+        ai = world[None].components[EnemyAI] = EnemyAI(**asdict(rhizome.game.world.get_config(world).simulation))
+        for entity in world.Q.all_of(components=[Strategy]):
+            ai.add(entity, entity.components[Strategy])
+    return ai
+
+
+@callbacks.register_component_changed(component=Strategy)
+def on_strategy_changed(entity: Entity, old: Strategy | None, new: Strategy | None):
+    ai = entity.registry[None].components.get(EnemyAI)
+    if ai is None or ai._writing:
+        return
+    if new is None:
+        ai.remove(entity)
+    else:
+        ai.add(entity, new)
@@ -0,0 +1,258 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from tcod.ecs import Entity, Registry
+from rhizome.game import ai, snapshots
+from rhizome.game.components import (Camera, Graphic, KilledBy, Name, Position,
+                                     Size, Stats, Trait, Vector)
+from rhizome.game.logging import log
+from rhizome.game.strategies import Strategy
+from rhizome.game.world import STATE_MACHINES, Session
+
+__all__ = ["Autosave", "recover"]
+
+VERSION = 1
+
+
+def _stats(stats: Stats) -> list:
+    return [stats.health, stats.max_health, stats.strength, *stats.damage_range,
+            stats.toughness, stats.toxicity, stats.camoflauge, stats.digestion]
+
+
+TRACKED = [
+    ("position", Position, lambda position: [position.x, position.y]),
+    ("stats", Stats, _stats),
+    ("strategy", Strategy, lambda strategy: [strategy.state, strategy.timer]),
+    ("size", Size, int),
+    ("killed_by", KilledBy, str),
+]
+""" The components that change during play, which are diffed every turn """
+
+
+def describe(entity: Entity) -> dict:
+    """
+    Everything needed to spawn `entity` again, as plain JSON values
+    """
+    components = entity.components
+    record: dict = {"tags": sorted(entity.tags)}
+    if (value := components.get(Camera)) is not None:
+        record["camera"] = [value.height, value.width, value.tracking_radius]
+    if (value := components.get(Name)) is not None:
+        record["name"] = value
+    if (value := components.get(Graphic)) is not None:
+        record["graphic"] = [value.char, list(value.fg), list(value.bg)]
+    if (value := components.get(Strategy)) is not None:
+        record["machine"] = value.machine.name
+    if Trait in components:
+        record["trait"] = components[Trait]
+    for label, key, encode in TRACKED:
+        if (value := components.get(key)) is not None:
+            record[label] = encode(value)
+    return record
+
+
+def apply(entity: Entity, record: dict, machines: dict):
+    """
+    Set the components in `record`, as written by `describe` or by a
+    turn's changes, on `entity`
+    """
+    entity.tags |= set(record.get("tags", ()))
+    components = entity.components
+    if "camera" in record:
+        components[Camera] = Camera(*record["camera"])
+    if "name" in record:
+        components[Name] = record["name"]
+    if "stats" in record:
+        health, max_health, strength, low, high, toughness, toxicity, camoflauge, digestion = record["stats"]
+        components[Stats] = Stats(health, max_health, strength, (low, high),
+                                  toughness, toxicity, camoflauge, digestion)
+    if "graphic" in record:
+        char, fg, bg = record["graphic"]
+        components[Graphic] = Graphic(char, tuple(fg), tuple(bg))
+    if "position" in record:
+        components[Position] = Vector(*record["position"])
+    if "strategy" in record:
+        machine = machines[record["machine"]] if "machine" in record else components[Strategy].machine
+        components[Strategy] = Strategy(machine, *record["strategy"])
+    if "trait" in record:
+        components[Trait] = record["trait"]
+    if "size" in record:
+        components[Size] = record["size"]
+    if "killed_by" in record:
+        components[KilledBy] = record["killed_by"]
+
+
+class Autosave:
+    """
+    Keeps a crash-safe copy of the session's current level at `path`.rhz
+    and `path`.log
+
+    At the end of every turn the tracked components of the level are
+    compared with the turn before, and the entities that moved, changed,
+    spawned or died are appended to the log as one line of JSON. Every
+    `compact_every` turns, and whenever the session moves to another
+    level, the whole level is encoded as a snapshot and the log starts
+    over. Entities are numbered by their row in the last snapshot, and
+    entities spawned since then by the order they appeared.
+
+    Only the comparison and encoding happen during the turn; all writing
+    is done in order by a background thread, so the turn never waits on
+    the disk. If a write fails, autosaving stops: the error is kept in
+    `error` and reported in the game's log at the end of the next turn.
+
+    Between snapshots the log doesn't carry the random streams or the
+    enemies' wake timers, so a recovered level plays on from the state
+    it was left in but doesn't roll the same dice the lost session would have.
+    """
+
+    def __init__(self, path: str | os.PathLike, session: Session, compact_every: int = 100):
+        self.path = os.fspath(path)
+        self.session = session
+        self.compact_every = compact_every
+        self.world: Registry | None = None
+        self.generation = 0
+        self.turns = 0
+        self.ids: dict[Entity, int] = {}
+        self.entities: dict[int, Entity] = {}
+        self.next_id = 0
+        self.last: dict[str, dict[int, object]] = {}
+        self.error: Exception | None = None
+        """ Why writing failed, if it did """
+        self._reported = False
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="autosave")
+        self._log = None
+
+    def end_turn(self):
+        if self.error is not None:
+            if not self._reported:
+                self._reported = True
+                log(f"autosave failed and is off: {self.error}")
+            return
+        world = self.session.world
+        if world is None:
+            return
+        if world is not self.world or self.turns >= self.compact_every:
+            self.compact()
+            return
+        self.turns += 1
+        current = self._observe(world)
+        before = self.last["position"]
+        spawned = {id: describe(self.entities[id]) for id in current["position"] if id not in before}
+        killed = [id for id in before if id not in current["position"]]
+        changed: dict[int, dict] = {}
+        for label, values in current.items():
+            previous = self.last[label]
+            for id, value in values.items():
+                if id not in spawned and previous.get(id) != value:
+                    changed.setdefault(id, {})[label] = value
+        for id in killed:
+            del self.ids[self.entities.pop(id)]
+        self.last = current
+        if spawned or killed or changed:
+            enemy_ai = world[None].components.get(ai.EnemyAI)
+            delta = {"turn": self.turns, "ai_turn": enemy_ai.turn if enemy_ai is not None else 0,
+                     "killed": killed, "spawned": spawned, "changed": changed}
+            self._submit(self._append, delta)
+
+    def compact(self):
+        """
+        Encode the whole level as the start of a new log
+        """
+        world = self.session.world
+        order = snapshots.entity_order(world)
+        self.world = world
+        self.generation += 1
+        self.turns = 0
+        self.ids = {entity: id for id, entity in enumerate(order)}
+        self.entities = dict(enumerate(order))
+        self.next_id = len(order)
+        self.last = self._observe(world)
+        meta, arrays = snapshots.encode(world, order, generation=self.generation)
+        self._submit(self._start, self.generation, meta, arrays)
+
+    def _observe(self, world: Registry) -> dict[str, dict[int, object]]:
+        current = {}
+        for label, key, encode in TRACKED:
+            values = current[label] = {}
+            for entity, value in world.Q[Entity, key]:
+                id = self.ids.get(entity)
+                if id is None:
+                    if label != "position":
+                        continue
+                    id = self.ids[entity] = self.next_id
+                    self.entities[id] = entity
+                    self.next_id += 1
+                values[id] = encode(value)
+        return current
+
+    def _submit(self, write, *args):
+        self._writer.submit(write, *args).add_done_callback(self._check)
+
+    def _check(self, future):
+        # runs on the writer thread, so a failure is kept for the game's thread to report
+        if not future.cancelled() and future.exception() is not None and self.error is None:
+            self.error = future.exception()
+
+    def _start(self, generation: int, meta: dict, arrays: dict):
+        if self.error is not None:
+            return
+        snapshots.write(f"{self.path}.rhz", meta, arrays)
+        if self._log is not None:
+            self._log.close()
+        self._log = open(f"{self.path}.log", "w", buffering=1)
+        self._log.write(json.dumps({"version": VERSION, "generation": generation}) + "\n")
+
+    def _append(self, delta: dict):
+        if self.error is not None:
+            return
+        self._log.write(json.dumps(delta) + "\n")
+
+    def close(self):
+        """ Finish writing everything queued so far """
+        self._writer.shutdown(wait=True)
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+def recover(path: str | os.PathLike, session: Session | None = None) -> Registry | None:
+    """
+    Rebuild the level autosaved at `path` from its last snapshot and
+    the turns logged since
+
+    returns: the level, or None if nothing was saved
+    """
+    path = os.fspath(path)
+    try:
+        snapshot = snapshots.read(f"{path}.rhz")
+    except FileNotFoundError:
+        return None
+    world, order = snapshots.restore(snapshot, session)
+    entities = dict(enumerate(order))
+    machines = session.state_machines if session is not None else STATE_MACHINES
+    try:
+        log = open(f"{path}.log")
+    except FileNotFoundError:
+        return world
+    with log:
+        header = json.loads(log.readline() or "{}")
+        # a log left over from an older snapshot is already part of it
+        if header.get("version") != VERSION or header.get("generation") != snapshot.meta.get("generation"):
+            return world
+        for line in log:
+            try:
+                delta = json.loads(line)
+            except json.JSONDecodeError:
+                # the last line was cut short by the crash
+                break
+            for id in delta["killed"]:
+                entities.pop(id).clear()
+            for id, record in delta["spawned"].items():
+                entity = entities[int(id)] = world.new_entity()
+                apply(entity, record, machines)
+            for id, record in delta["changed"].items():
+                apply(entities[int(id)], record, machines)
+            enemy_ai = world[None].components.get(ai.EnemyAI)
+            if enemy_ai is not None:
+                enemy_ai.turn = delta["ai_turn"]
+    return world
@@ -0,0 +1,90 @@
+import numpy as np
+from tcod.ecs import Entity, Registry
+from rhizome.game.components import CombatRandom, KilledBy, Name
+from rhizome.game.logging import log
+from rhizome.game.stats import get_stats_store
+
+__all__ = ["Attacks", "resolve", "roll_damage"]
+
+_SEGMENT = 1 << 40
+""" Wider than any run of health, so shifting each defender's hits by it keeps their running minima apart """
+
+
+def roll_damage(rng: np.random.Generator, strength, low, high, toughness, size=None) -> np.ndarray:
+    """
+    The damage of a batch of attacks before the health clamp: the
+    attacker's strength plus a roll from `low` to `high` inclusive, less
+    the defender's toughness. Any argument may be an array, one per attack
+    """
+    return strength + rng.integers(low, high, endpoint=True, size=size) - toughness
+
+
+class Attacks:
+    """
+    The attacks made during a turn, in the order they were made,
+    to be resolved together by `resolve`
+    """
+
+    def __init__(self):
+        self.attackers: list[Entity] = []
+        self.defenders: list[Entity] = []
+
+    def __len__(self):
+        return len(self.attackers)
+
+    def declare(self, attacker: Entity, defender: Entity):
+        self.attackers.append(attacker)
+        self.defenders.append(defender)
+
+
+def resolve(world: Registry, attacks: Attacks) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Resolve every attack in `attacks` at once against the level's stats arrays
+
+    An attack deals the attacker's strength plus a roll over its damage
+    range, less the defender's toughness, but never more than the health
+    the defender has left when it lands. The attacks land in the order they
+    were declared, so the outcome is the same as resolving them one at a
+    time. Every roll is drawn in one call from the level's `CombatRandom`
+    generator, in that order too, so the same seed gives the same fight.
+
+    returns: (dealt, fatal), the damage each attack dealt and the indices
+        of the attacks that dealt a fatal blow, both in declaration order
+    """
+    count = len(attacks)
+    if not count:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.intp)
+    store = get_stats_store(world)
+    attackers = store.rows_of(attacks.attackers)
+    defenders = store.rows_of(attacks.defenders)
+    rng = world[None].components[CombatRandom]
+    damage = roll_damage(rng, store.strength[attackers].astype(np.int64), store.damage_low[attackers],
+                         store.damage_high[attackers], store.toughness[defenders])
+
+    # each defender's attacks side by side, still in declaration order
+    order = np.argsort(defenders, kind="stable")
+    defenders, damage = defenders[order], damage[order]
+    starts = np.ones(count, dtype=bool)
+    starts[1:] = defenders[1:] != defenders[:-1]
+    group = np.cumsum(starts) - 1
+    health = store.health[defenders].astype(np.int64)
+
+    # one at a time, health goes from h to max(h - damage, 0); over a run of
+    # attacks that is the unclamped total less its lowest point below zero so far
+    spent = np.cumsum(damage)
+    unclamped = health - (spent - (spent - damage)[starts][group])
+    lowest = np.minimum.accumulate(unclamped - group * _SEGMENT) + group * _SEGMENT
+    after = unclamped - np.minimum(lowest, 0)
+    before = np.where(starts, health, np.roll(after, 1))
+    ends = np.append(starts[1:], True)
+    store.health[defenders[ends]] = after[ends]
+
+    dealt = np.empty(count, dtype=np.int64)
+    dealt[order] = before - after
+    fatal = np.sort(order[(before > 0) & (after <= 0)])
+    names = [attacker.components.get(Name, "(unnamed)") for attacker in attacks.attackers]
+    for attacker, defender, amount in zip(names, attacks.defenders, dealt.tolist()):
+        log(f"{attacker} dealt {amount} to {defender.components.get(Name, "(unnamed)")}")
+    for index in fatal.tolist():
+        attacks.defenders[index].components[KilledBy] = names[index]
+    return dealt, fatal
@@ -1,88 +1,145 @@
-from dataclasses import dataclass
+import builtins
+from dataclasses import FrozenInstanceError, dataclass
 from enum import Enum
 from functools import wraps
-from tcod.ecs import Entity, callbacks
+from random import Random
 from typing import Final, Tuple
 import numpy as np
+from tcod.ecs import Entity
 
 __all__ = ["Vector", "Position", "BoundingBox", "Camera", 
            "Graphic", "Map", "Stats", "Name",
            "Size", "Trait",
-           "on_vector_changed", "move_inside"
+           "move_inside"
            ]
 
 
-@dataclass(frozen=True)
 class Vector:
+    """
+    An immutable 2D integer vector
+
+    Vectors are created on every move and collision check and hashed
+    whenever they key a lookup, so the class is slotted, builds its
+    instances without going through `__setattr__`, caches its hash and
+    checks for a `Vector` operand before an int or a pair. The nine unit
+    offsets are interned in `OFFSETS`.
+    """
+    __slots__ = ("x", "y", "_hash")
+    __match_args__ = ("x", "y")
+
     x: int
     y: int
 
-    def __add__(self, other: "Vector" | Tuple[int, int]):
-        match other:
-            case Vector(x=x,y=y):
-                return type(self)(self.x + x, self.y + y)
-            case (x,y):
-                return type(self)(self.x + x, self.y + y)
-            case int(s):
-                return type(self)(self.x + s, self.y + s)
-
-    def __sub__(self, other: "Vector" | Tuple[int,int]):
-        match other:
-            case Vector(x=x,y=y):
-                return type(self)(self.x - x, self.y - y)
-            case (x,y):
-                return type(self)(self.x - x, self.y - y)
-            case int(s): 
-                return type(self)(self.x + s, self.y + s)
-            
-    def __mul__(self, other):
-        match other: 
-            case Vector(x=x, y=y):
-                return type(self)(self.x * x ,self.y* y)
-            case (x,y):
-                return type(self)(self.x * x ,self.y* y)
-            case int(s):
-                return type(self)(self.x * s, self.y * s)
-    
-    def __floordiv__(self, other):
-        match other: 
-            case Vector(x=x, y=y):
-                return type(self)(self.x // x ,self.y// y)
-            case (x,y):
-                return type(self)(self.x // x ,self.y// y)
-            case int(s):
-                return type(self)(self.x // s, self.y // s)
+    def __init__(self, x: int, y: int):
+        _set_x(self, x)
+        _set_y(self, y)
+        _set_hash(self, 0)
+
+    def __setattr__(self, name, value):
+        raise FrozenInstanceError(f"cannot assign to field {name!r}")
+
+    def __delattr__(self, name):
+        raise FrozenInstanceError(f"cannot delete field {name!r}")
+
+    def __reduce__(self):
+        return (Vector, (self.x, self.y))
+
+    def __eq__(self, other):
+        if other.__class__ is Vector:
+            return self.x == other.x and self.y == other.y
+        return NotImplemented
+
+    def __hash__(self):
+        # 0 means not hashed yet; the odd vector that really hashes to 0 is just never cached
+        value = self._hash
+        if not value:
+            value = hash((self.x, self.y))
+            _set_hash(self, value)
+        return value
+
+    def __repr__(self):
+        return f"Vector(x={self.x!r}, y={self.y!r})"
 
-    def __bool__(self):
-        return self.x !=0 or self.y != 0
-    
     def __str__(self):
         return f"Vector({self.x}, {self.y})"
-    
+
+    def __bool__(self):
+        return self.x != 0 or self.y != 0
+
+    def __add__(self, other: "Vector | Tuple[int, int] | int") -> "Vector":
+        if other.__class__ is Vector:
+            return _vector(self.x + other.x, self.y + other.y)
+        if isinstance(other, int):
+            return _vector(self.x + other, self.y + other)
+        x, y = other
+        return _vector(self.x + x, self.y + y)
+
+    def __sub__(self, other: "Vector | Tuple[int, int] | int") -> "Vector":
+        if other.__class__ is Vector:
+            return _vector(self.x - other.x, self.y - other.y)
+        if isinstance(other, int):
+            return _vector(self.x - other, self.y - other)
+        x, y = other
+        return _vector(self.x - x, self.y - y)
+
+    def __mul__(self, other: "Vector | Tuple[int, int] | int") -> "Vector":
+        if other.__class__ is Vector:
+            return _vector(self.x * other.x, self.y * other.y)
+        if isinstance(other, int):
+            return _vector(self.x * other, self.y * other)
+        x, y = other
+        return _vector(self.x * x, self.y * y)
+
+    def __floordiv__(self, other: "Vector | Tuple[int, int] | int") -> "Vector":
+        if other.__class__ is Vector:
+            return _vector(self.x // other.x, self.y // other.y)
+        if isinstance(other, int):
+            return _vector(self.x // other, self.y // other)
+        x, y = other
+        return _vector(self.x // x, self.y // y)
+
+    @staticmethod
+    def offset(dx: int, dy: int) -> "Vector":
+        """
+        The interned vector for a step of at most one cell in each direction
+        """
+        # the interned zero vector is falsy, so test for a miss explicitly
+        v = OFFSETS.get((dx, dy))
+        return v if v is not None else Vector(dx, dy)
 
     def clamp(self, min: "Vector", max: "Vector")->"Vector":
         """
         Return a new vector with components restricted to lie 
-        between `min` (inclusivee) and `max` (exclusive)
+        between `min` (inclusive) and `max` (exclusive)
 
         Prereqs: `min.x < max.x` and `min.y < max.y`
 
         """
         return Vector(
-            x=min(max.x-1,max(min.x,self.x)),
-            y=min(max.y-1,max(min.y,self.y))
+            x=builtins.min(max.x - 1, builtins.max(min.x, self.x)),
+            y=builtins.min(max.y - 1, builtins.max(min.y, self.y))
         )
-    
-Position: Final = ("Position", Vector)
 
-@callbacks.register_component_changed(component=Position)
-def on_vector_changed(entity: Entity, old: Vector | None, new: Vector | None):
-    if old == new:
-        return
-    if old is not None:
-        entity.tags.discard(old)
-    if new is not None:
-        entity.tags.add(new)
+
+_set_x = Vector.x.__set__
+_set_y = Vector.y.__set__
+_set_hash = Vector._hash.__set__
+_new = object.__new__
+
+
+def _vector(x: int, y: int) -> Vector:
+    # the constructor without the call through type.__call__ and __init__
+    vector = _new(Vector)
+    _set_x(vector, x)
+    _set_y(vector, y)
+    _set_hash(vector, 0)
+    return vector
+
+
+OFFSETS: Final = {(dx, dy): Vector(dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1)}
+""" The interned unit offsets: the eight directions and standing still """
+
+Position: Final = ("Position", Vector)
 
 
 class BoundingBox:
@@ -215,16 +272,106 @@ class Graphic:
     def ch(self):
         return ord(self.char)
 
-@dataclass
-class Stats: 
-    health: int
-    max_health: int
-    strength: int
-    damage_range: Tuple[int,int] = (0,0) # variability of damage
-    toughness: int = 0 # reduces damage taken by X
-    toxicity: int = 0 # deal damage when hit
-    camoflauge: int = 0 # makes it harder to be seen
-    digestion: int = 1 # how quickly you absorb food
+STAT_FIELDS: Final = ("health", "max_health", "strength", "damage_low", "damage_high",
+                      "toughness", "toxicity", "camoflauge", "digestion")
+""" The columns of a `Stats`, in order; the damage range is split in two """
+
+
+def _stat(index: int) -> property:
+    def get(self) -> int:
+        return int(self._columns[index][self._row])
+
+    def set(self, value: int):
+        self._columns[index][self._row] = value
+    return property(get, set)
+
+
+class Stats:
+    """
+    An entity's combat stats
+
+    A `Stats` is a view onto one row of columns of values. On its own it
+    owns a single row; once it is attached to an entity, the level's
+    `stats.StatsStore` moves the values into its arrays and the view reads
+    and writes them there, so the stats of a whole level can also be
+    worked on at once. Reading a field always gives a plain int.
+    """
+    __slots__ = ("_columns", "_row", "_store")
+
+    def __init__(self, health: int, max_health: int, strength: int,
+                 damage_range: Tuple[int, int] = (0, 0), # variability of damage
+                 toughness: int = 0, # reduces damage taken by X
+                 toxicity: int = 0, # deal damage when hit
+                 camoflauge: int = 0, # makes it harder to be seen
+                 digestion: int = 1, # how quickly you absorb food
+                 ):
+        low, high = damage_range
+        self._columns = [[health], [max_health], [strength], [low], [high],
+                         [toughness], [toxicity], [camoflauge], [digestion]]
+        self._row = 0
+        self._store = None
+
+    health = _stat(0)
+    max_health = _stat(1)
+    strength = _stat(2)
+    toughness = _stat(5)
+    toxicity = _stat(6)
+    camoflauge = _stat(7)
+    digestion = _stat(8)
+
+    @property
+    def damage_range(self) -> Tuple[int, int]:
+        row = self._row
+        return int(self._columns[3][row]), int(self._columns[4][row])
+
+    @damage_range.setter
+    def damage_range(self, value: Tuple[int, int]):
+        row = self._row
+        self._columns[3][row], self._columns[4][row] = value
+
+    def values(self) -> tuple[int, ...]:
+        """ The value of every column, in `STAT_FIELDS` order """
+        row = self._row
+        return tuple(int(column[row]) for column in self._columns)
+
+    def asdict(self) -> dict:
+        """ The stats by field name, with the damage range as a pair, like the old dataclass's `vars` """
+        return {"health": self.health, "max_health": self.max_health, "strength": self.strength,
+                "damage_range": self.damage_range, "toughness": self.toughness, "toxicity": self.toxicity,
+                "camoflauge": self.camoflauge, "digestion": self.digestion}
+
+    def copy(self) -> "Stats":
+        """ A detached copy of these stats """
+        copy = Stats.__new__(Stats)
+        copy._columns = [[value] for value in self.values()]
+        copy._row = 0
+        copy._store = None
+        return copy
+
+    def _bind(self, store, columns: list, row: int):
+        # for `StatsStore`: read and write row `row` of `columns` from now on
+        self._store, self._columns, self._row = store, columns, row
+
+    def _detach(self):
+        # for `StatsStore`: take a private copy of the values of the current row
+        self._columns = [[value] for value in self.values()]
+        self._row = 0
+        self._store = None
+
+    def __eq__(self, other):
+        if other.__class__ is Stats:
+            return self.values() == other.values()
+        return NotImplemented
+
+    __hash__ = None
+
+    def __reduce__(self):
+        health, max_health, strength, low, high, *rest = self.values()
+        return (Stats, (health, max_health, strength, (low, high), *rest))
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={value!r}" for name, value in self.asdict().items())
+        return f"Stats({fields})"
 
     def __str__(self):
         health = f"Health: {self.health}/{self.max_health} "
@@ -255,4 +402,14 @@ Map: Final = ("Map", np.ndarray)
 Name: Final = ("Name", str)
 Depth: Final = ("Depth", int)
 Size: Final = ("Size", int)
-LevelNo: Final = ("LevelNo", int)
\ No newline at end of file
+LevelNo: Final = ("LevelNo", int)
+Seed: Final = ("Seed", int)
+""" The seed of the game a level belongs to; every level's random streams derive from it """
+AIRandom: Final = ("AIRandom", Random)
+""" The level's random stream for enemy decisions """
+CombatRandom: Final = ("CombatRandom", np.random.Generator)
+""" The level's generator for combat rolls, drawn from a whole turn's attacks at a time """
+PlayerEntity: Final = ("PlayerEntity", Entity)
+""" The player on a level """
+KilledBy: Final = ("KilledBy", str)
+""" The name of whatever dealt an entity its fatal blow """
\ No newline at end of file
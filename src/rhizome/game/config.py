@@ -0,0 +1,235 @@
+from dataclasses import MISSING, dataclass, field, fields
+from types import MappingProxyType
+from typing import Mapping
+from rhizome.game.components import Camera, Graphic, Stats, Trait
+from rhizome.game.maps import BACKENDS
+from rhizome.game.strategies import StateMachine
+
+__all__ = ["Config", "EnemyConfig", "MapConfig", "PlayerConfig", "ProfilerConfig", "SavesConfig",
+           "ScreenConfig", "SimulationConfig", "load_config", "intern_graphic", "intern_stats"]
+
+
+_GRAPHICS: dict[Graphic, Graphic] = {}
+_STATS: dict[tuple, Stats] = {}
+
+
+def intern_graphic(graphic: Graphic) -> Graphic:
+    """ The one shared instance of `graphic` in this process """
+    return _GRAPHICS.setdefault(graphic, graphic)
+
+
+def intern_stats(stats: Stats) -> Stats:
+    """
+    The one shared instance of the stats template `stats` in this process
+
+    Templates are shared, so they must never be changed: give every
+    entity its own copy with `Stats.copy`.
+    """
+    return _STATS.setdefault(stats.values(), stats)
+
+
+@dataclass(frozen=True, slots=True)
+class ProfilerConfig:
+    window: int = field(default=256, metadata={"minimum": 1})
+    trace: str = ""
+
+
+@dataclass(frozen=True, slots=True)
+class SavesConfig:
+    quicksave: str = "quicksave.rhz"
+    autosave: str = ""
+    compact_every: int = field(default=100, metadata={"minimum": 1})
+
+
+@dataclass(frozen=True, slots=True)
+class MapConfig:
+    height: int = field(metadata={"minimum": 3})
+    width: int = field(metadata={"minimum": 3})
+    wall_threshold: float = field(metadata={"minimum": 0, "maximum": 1})
+    backend: str = "window"
+
+
+@dataclass(frozen=True, slots=True)
+class SimulationConfig:
+    activation_radius: int = field(default=20, metadata={"minimum": 0})
+    dormant_period: int = field(default=8, metadata={"minimum": 1})
+    noise_radius: int = field(default=8, metadata={"minimum": 0})
+    region_size: int = field(default=16, metadata={"minimum": 0})
+
+
+@dataclass(frozen=True, slots=True)
+class ScreenConfig:
+    height: int = field(metadata={"minimum": 1})
+    width: int = field(metadata={"minimum": 1})
+
+
+@dataclass(frozen=True, slots=True)
+class PlayerConfig:
+    graphic: Graphic
+    stats: Stats
+    """ An interned template; copy it before use """
+
+
+@dataclass(frozen=True, slots=True)
+class EnemyConfig:
+    kind: str
+    graphic: Graphic
+    stats: Stats
+    """ An interned template of the kind's base stats; copy it before use """
+    sizes: tuple[int, ...]
+    traits: tuple[tuple[str, float], ...]
+    """ Each trait the kind can have with its probability """
+    machine: StateMachine
+
+
+@dataclass(frozen=True, slots=True)
+class Config:
+    """
+    The game's settings, checked and compiled once when they are loaded
+    """
+    debug: bool
+    profiler: ProfilerConfig
+    saves: SavesConfig
+    map: MapConfig
+    camera: Camera
+    simulation: SimulationConfig
+    screen: ScreenConfig
+    player: PlayerConfig
+    enemies: Mapping[str, EnemyConfig]
+    corpse: Graphic
+    hole: Graphic
+
+
+def _table(raw, where: str) -> Mapping:
+    if raw is None:
+        raise ValueError(f"{where}: missing")
+    if not isinstance(raw, Mapping):
+        raise ValueError(f"{where}: expected a table, got {raw!r}")
+    return raw
+
+
+def _check_keys(raw: Mapping, where: str, allowed):
+    unknown = sorted(set(raw) - set(allowed))
+    if unknown:
+        raise ValueError(f"{where}: unknown setting {unknown[0]!r}")
+
+
+def _scalar(value, kind: type, where: str, minimum=None, maximum=None):
+    if kind is float and isinstance(value, int) and not isinstance(value, bool):
+        value = float(value)
+    if not isinstance(value, kind) or (kind is not bool and isinstance(value, bool)):
+        raise ValueError(f"{where}: expected {kind.__name__}, got {value!r}")
+    if minimum is not None and value < minimum:
+        raise ValueError(f"{where}: must be at least {minimum}, got {value!r}")
+    if maximum is not None and value > maximum:
+        raise ValueError(f"{where}: must be at most {maximum}, got {value!r}")
+    return value
+
+
+def _build(cls, raw, where: str):
+    """ Build a dataclass of scalar fields from a settings table """
+    raw = _table(raw, where)
+    _check_keys(raw, where, [f.name for f in fields(cls)])
+    values = {}
+    for f in fields(cls):
+        if f.name not in raw:
+            if f.default is MISSING:
+                raise ValueError(f"{where}: missing {f.name!r}")
+            continue
+        values[f.name] = _scalar(raw[f.name], f.type, f"{where}.{f.name}",
+                                 f.metadata.get("minimum"), f.metadata.get("maximum"))
+    return cls(**values)
+
+
+def _color(raw, where: str) -> tuple[int, int, int]:
+    if not isinstance(raw, list) or len(raw) != 3:
+        raise ValueError(f"{where}: expected three color channels, got {raw!r}")
+    return tuple(_scalar(channel, int, where, 0, 255) for channel in raw)
+
+
+def _graphic(raw, where: str) -> Graphic:
+    raw = _table(raw, where)
+    _check_keys(raw, where, ["char", "fg", "bg"])
+    char = _scalar(raw.get("char", Graphic.char), str, f"{where}.char")
+    if len(char) != 1:
+        raise ValueError(f"{where}.char: expected a single character, got {char!r}")
+    fg = _color(raw["fg"], f"{where}.fg") if "fg" in raw else Graphic.fg
+    bg = _color(raw["bg"], f"{where}.bg") if "bg" in raw else Graphic.bg
+    return intern_graphic(Graphic(char, fg, bg))
+
+
+def _int_list(raw, where: str, minimum=None) -> tuple[int, ...]:
+    if not isinstance(raw, list) or not raw:
+        raise ValueError(f"{where}: expected a list of integers, got {raw!r}")
+    return tuple(_scalar(value, int, where, minimum) for value in raw)
+
+
+def _player(raw, where: str) -> PlayerConfig:
+    raw = _table(raw, where)
+    _check_keys(raw, where, ["health", "strength", "graphic"])
+    health = _scalar(raw.get("health"), int, f"{where}.health", 1)
+    strength = _scalar(raw.get("strength"), int, f"{where}.strength")
+    return PlayerConfig(_graphic(raw.get("graphic", {}), f"{where}.graphic"),
+                        intern_stats(Stats(health, health, strength)))
+
+
+def _enemy(kind: str, raw, where: str) -> EnemyConfig:
+    raw = _table(raw, where)
+    _check_keys(raw, where, ["health", "strength", "size_range", "damage_range", "traits", "graphic", "ai"])
+    health = _scalar(raw.get("health"), int, f"{where}.health", 1)
+    strength = _scalar(raw.get("strength"), int, f"{where}.strength")
+    damage_range = _int_list(raw.get("damage_range", [0, 0]), f"{where}.damage_range")
+    if len(damage_range) != 2 or damage_range[0] > damage_range[1]:
+        raise ValueError(f"{where}.damage_range: expected [low, high], got {list(damage_range)!r}")
+    traits = []
+    for trait, probability in _table(raw.get("traits", {}), f"{where}.traits").items():
+        if trait not in {trait.value for trait in Trait}:
+            raise ValueError(f"{where}.traits: unknown trait {trait!r}")
+        traits.append((trait, _scalar(probability, float, f"{where}.traits.{trait}", 0, 1)))
+    if sum(probability for _, probability in traits) > 1 + 1e-9:
+        raise ValueError(f"{where}.traits: probabilities add up to more than 1")
+    if "ai" not in raw:
+        raise ValueError(f"{where}: missing 'ai'")
+    return EnemyConfig(
+        kind=kind,
+        graphic=_graphic(raw.get("graphic", {}), f"{where}.graphic"),
+        stats=intern_stats(Stats(health, health, strength, damage_range)),
+        sizes=_int_list(raw.get("size_range", [1]), f"{where}.size_range", 1),
+        traits=tuple(traits),
+        machine=StateMachine.from_settings(kind, _table(raw["ai"], f"{where}.ai")),
+    )
+
+
+def load_config(raw: Mapping) -> Config:
+    """
+    Check the settings in `raw`, as read from settings.toml, and compile them
+
+    Raises ValueError naming the offending setting if any is missing,
+    unknown or malformed
+    """
+    raw = _table(raw, "settings")
+    _check_keys(raw, "settings", ["debug", "profiler", "saves", "map", "camera", "simulation",
+                                  "screen", "player", "enemy", "items", "hole"])
+    map = _build(MapConfig, raw.get("map"), "map")
+    if map.backend not in BACKENDS:
+        raise ValueError(f"map.backend: unknown backend {map.backend!r}")
+    items = _table(raw.get("items", {}), "items")
+    _check_keys(items, "items", ["corpse"])
+    corpse = _table(items.get("corpse", {}), "items.corpse")
+    _check_keys(corpse, "items.corpse", ["graphic"])
+    hole = _table(raw.get("hole", {}), "hole")
+    _check_keys(hole, "hole", ["graphic"])
+    enemies = _table(raw.get("enemy", {}), "enemy")
+    return Config(
+        debug=_scalar(raw.get("debug", False), bool, "debug"),
+        profiler=_build(ProfilerConfig, raw.get("profiler", {}), "profiler"),
+        saves=_build(SavesConfig, raw.get("saves", {}), "saves"),
+        map=map,
+        camera=_build(Camera, raw.get("camera"), "camera"),
+        simulation=_build(SimulationConfig, raw.get("simulation", {}), "simulation"),
+        screen=_build(ScreenConfig, raw.get("screen"), "screen"),
+        player=_player(raw.get("player"), "player"),
+        enemies=MappingProxyType({kind: _enemy(kind, enemy, f"enemy.{kind}") for kind, enemy in enemies.items()}),
+        corpse=_graphic(corpse.get("graphic", {}), "items.corpse.graphic"),
+        hole=_graphic(hole.get("graphic", {}), "hole.graphic"),
+    )
@@ -2,7 +2,62 @@ import numpy as np
 import tcod
 from rhizome.game.components import Graphic
 
-def create_map(height, width, wall_threshold, closed=False) -> np.ndarray:
+
+def _window_counts(padded: np.ndarray, n_iters: int):
+    """
+    Count neighbours by summing over strided window views of `padded`
+
+    returns: (near, far), where `near` counts walls in the 3x3 neighbourhood
+        of each cell and `far` counts walls in the 4x4 window around it
+        (or None once the far count is no longer needed)
+    """
+    r1 = np.lib.stride_tricks.sliding_window_view(padded, (3,3))
+    near = r1.sum(axis=(-1,-2))
+    if n_iters >= 3:
+        return near, None
+    r2 = np.lib.stride_tricks.sliding_window_view(padded,(4,4))
+    far = np.pad(r2.sum(axis=(-1,-2)), (1,0),constant_values=1)
+    return near, far
+
+
+def _summed_area_counts(padded: np.ndarray, n_iters: int):
+    """
+    Count neighbours with a summed-area table over `padded`
+
+    Each window sum costs four lookups into the table regardless of 
+    the window size, so a step is O(height * width) with no 
+    per-window temporaries.
+
+    returns: the same (near, far) pair as `_window_counts`
+    """
+    height, width = padded.shape[0] - 2, padded.shape[1] - 2
+    table = np.zeros((height + 3, width + 3), dtype=np.int32)
+    np.cumsum(padded, axis=0, dtype=np.int32, out=table[1:,1:])
+    np.cumsum(table[1:,1:], axis=1, out=table[1:,1:])
+
+    def window(size: int, rows: int, columns: int) -> np.ndarray:
+        return (table[size:size + rows, size:size + columns]
+                - table[:rows, size:size + columns]
+                - table[size:size + rows, :columns]
+                + table[:rows, :columns])
+
+    near = window(3, height, width)
+    if n_iters >= 3:
+        return near, None
+    far = np.ones((height, width), dtype=np.int32)
+    far[1:,1:] = window(4, height - 1, width - 1)
+    return near, far
+
+
+BACKENDS = {
+    "window": _window_counts,
+    "summed_area": _summed_area_counts,
+}
+""" Neighbour-counting strategies available to `create_map` """
+
+
+def create_map(height, width, wall_threshold, closed=False, backend="window",
+               rng: np.random.Generator | None = None) -> np.ndarray:
     """
     Create a map using the 4-5 cellular automaton rule
     
@@ -11,18 +66,26 @@ def create_map(height, width, wall_threshold, closed=False) -> np.ndarray:
     threshold: the initial threshold for assigning a wall
     closed: Whether the edges of the map should be closed (padded with walls)
         or left open
+    backend: the name of the neighbour-counting strategy in `BACKENDS`.
+        Every backend produces the same map for the same random state;
+        "summed_area" scales to much larger maps than "window"
+    rng: the generator to draw the initial walls from;
+        defaults to numpy's global random state
 
     returns: an array where impassible blocks are True and open terrain is False
     """
-    map = np.random.random((height, width)) <= wall_threshold
+    try:
+        count_neighbours = BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown map backend {backend!r}")
+
+    random = rng.random if rng is not None else np.random.random
+    map = random((height, width)) <= wall_threshold
     iterating = True
     n_iters = 0
     while iterating and n_iters < 10:
         padded = np.pad(map, 1, constant_values=closed)
-        r1 = np.lib.stride_tricks.sliding_window_view(padded, (3,3))
-        near = r1.sum(axis=(-1,-2))
-        r2 = np.lib.stride_tricks.sliding_window_view(padded,(4,4))
-        far = np.pad(r2.sum(axis=(-1,-2)), (1,0),constant_values=1)
+        near, far = count_neighbours(padded, n_iters)
         if n_iters < 3:
             new_map = (near > 4) | (far < 2)
         else:
@@ -34,6 +97,93 @@ def create_map(height, width, wall_threshold, closed=False) -> np.ndarray:
     return map
 
 
+class FreeCells:
+    """
+    A pool of the open cells of a map that supports constant-time 
+    uniform sampling without replacement
+
+    The open cells are kept as flat indices in a NumPy array. The first
+    `len(self)` entries are the cells still available; taking a cell 
+    swaps it with the last available entry and shrinks the pool.
+    """
+
+    def __init__(self, map: np.ndarray):
+        self.shape = map.shape
+        self.cells = np.flatnonzero(~map.astype(bool))
+        self.slots = np.full(map.size, -1, dtype=np.intp)
+        self.slots[self.cells] = np.arange(len(self.cells))
+        self.count = len(self.cells)
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, cell: tuple[int, int]) -> bool:
+        return self.slots[np.ravel_multi_index(cell, self.shape)] >= 0
+
+    def _take_slot(self, slot: int) -> tuple[int, int]:
+        last = self.count - 1
+        cell = self.cells[slot]
+        moved = self.cells[last]
+        self.cells[slot], self.cells[last] = moved, cell
+        self.slots[moved] = slot
+        self.slots[cell] = -1
+        self.count = last
+        return divmod(int(cell), self.shape[1])
+
+    def take(self, cell: tuple[int, int]):
+        """
+        Remove the (row, column) `cell` from the pool if it is present
+        """
+        slot = self.slots[np.ravel_multi_index(cell, self.shape)]
+        if slot >= 0:
+            self._take_slot(slot)
+
+    def sample(self, rng, mask: np.ndarray | None = None) -> tuple[int, int]:
+        """
+        Remove and return a uniformly chosen (row, column) cell
+
+        rng: a `random.Random` used to make the choice
+        mask: an optional boolean array the shape of the map; if given,
+            only cells where `mask` is True are considered. Unmasked sampling
+            is O(1); masked sampling filters the pool in one vectorized pass
+
+        Raises IndexError if there is no cell to choose from
+        """
+        if mask is None:
+            if not self.count:
+                raise IndexError("No free cells left")
+            return self._take_slot(rng.randrange(self.count))
+        candidates = np.flatnonzero(mask.ravel()[self.cells[:self.count]])
+        if not len(candidates):
+            raise IndexError("No free cells left in region")
+        return self._take_slot(candidates[rng.randrange(len(candidates))])
+
+    def sample_many(self, rng, count: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Remove `count` distinct, uniformly chosen cells at once
+
+        The chosen cells move to the end of the pool in one vectorized
+        pass, rather than one swap per cell.
+
+        returns: the rows and columns of the cells, as arrays
+        Raises IndexError if there are fewer than `count` free cells
+        """
+        if count > self.count:
+            raise IndexError("Not enough free cells left")
+        chosen_slots = np.array(rng.sample(range(self.count), count), dtype=np.intp)
+        pool = self.cells[:self.count]
+        keep = np.ones(self.count, dtype=bool)
+        keep[chosen_slots] = False
+        chosen = pool[chosen_slots]
+        remaining = pool[keep]
+        self.count -= count
+        pool[:self.count] = remaining
+        pool[self.count:] = chosen
+        self.slots[remaining] = np.arange(self.count)
+        self.slots[chosen] = -1
+        return np.divmod(chosen, self.shape[1])
+
+
 def to_rgb(map, wall:Graphic, floor: Graphic)  -> np.ndarray:
     new = np.zeros(map.shape, dtype=tcod.console.rgb_graphic)
     is_wall = map != 0
@@ -47,4 +197,4 @@ def to_string(map: np.array, wall="x", floor="."):
     """
     Convert a map to its string representation
     """
-    return "\n".join("".join(row) for row in np.where(map,wall,floor))
\ No newline at end of file
+    return "\n".join("".join(row) for row in np.where(map,wall,floor))
@@ -0,0 +1,104 @@
+import contextlib
+import json
+import time
+from collections import deque
+import numpy as np
+
+__all__ = ["Profiler", "profiler"]
+
+
+class _Stage:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+
+
+_NOT_TIMED = contextlib.nullcontext()
+
+
+class Profiler:
+    """
+    Times the stages of each turn and keeps the last `window` timings of
+    every stage, along with the latest entity counts
+
+    Wrap each stage in `with profiler.stage(name):` and call `end_turn`
+    once the turn is over. While disabled, `stage` hands back a shared
+    do-nothing context and `count` and `end_turn` return at once, so the
+    instrumentation can stay in place.
+
+    With a `trace` path, every turn is also appended to that file as one
+    line of JSON. A stage that runs between turns, like drawing, is
+    reported with the turn that follows it.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.window = 256
+        self.turn = 0
+        self.timings: dict[str, deque[float]] = {}
+        self.counts: dict[str, int] = {}
+        self._current: dict[str, float] = {}
+        self._trace = None
+
+    def enable(self, window: int = 256, trace: str | None = None):
+        self.disable()
+        self.enabled = True
+        self.window = window
+        self.timings = {}
+        if trace:
+            self._trace = open(trace, "a", buffering=1)
+
+    def disable(self):
+        self.enabled = False
+        if self._trace is not None:
+            self._trace.close()
+            self._trace = None
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return _NOT_TIMED
+        return _Stage(self, name)
+
+    def record(self, name: str, seconds: float):
+        timings = self.timings.get(name)
+        if timings is None:
+            timings = self.timings[name] = deque(maxlen=self.window)
+        timings.append(seconds)
+        self._current[name] = self._current.get(name, 0.0) + seconds
+
+    def count(self, name: str, value: int):
+        if self.enabled:
+            self.counts[name] = value
+
+    def end_turn(self):
+        if not self.enabled:
+            return
+        self.turn += 1
+        if self._trace is not None:
+            line = {"turn": self.turn,
+                    "ms": {name: round(seconds * 1e3, 4) for name, seconds in self._current.items()},
+                    "counts": self.counts}
+            self._trace.write(json.dumps(line) + "\n")
+        self._current = {}
+
+    def summary(self) -> list[tuple[str, float, float, float]]:
+        """
+        returns: (stage, p50, p95, max) for every stage, in seconds
+        """
+        rows = []
+        for name, timings in self.timings.items():
+            samples = np.fromiter(timings, dtype=float, count=len(timings))
+            p50, p95 = np.percentile(samples, [50, 95])
+            rows.append((name, float(p50), float(p95), float(samples.max())))
+        return rows
+
+
+profiler = Profiler()
@@ -0,0 +1,137 @@
+import numpy as np
+from tcod.ecs import Entity, Registry, callbacks
+from rhizome.game.components import BoundingBox, Graphic, Position, Vector
+from rhizome.game.tags import Player, Solid
+
+__all__ = ["SpriteLayer", "get_sprite_layer", "on_sprite_changed"]
+
+ITEM_LAYER, ACTOR_LAYER, PLAYER_LAYER = range(3)
+""" Draw layers; where entities share a cell, the highest layer is drawn """
+
+
+class SpriteLayer:
+    """
+    The drawable entities of a level, kept as parallel arrays
+
+    Each entity with both a `Position` and a `Graphic` owns a slot holding
+    its coordinates, its draw layer and an index into `palette`, the
+    distinct glyph and colour combinations in use. `draw` culls the slots
+    against the camera and writes each channel of the viewport with a
+    single scatter.
+
+    Slots are kept in sync by `on_sprite_changed`.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.slots: dict[Entity, int] = {}
+        self._free_slots: list[int] = []
+        self.x = np.zeros(capacity, dtype=np.int32)
+        self.y = np.zeros(capacity, dtype=np.int32)
+        self.layer = np.zeros(capacity, dtype=np.int8)
+        self.graphic = np.zeros(capacity, dtype=np.int32)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.palette: dict[tuple, int] = {}
+        self.ch = np.zeros(0, dtype=np.int32)
+        self.fg = np.zeros((0, 3), dtype=np.uint8)
+        self.bg = np.zeros((0, 3), dtype=np.uint8)
+        self.count = 0
+
+    def __len__(self):
+        return len(self.slots)
+
+    def _palette_index(self, graphic: Graphic) -> int:
+        key = (graphic.ch, tuple(graphic.fg), tuple(graphic.bg))
+        index = self.palette.get(key)
+        if index is None:
+            index = self.palette[key] = len(self.palette)
+            self.ch = np.append(self.ch, graphic.ch)
+            self.fg = np.append(self.fg, [graphic.fg], axis=0)
+            self.bg = np.append(self.bg, [graphic.bg], axis=0)
+        return index
+
+    def _new_slot(self, entity: Entity) -> int:
+        if self._free_slots:
+            slot = self._free_slots.pop()
+        else:
+            slot = self.count
+            self.count += 1
+            if slot >= len(self.alive):
+                for name in ("x", "y", "layer", "graphic", "alive"):
+                    column = np.resize(getattr(self, name), 2 * slot)
+                    column[slot:] = 0
+                    setattr(self, name, column)
+        self.slots[entity] = slot
+        self.alive[slot] = True
+        return slot
+
+    def update(self, entity: Entity, position: Vector, graphic: Graphic):
+        slot = self.slots.get(entity)
+        if slot is None:
+            slot = self._new_slot(entity)
+            if Player in entity.tags:
+                self.layer[slot] = PLAYER_LAYER
+            elif Solid in entity.tags:
+                self.layer[slot] = ACTOR_LAYER
+            else:
+                self.layer[slot] = ITEM_LAYER
+        self.x[slot], self.y[slot] = position.x, position.y
+        self.graphic[slot] = self._palette_index(graphic)
+
+    def remove(self, entity: Entity):
+        slot = self.slots.pop(entity, None)
+        if slot is not None:
+            self.alive[slot] = False
+            self._free_slots.append(slot)
+
+    def draw(self, rgb: np.ndarray, bounds: BoundingBox):
+        """
+        Draw every sprite inside `bounds` into `rgb`, the console
+        cells covering the camera's viewport
+        """
+        height, width = rgb.shape
+        x = self.x[:self.count] - bounds.left
+        y = self.y[:self.count] - bounds.top
+        slots = np.flatnonzero(self.alive[:self.count]
+                               & (0 <= x) & (x < width) & (0 <= y) & (y < height))
+        if not len(slots):
+            return
+        # order by cell, then layer, and keep only the top sprite in each cell
+        cells = y[slots] * width + x[slots]
+        order = np.lexsort((self.layer[slots], cells))
+        slots, cells = slots[order], cells[order]
+        top = np.append(cells[1:] != cells[:-1], True)
+        slots = slots[top]
+
+        ys, xs = y[slots], x[slots]
+        graphics = self.graphic[slots]
+        rgb["ch"][ys, xs] = self.ch[graphics]
+        rgb["fg"][ys, xs] = self.fg[graphics]
+        rgb["bg"][ys, xs] = self.bg[graphics]
+
+
+def get_sprite_layer(world: Registry) -> SpriteLayer:
+    """
+    Return the sprite layer for the level in `world`, creating it on first use
+    """
+    layer = world[None].components.get(SpriteLayer)
+    if layer is None:
+        layer = world[None].components[SpriteLayer] = SpriteLayer()
+        for entity in world.Q.all_of(components=[Position, Graphic]):
+            layer.update(entity, entity.components[Position], entity.components[Graphic])
+    return layer
+
+
+def on_sprite_changed(entity: Entity, old, new):
+    layer = entity.registry[None].components.get(SpriteLayer)
+    if layer is None or old == new:
+        return
+    position = entity.components.get(Position)
+    graphic = entity.components.get(Graphic)
+    if position is None or graphic is None:
+        layer.remove(entity)
+    else:
+        layer.update(entity, position, graphic)
+
+
+callbacks.register_component_changed(component=Position)(on_sprite_changed)
+callbacks.register_component_changed(component=Graphic)(on_sprite_changed)
@@ -0,0 +1,315 @@
+import json
+import os
+from dataclasses import dataclass
+from random import Random
+import numpy as np
+from numpy.lib import recfunctions
+from tcod.ecs import Entity, Registry
+from rhizome.game import ai
+from rhizome.game.components import (AIRandom, Camera, CombatRandom, Graphic, KilledBy, LevelNo, Map, Name,
+                                     PlayerEntity, Position, Seed, Size, Stats, Trait, Vector)
+from rhizome.game.stats import get_stats_store
+from rhizome.game.strategies import Strategy
+from rhizome.game.world import STATE_MACHINES, Session
+
+__all__ = ["Snapshot", "entity_order", "encode", "write", "save", "read", "restore", "load", "VERSION"]
+
+MAGIC = b"RHZSNAP\x00"
+VERSION = 2
+""" Bumped whenever the layout changes; `read` refuses other versions """
+ALIGN = 64
+
+STATS_DTYPE = np.dtype([
+    ("health", "<i4"), ("max_health", "<i4"), ("strength", "<i4"),
+    ("damage_low", "<i4"), ("damage_high", "<i4"),
+    ("toughness", "<i4"), ("toxicity", "<i4"), ("camoflauge", "<i4"), ("digestion", "<i4"),
+])
+
+(HAS_POSITION, HAS_GRAPHIC, HAS_STATS, HAS_STRATEGY, HAS_TRAIT,
+ HAS_SIZE, HAS_NAME, HAS_CAMERA, HAS_KILLED_BY) = (1 << bit for bit in range(9))
+""" Bits of the `flags` column marking which components an entity has """
+
+RANDOM_STREAMS = {"spawn": Random, "ai": AIRandom}
+GENERATORS = {"combat": CombatRandom}
+""" The level's NumPy generators, saved by their bit generator's state """
+
+
+@dataclass
+class Snapshot:
+    """
+    A saved level as read from disk
+
+    `meta` holds the level's scalars and lookup tables; `arrays` holds
+    the bit-packed map and one column per entity component, each a view
+    onto the memory-mapped file.
+    """
+    meta: dict
+    arrays: dict[str, np.ndarray]
+
+    @property
+    def map(self) -> np.ndarray:
+        shape = self.meta["shape"]
+        return np.unpackbits(self.arrays["map"], count=shape[0] * shape[1]).reshape(shape).astype(bool)
+
+
+class _Table:
+    """ Interns values, numbering them in order of first appearance """
+
+    def __init__(self):
+        self.index: dict = {}
+
+    def __call__(self, value) -> int:
+        index = self.index.get(value)
+        if index is None:
+            index = self.index[value] = len(self.index)
+        return index
+
+    def values(self) -> list:
+        return list(self.index)
+
+
+def entity_order(world: Registry) -> list[Entity]:
+    """
+    The entities of `world` in the order they are saved: enemies first
+    and in AI row order, so a loaded level takes its turns in the same order
+    """
+    enemy_ai = world[None].components.get(ai.EnemyAI)
+    ordered = list(enemy_ai.entities) if enemy_ai is not None else []
+    seen = set(ordered)
+    for entity in world.Q.all_of(components=[Position]):
+        if entity not in seen:
+            ordered.append(entity)
+    return ordered
+
+
+def save(world: Registry, path: str | os.PathLike):
+    """
+    Write the level in `world` to `path`
+    """
+    write(path, *encode(world))
+
+
+def encode(world: Registry, entities: list[Entity] | None = None, **extra) -> tuple[dict, dict[str, np.ndarray]]:
+    """
+    Copy the level in `world` into the header fields and arrays of a
+    snapshot, without touching the disk
+
+    entities: the entities to save, as returned by `entity_order`
+    extra: more header fields, handed back in the `meta` of the snapshot
+    """
+    if entities is None:
+        entities = entity_order(world)
+    count = len(entities)
+    flags = np.zeros(count, dtype=np.uint16)
+    tags = np.zeros(count, dtype=np.int16)
+    position = np.zeros((count, 2), dtype=np.int16)
+    graphic = np.full(count, -1, dtype=np.int16)
+    stats = np.zeros(count, dtype=STATS_DTYPE)
+    strategy = np.zeros((count, 3), dtype=np.int16)
+    awake_until = np.zeros(count, dtype=np.int32)
+    trait = np.full(count, -1, dtype=np.int16)
+    size = np.zeros(count, dtype=np.int16)
+    name = np.full(count, -1, dtype=np.int16)
+    killed_by = np.full(count, -1, dtype=np.int16)
+    camera = np.zeros((count, 3), dtype=np.int16)
+
+    tagsets, palette, strings, machines = _Table(), _Table(), _Table(), _Table()
+    rows = {entity: row for row, entity in enumerate(entities)}
+    player = world[None].components.get(PlayerEntity)
+    player_row = rows.get(player, -1)
+    for row, entity in enumerate(entities):
+        tags[row] = tagsets(tuple(sorted(entity.tags)))
+
+    def column(key, flag) -> list[tuple[int, object]]:
+        # one query per component is far cheaper than looking components up entity
+        # by entity; sorting by row keeps the lookup tables, and so the file, stable
+        found = sorted((rows[entity], value) for entity, value in world.Q[Entity, key] if entity in rows)
+        for row, _ in found:
+            flags[row] |= flag
+        return found
+
+    for row, value in column(Position, HAS_POSITION):
+        position[row] = value.x, value.y
+    for row, value in column(Graphic, HAS_GRAPHIC):
+        graphic[row] = palette((value.char, tuple(value.fg), tuple(value.bg)))
+    found = column(Stats, HAS_STATS)
+    if found:
+        # read straight from the level's stats arrays rather than through each view
+        stats_rows = np.array([row for row, _ in found], dtype=np.intp)
+        store = get_stats_store(world)
+        table = store.table(store.rows_of([entities[row] for row in stats_rows]))
+        stats[stats_rows] = recfunctions.unstructured_to_structured(table, dtype=STATS_DTYPE)
+    for row, value in column(Strategy, HAS_STRATEGY):
+        strategy[row] = machines(value.machine.name), value.state, value.timer
+    for row, value in column(Trait, HAS_TRAIT):
+        trait[row] = strings(value) if value is not None else -1
+    for row, value in column(Size, HAS_SIZE):
+        size[row] = value
+    for row, value in column(Name, HAS_NAME):
+        name[row] = strings(value)
+    for row, value in column(KilledBy, HAS_KILLED_BY):
+        killed_by[row] = strings(value)
+    for row, value in column(Camera, HAS_CAMERA):
+        camera[row] = value.height, value.width, value.tracking_radius
+    enemy_ai = world[None].components.get(ai.EnemyAI)
+    if enemy_ai is not None:
+        enemies = len(enemy_ai)
+        awake_until[:enemies] = enemy_ai.awake_until[:enemies]
+
+    map = np.asarray(world[None].components[Map], dtype=bool)
+    arrays = {
+        "map": np.packbits(map), "flags": flags, "tags": tags, "position": position,
+        "graphic": graphic, "stats": stats, "strategy": strategy, "awake_until": awake_until,
+        "trait": trait, "size": size, "name": name, "killed_by": killed_by, "camera": camera,
+    }
+    meta = {
+        "level": world[None].components.get(LevelNo),
+        "seed": world[None].components.get(Seed),
+        "shape": list(map.shape),
+        "entities": count,
+        "player": player_row,
+        "tagsets": [list(tagset) for tagset in tagsets.values()],
+        "palette": [[char, list(fg), list(bg)] for char, fg, bg in palette.values()],
+        "strings": strings.values(),
+        "machines": machines.values(),
+        "ai_turn": enemy_ai.turn if enemy_ai is not None else 0,
+        "random": {stream: world[None].components[key].getstate()
+                   for stream, key in RANDOM_STREAMS.items() if key in world[None].components},
+        "generators": {stream: world[None].components[key].bit_generator.state
+                       for stream, key in GENERATORS.items() if key in world[None].components},
+        **extra,
+    }
+    return meta, arrays
+
+
+def write(path: str | os.PathLike, meta: dict, arrays: dict[str, np.ndarray]):
+    """
+    Write an encoded snapshot to `path`
+
+    The file is written beside `path` and moved into place, so a crash
+    never leaves a half-written snapshot behind.
+    """
+    layout = {}
+    offset = 0
+    for key, array in arrays.items():
+        layout[key] = {"dtype": array.dtype.descr if array.dtype.names else array.dtype.str,
+                       "shape": list(array.shape), "offset": offset}
+        offset += -(-array.nbytes // ALIGN) * ALIGN
+    header = json.dumps({"version": VERSION, "meta": meta, "arrays": layout}).encode()
+    start = -(-(len(MAGIC) + 8 + len(header)) // ALIGN) * ALIGN
+
+    temporary = f"{os.fspath(path)}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(MAGIC)
+        file.write(np.array([VERSION, len(header)], dtype="<u4").tobytes())
+        file.write(header)
+        for key, array in arrays.items():
+            file.seek(start + layout[key]["offset"])
+            file.write(np.ascontiguousarray(array).data)
+        file.truncate(start + offset)
+    os.replace(temporary, path)
+
+
+def read(path: str | os.PathLike) -> Snapshot:
+    """
+    Map the snapshot at `path` into memory without copying its arrays
+    """
+    buffer = np.memmap(path, dtype=np.uint8, mode="r")
+    if bytes(buffer[:len(MAGIC)]) != MAGIC:
+        raise ValueError(f"{os.fspath(path)} is not a level snapshot")
+    version, header_length = np.frombuffer(buffer, dtype="<u4", count=2, offset=len(MAGIC))
+    if version != VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}; expected {VERSION}")
+    header_end = len(MAGIC) + 8 + int(header_length)
+    header = json.loads(bytes(buffer[len(MAGIC) + 8:header_end]))
+    start = -(-header_end // ALIGN) * ALIGN
+    arrays = {}
+    for key, layout in header["arrays"].items():
+        dtype = np.dtype([tuple(field) for field in layout["dtype"]] if isinstance(layout["dtype"], list)
+                         else layout["dtype"])
+        shape = tuple(layout["shape"])
+        count = int(np.prod(shape))
+        arrays[key] = np.frombuffer(buffer, dtype=dtype, count=count,
+                                    offset=start + layout["offset"]).reshape(shape)
+    return Snapshot(header["meta"], arrays)
+
+
+def load(source: str | os.PathLike | Snapshot, session: Session | None = None) -> Registry:
+    """
+    Rebuild the level saved in `source` as a new registry belonging
+    to `session`; making it the session's current level is up to the caller
+    """
+    snapshot = source if isinstance(source, Snapshot) else read(source)
+    return restore(snapshot, session)[0]
+
+
+def restore(snapshot: Snapshot, session: Session | None = None) -> tuple[Registry, list[Entity]]:
+    """
+    Like `load`, but also returns the rebuilt entities in row order
+    """
+    meta, arrays = snapshot.meta, snapshot.arrays
+    machines = session.state_machines if session is not None else STATE_MACHINES
+
+    world = Registry()
+    if session is not None:
+        world[None].components[Session] = session
+    if meta["level"] is not None:
+        world[None].components[LevelNo] = meta["level"]
+    if meta["seed"] is not None:
+        world[None].components[Seed] = meta["seed"]
+    for stream, key in RANDOM_STREAMS.items():
+        if stream in meta["random"]:
+            version, state, gauss = meta["random"][stream]
+            rng = world[None].components[key] = Random()
+            rng.setstate((version, tuple(state), gauss))
+    for stream, key in GENERATORS.items():
+        if stream in meta["generators"]:
+            rng = world[None].components[key] = np.random.default_rng()
+            rng.bit_generator.state = meta["generators"][stream]
+    world[None].components[Map] = snapshot.map
+    enemy_ai = ai.get_enemy_ai(world)
+    enemy_ai.turn = meta["ai_turn"]
+
+    tagsets = [set(tagset) for tagset in meta["tagsets"]]
+    palette = [Graphic(char, tuple(fg), tuple(bg)) for char, fg, bg in meta["palette"]]
+    strings = meta["strings"]
+    kinds = [machines[name] for name in meta["machines"]]
+    # plain lists index much faster than arrays one element at a time
+    columns = {key: arrays[key].tolist() for key in arrays if key != "map"}
+    flags = columns["flags"]
+
+    entities = [world.new_entity() for _ in range(meta["entities"])]
+    # every entity's stats go into the level's stats arrays in one copy;
+    # attaching each view below then finds its row already filled
+    stats_rows = np.flatnonzero(arrays["flags"] & HAS_STATS)
+    views = get_stats_store(world).extend([entities[row] for row in stats_rows],
+                                          recfunctions.structured_to_unstructured(arrays["stats"][stats_rows]))
+    stats = dict(zip(stats_rows.tolist(), views))
+    for row, entity in enumerate(entities):
+        bits = flags[row]
+        entity.tags |= tagsets[columns["tags"][row]]
+        components = entity.components
+        if bits & HAS_CAMERA:
+            components[Camera] = Camera(*columns["camera"][row])
+        if bits & HAS_NAME:
+            components[Name] = strings[columns["name"][row]]
+        if bits & HAS_STATS:
+            components[Stats] = stats[row]
+        if bits & HAS_GRAPHIC:
+            components[Graphic] = palette[columns["graphic"][row]]
+        if bits & HAS_POSITION:
+            components[Position] = Vector(*columns["position"][row])
+        if bits & HAS_STRATEGY:
+            kind, state, timer = columns["strategy"][row]
+            components[Strategy] = Strategy(kinds[kind], state, timer)
+            enemy_ai.awake_until[enemy_ai.rows[entity]] = columns["awake_until"][row]
+        if bits & HAS_TRAIT:
+            index = columns["trait"][row]
+            components[Trait] = strings[index] if index >= 0 else None
+        if bits & HAS_SIZE:
+            components[Size] = columns["size"][row]
+        if bits & HAS_KILLED_BY:
+            components[KilledBy] = strings[columns["killed_by"][row]]
+    if meta["player"] >= 0:
+        world[None].components[PlayerEntity] = entities[meta["player"]]
+    return world, entities
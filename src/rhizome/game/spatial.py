@@ -0,0 +1,222 @@
+import numpy as np
+from tcod.ecs import Entity, Registry, callbacks
+from rhizome.game.components import BoundingBox, Camera, Map, Position, Vector
+from rhizome.game.tags import Solid
+
+__all__ = ["Occupancy", "get_occupancy", "on_position_changed"]
+
+
+class Occupancy:
+    """
+    A dense spatial index over the entities on a level
+
+    `heads` is an int32 grid holding, for every cell, the id of the first
+    entity standing there (or -1). Entities sharing a cell are chained
+    through `_next`, with any solid entity kept at the front of the chain,
+    so `entity_at` and `solid_at` are single lookups. `solid` is a boolean
+    grid marking the cells that hold a solid entity.
+
+    The index is kept in sync with `Position` components by
+    `on_position_changed`; nothing else should need to update it. The ECS
+    has no callback for tags, so `get_occupancy` checks the `Solid` tag
+    for changes each time it hands out the index instead.
+    """
+
+    def __init__(self, map: np.ndarray, world: Registry | None = None):
+        self.walls = np.asarray(map) != 0
+        self.heads = np.full(self.walls.shape, -1, dtype=np.int32)
+        self.solid = np.zeros(self.walls.shape, dtype=bool)
+        self._next = np.full(64, -1, dtype=np.int32)
+        self._is_solid = np.zeros(64, dtype=bool)
+        self._entities: list[Entity | None] = []
+        self._ids: dict[Entity, int] = {}
+        self._free_ids: list[int] = []
+        self._solid_entities: set[Entity] = set()
+        self._solid_query = world.Q.all_of(tags=[Solid]) if world is not None else None
+        self._solid_seen = None
+
+    @property
+    def shape(self):
+        return self.walls.shape
+
+    def __len__(self):
+        return len(self._ids)
+
+    def in_bounds(self, position: Vector) -> bool:
+        return 0 <= position.y < self.shape[0] and 0 <= position.x < self.shape[1]
+
+    def is_wall(self, position: Vector) -> bool:
+        """
+        Whether `position` is impassable terrain; anywhere off the map counts as wall
+        """
+        return not self.in_bounds(position) or bool(self.walls[position.y, position.x])
+
+    def is_blocked(self, position: Vector) -> bool:
+        """
+        Whether `position` is a wall or holds a solid entity
+        """
+        return self.is_wall(position) or bool(self.solid[position.y, position.x])
+
+    def entity_at(self, position: Vector) -> Entity | None:
+        """
+        Return an entity at `position`, preferring a solid one, or None
+        """
+        if not self.in_bounds(position):
+            return None
+        head = self.heads[position.y, position.x]
+        return self._entities[head] if head >= 0 else None
+
+    def solid_at(self, position: Vector) -> Entity | None:
+        """
+        Return the solid entity at `position`, or None
+        """
+        if not self.in_bounds(position) or not self.solid[position.y, position.x]:
+            return None
+        return self._entities[self.heads[position.y, position.x]]
+
+    def entities_at(self, position: Vector) -> list[Entity]:
+        """
+        Return every entity at `position`
+        """
+        if not self.in_bounds(position):
+            return []
+        return list(self._chain(self.heads[position.y, position.x]))
+
+    def in_box(self, box: BoundingBox) -> list[Entity]:
+        """
+        Return every entity inside the half-open bounding box `box`
+        """
+        top, left = max(box.top, 0), max(box.left, 0)
+        heads = self.heads[top:max(box.bottom, 0), left:max(box.right, 0)]
+        return [entity for head in heads[heads >= 0] for entity in self._chain(head)]
+
+    def in_radius(self, center: Vector, radius: int) -> list[Entity]:
+        """
+        Return every entity within euclidean distance `radius` of `center`
+        """
+        top, left = max(center.y - radius, 0), max(center.x - radius, 0)
+        heads = self.heads[top:max(center.y + radius + 1, 0), left:max(center.x + radius + 1, 0)]
+        rows, columns = np.ogrid[top:top + heads.shape[0], left:left + heads.shape[1]]
+        inside = (rows - center.y) ** 2 + (columns - center.x) ** 2 <= radius ** 2
+        return [entity for head in heads[(heads >= 0) & inside] for entity in self._chain(head)]
+
+    def sync_solid(self):
+        """
+        Re-index the entities that gained or lost the `Solid` tag since the last check
+        """
+        if self._solid_query is None:
+            return
+        # the query is cached until the tag changes, so a new set means something changed
+        solid = self._solid_query.get_entities()
+        if solid is self._solid_seen:
+            return
+        self._solid_seen = solid
+        for entity in solid ^ self._solid_entities:
+            if entity in self._ids:
+                position = entity.components[Position]
+                self.remove(entity, position, release=False)
+                self.add(entity, position)
+
+    def _chain(self, head: int):
+        while head >= 0:
+            yield self._entities[head]
+            head = self._next[head]
+
+    def _new_id(self, entity: Entity) -> int:
+        if self._free_ids:
+            id = self._free_ids.pop()
+            self._entities[id] = entity
+        else:
+            id = len(self._entities)
+            self._entities.append(entity)
+            if id >= len(self._next):
+                self._next = np.resize(self._next, 2 * id)
+                self._is_solid = np.resize(self._is_solid, 2 * id)
+        self._ids[entity] = id
+        return id
+
+    def add(self, entity: Entity, position: Vector):
+        id = self._ids.get(entity)
+        if id is None:
+            id = self._new_id(entity)
+        solid = self._is_solid[id] = Solid in entity.tags
+        if solid:
+            self._solid_entities.add(entity)
+        else:
+            self._solid_entities.discard(entity)
+        y, x = position.y, position.x
+        head = self.heads[y, x]
+        if head >= 0 and not solid and self._is_solid[head]:
+            # keep the solid occupant at the front of the chain
+            self._next[id] = self._next[head]
+            self._next[head] = id
+        else:
+            self._next[id] = head
+            self.heads[y, x] = id
+        self.solid[y, x] |= solid
+
+    def remove(self, entity: Entity, position: Vector, release: bool = True):
+        id = self._ids.get(entity)
+        if id is None:
+            return
+        y, x = position.y, position.x
+        previous, current = -1, self.heads[y, x]
+        while current >= 0 and current != id:
+            previous, current = current, self._next[current]
+        if current == id:
+            if previous < 0:
+                self.heads[y, x] = self._next[id]
+            else:
+                self._next[previous] = self._next[id]
+            if self._is_solid[id]:
+                head = self.heads[y, x]
+                self.solid[y, x] = head >= 0 and self._is_solid[head]
+        if release:
+            self._solid_entities.discard(entity)
+            del self._ids[entity]
+            self._entities[id] = None
+            self._free_ids.append(id)
+
+
+def get_occupancy(world: Registry) -> Occupancy | None:
+    """
+    Return the occupancy index for the level in `world`,
+    creating it from the level's `Map` on first use
+
+    Returns None if the level has no map yet
+    """
+    occupancy = _get_index(world)
+    if occupancy is not None:
+        occupancy.sync_solid()
+    return occupancy
+
+
+def _get_index(world: Registry) -> Occupancy | None:
+    occupancy = world[None].components.get(Occupancy)
+    if occupancy is None:
+        map = world[None].components.get(Map)
+        if map is None:
+            return None
+        occupancy = world[None].components[Occupancy] = Occupancy(map, world)
+        for entity in world.Q.all_of(components=[Position]):
+            position = entity.components[Position]
+            if Camera not in entity.components and occupancy.in_bounds(position):
+                occupancy.add(entity, position)
+    return occupancy
+
+
+@callbacks.register_component_changed(component=Position)
+def on_position_changed(entity: Entity, old: Vector | None, new: Vector | None):
+    if old == new or Camera in entity.components:
+        return
+    # not `get_occupancy`: the entity's indexed position is out of date until this returns
+    occupancy = entity.registry[None].components.get(Occupancy)
+    if occupancy is None:
+        # building the index picks the entity up where it now stands
+        _get_index(entity.registry)
+        return
+    placed = new is not None and occupancy.in_bounds(new)
+    if old is not None and occupancy.in_bounds(old):
+        occupancy.remove(entity, old, release=not placed)
+    if placed:
+        occupancy.add(entity, new)
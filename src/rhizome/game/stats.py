@@ -0,0 +1,141 @@
+import numpy as np
+from tcod.ecs import Entity, Registry, callbacks
+from rhizome.game.components import STAT_FIELDS, Stats
+
+__all__ = ["StatsStore", "get_stats_store", "on_stats_changed"]
+
+def _column(index: int) -> property:
+    def get(self) -> np.ndarray:
+        return self.columns[index][:len(self.entities)]
+    return property(get, doc=f"The live `{STAT_FIELDS[index]}` column, one row per entity")
+
+
+class StatsStore:
+    """
+    The stats of every entity on a level, stored as parallel arrays
+
+    Row `i` of each column in `columns` belongs to `entities[i]`, whose
+    `Stats` component is `views[i]`, a view onto that row. Reading or
+    changing a `Stats` works as it always has, one entity at a time, while
+    level-wide work like combat in `combat.resolve` and the death sweep in
+    `dead` runs as single array operations on the columns.
+
+    Rows are added and removed by `on_stats_changed`, so the arrays follow
+    the `Stats` components without any bookkeeping by callers. A `Stats`
+    is a view onto one row at a time: attaching it to another entity, or
+    carrying it onto another level, moves it there.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.columns = [np.zeros(capacity, dtype=np.int32) for _ in STAT_FIELDS]
+        self.entities: list[Entity] = []
+        self.views: list[Stats] = []
+        self.rows: dict[Entity, int] = {}
+
+    health = _column(0)
+    max_health = _column(1)
+    strength = _column(2)
+    damage_low = _column(3)
+    damage_high = _column(4)
+    toughness = _column(5)
+    toxicity = _column(6)
+    camoflauge = _column(7)
+    digestion = _column(8)
+
+    def __len__(self):
+        return len(self.entities)
+
+    def add(self, entity: Entity, stats: Stats):
+        row = self.rows.get(entity)
+        if row is not None and self.views[row] is stats:
+            return
+        values = stats.values()
+        if stats._store is not None:
+            stats._store.remove(stats._store.entities[stats._row])
+            # removing a row from this store can move `entity` into it
+            row = self.rows.get(entity)
+        if row is None:
+            row = self.rows[entity] = len(self.entities)
+            self.entities.append(entity)
+            self.views.append(stats)
+            if row >= len(self.columns[0]):
+                # resized in place, so the views bound to the list see the new arrays
+                self.columns[:] = [np.resize(column, 2 * row) for column in self.columns]
+        else:
+            self.views[row]._detach()
+            self.views[row] = stats
+        for column, value in zip(self.columns, values):
+            column[row] = value
+        stats._bind(self, self.columns, row)
+
+    def remove(self, entity: Entity):
+        row = self.rows.pop(entity, None)
+        if row is None:
+            return
+        self.views[row]._detach()
+        last = len(self.entities) - 1
+        moved, view = self.entities.pop(), self.views.pop()
+        if row != last:
+            self.entities[row], self.views[row] = moved, view
+            self.rows[moved] = row
+            view._row = row
+            for column in self.columns:
+                column[row] = column[last]
+
+    def extend(self, entities: list[Entity], values: np.ndarray) -> list[Stats]:
+        """
+        Add rows for `entities`, which mustn't have stats yet, holding
+        `values`, one row of `STAT_FIELDS` per entity, in one copy per column
+
+        returns: the views onto the new rows; attaching them to their
+            entities then finds the rows already in place
+        """
+        start = len(self.entities)
+        end = start + len(entities)
+        if end > len(self.columns[0]):
+            self.columns[:] = [np.resize(column, 2 * end) for column in self.columns]
+        for column, field in zip(self.columns, np.asarray(values).T):
+            column[start:end] = field
+        views = []
+        for row, entity in enumerate(entities, start):
+            view = Stats.__new__(Stats)
+            view._bind(self, self.columns, row)
+            self.rows[entity] = row
+            views.append(view)
+        self.entities.extend(entities)
+        self.views.extend(views)
+        return views
+
+    def table(self, rows: np.ndarray) -> np.ndarray:
+        """ The stats in `rows` as one row of `STAT_FIELDS` each """
+        return np.stack([column[rows] for column in self.columns], axis=1)
+
+    def rows_of(self, entities) -> np.ndarray:
+        """ The rows of `entities`, which must all have stats, as an array """
+        rows = self.rows
+        return np.fromiter((rows[entity] for entity in entities), dtype=np.intp, count=len(entities))
+
+    def dead(self) -> list[Entity]:
+        """ Every entity whose health has run out, in row order """
+        return [self.entities[row] for row in np.flatnonzero(self.health <= 0)]
+
+
+def get_stats_store(world: Registry) -> StatsStore:
+    """
+    Return the stats arrays for the level in `world`, creating them on first use
+    """
+    store = world[None].components.get(StatsStore)
+    if store is None:
+        store = world[None].components[StatsStore] = StatsStore()
+        for entity, stats in world.Q[Entity, Stats]:
+            store.add(entity, stats)
+    return store
+
+
+@callbacks.register_component_changed(component=Stats)
+def on_stats_changed(entity: Entity, old: Stats | None, new: Stats | None):
+    store = get_stats_store(entity.registry)
+    if new is None:
+        store.remove(entity)
+    else:
+        store.add(entity, new)
@@ -1,240 +1,334 @@
 from dataclasses import dataclass
-from random import Random
-from typing import Final, Protocol
-from  tcod.ecs import Entity
+from functools import cache
+from typing import Final
+import numpy as np
+from  tcod.ecs import Entity, Registry
+from tcod.constants import FOV_SYMMETRIC_SHADOWCAST
 from tcod.map import compute_fov
-from tcod.path import Pathfinder, SimpleGraph
-from rhizome.game.components import Map, Position, Stats, Vector
-from rhizome.game.tags import Beetle, Centipede, Player, Solid, PillBug, Spider
-import rhizome.game.world
-
-
-__all__ = ["Strategy", "SpiderStrategy", "PillbugStrategy", "STRATEGIES"]
-
-class Wandering:
-    pass
-
-class Hunting:
-    pass
-
-class Fighting:
-    pass
-
-class Waiting(int):
-    pass
-
-type AiState = Wandering | Hunting | Fighting | Waiting
-
-
-class Strategy(Protocol):
-    def next_state(self, entity) -> "Strategy":
-        ...
-
-    def movement(self, entity) -> AiState:
-        ...
-
-def move_towards(entity: Vector, target: Vector, distance: int = 1) -> Vector:
-    world = rhizome.game.world.world
-    map = world[None].components[Map]
-    cost = ~map
-    for object in world.Q.all_of(components=[Position], tags=[Solid]):
-        position = object.components[Position]
-        if position != target:
-            cost[position.y, position.x] = 0
-        
-    graph = SimpleGraph(cost=cost,cardinal=1,diagonal=0)
-    pathfinder = Pathfinder(graph)
-    pathfinder.add_root((entity.y, entity.x))
-    path = pathfinder.path_to((target.y, target.x))
-    if len(path) > distance:
-        return Vector(path[distance][1], path[distance][0]) - entity
-    elif len(path) > 1:
-        return Vector(path[-1][1], path[-1][0]) - entity
-    else:
-        return Vector(0,0)
+from tcod.path import dijkstra2d
+from rhizome.game.components import AIRandom, PlayerEntity, Position, Stats, Vector
+from rhizome.game.spatial import get_occupancy
+from rhizome.game.tags import Player
+
+
+__all__ = ["Strategy", "StateMachine", "Transition", "CONDITIONS", "MOVES"]
+
+CARDINALS: Final = tuple(Vector.offset(dx, dy) for dx, dy in ((-1,0), (1,0), (0,1), (0,-1)))
+
+UNREACHABLE: Final = np.iinfo(np.int32).max
+
+
+class FlowField:
+    """
+    The walking distance from every cell of a level to `target`
+
+    Distances are computed over the static terrain only, so one field
+    can be shared by every enemy heading for the same target. Cells
+    that cannot reach the target hold `UNREACHABLE`.
+    """
+
+    def __init__(self, walls: np.ndarray, target: Vector):
+        self.target = target
+        self.distance = np.full(walls.shape, UNREACHABLE, dtype=np.int32)
+        self.distance[target.y, target.x] = 0
+        dijkstra2d(self.distance, (~walls).astype(np.int8), cardinal=1, diagonal=0, out=self.distance)
+
+
+def flow_field(world: Registry, target: Vector) -> FlowField:
+    """
+    Return the flow field towards `target` for the level in `world`
+
+    The field is cached on the level and only recomputed when the
+    target moves, so it is built at most once per turn.
+    """
+    field = world[None].components.get(FlowField)
+    if field is None or field.target != target:
+        field = world[None].components[FlowField] = FlowField(get_occupancy(world).walls, target)
+    return field
+
+
+class Perception:
+    """
+    What every enemy can know about the player this turn
+
+    The player's field of view is computed once with a symmetric
+    algorithm, so an enemy can see the player exactly when the player's
+    field of view contains the enemy. It reaches `radius` cells, or
+    without limit if `radius` is 0.
+    """
+
+    def __init__(self, transparency: np.ndarray, player_position: Vector, radius: int = 0):
+        self.player_position = player_position
+        self.radius = radius
+        self.fov = compute_fov(
+            transparency, (player_position.y, player_position.x),
+            radius=radius, algorithm=FOV_SYMMETRIC_SHADOWCAST
+        )
+
+
+def perception(world: Registry) -> Perception:
+    """
+    Return this turn's `Perception` for the level in `world`
+
+    It depends only on the terrain and where the player stands, so it
+    is cached on the level and rebuilt only when the player moves. The
+    field of view reaches as far as the most alert kind of enemy in the
+    level's settings can notice the player from.
+    """
+    player_position = world[None].components[PlayerEntity].components[Position]
+    context = world[None].components.get(Perception)
+    if context is None or context.player_position != player_position:
+        transparency = ~get_occupancy(world).walls
+        context = world[None].components[Perception] = Perception(transparency, player_position,
+                                                                  perception_radius(world))
+    return context
+
+
+def perception_radius(world: Registry) -> int:
+    """ The largest `alert_radius` of the enemy kinds in the level's settings """
+    # world builds the config from this module, so it can only be imported once both are loaded
+    from rhizome.game.world import get_config
+    enemies = get_config(world).enemies.values()
+    return max((enemy.machine.alert_radius for enemy in enemies), default=0)
+
+
+def move_towards(world: Registry, entity: Vector, target: Vector, distance: int = 1) -> Vector:
+    """
+    Return the offset that moves `entity` up to `distance` steps
+    closer to `target` along the level's shared flow field
+
+    Each step goes to the nearest-to-target cardinal neighbour that
+    is not occupied by a solid entity (other than the target itself).
+    If every such neighbour is blocked, the move stops short.
+    """
+    occupancy = get_occupancy(world)
+    field = flow_field(world, target).distance
+    position = entity
+    for _ in range(distance):
+        if position == target:
+            break
+        best, best_distance = None, field[position.y, position.x]
+        for step in CARDINALS:
+            neighbour = position + step
+            if not occupancy.in_bounds(neighbour):
+                continue
+            neighbour_distance = field[neighbour.y, neighbour.x]
+            if neighbour_distance >= best_distance:
+                continue
+            if neighbour != target and occupancy.solid[neighbour.y, neighbour.x]:
+                continue
+            best, best_distance = neighbour, neighbour_distance
+        if best is None:
+            break
+        position = best
+    return position - entity
 
 def can_move(entity: Entity, direction: Vector) -> bool:
-    world  = entity.registry
+    occupancy = get_occupancy(entity.registry)
     position = entity.components[Position] + direction
-    map = world[None].components[Map]
-    if position.y >= map.shape[0] or position.x >= map.shape[1]:
-        return False
-    if map[position.y,position.x]:
+    if occupancy.is_wall(position):
         return False
-    q = world.Q.all_of(tags=[position, Solid]).none_of(tags=[Player])
-    return not bool(q)
-
-
-@dataclass
-class SpiderStrategy:
-    state: AiState = Wandering()
-    alert_radius: Final[int] = 20
-
-    def movement(self, entity: Entity) -> Vector:
-        position = entity.components[Position]
-
-        match self.state:
-            case Waiting(_):
-                return Vector(0,0)
-            case Hunting() | Fighting():
-                target = rhizome.game.world.player.components[Position]
-                return move_towards(position, target)
-            case Wandering():
-                rng = entity.registry[None].components[Random]
-                direction = rng.choice([pos for pos in ((-1,0),(1,0),(0,1),(0,-1)) 
-                                        if can_move(entity,pos)])
-                return Vector(*direction)
-        raise ValueError(f"Unable to match state {self.state}")
-
-    def next_state(self, entity: Entity)->AiState:
-        world = entity.registry
-        position = entity.components[Position]
-        map = world[None].components[Map]
-        player = rhizome.game.world.player
-        fov = compute_fov(~map, (position.y, position.x),radius=self.alert_radius)
-        player_position = player.components[Position]
-        visible = fov[player_position.y, player_position.x]
-        distance = player_position - position
-        adjacent = abs(distance.x) == 1 ^ abs(distance.y)==1
-        match self.state:
-            case Wandering():
-                if visible:
-                    return SpiderStrategy(Hunting())
-            case Hunting():
-                if adjacent:
-                    return SpiderStrategy(Fighting())
-                elif not visible:
-                    return SpiderStrategy(Waiting(4))
-            case Fighting():
-                if not adjacent:
-                    return SpiderStrategy(Hunting())
-            case Waiting(turns_left):
-                if visible:
-                    return SpiderStrategy(Hunting())
-                elif turns_left > 0:
-                    return SpiderStrategy(Waiting(turns_left - 1))
-                else:
-                    return SpiderStrategy(Wandering())
-        return self
-                
-
-@dataclass
-class PillbugStrategy:
-    state: AiState = Wandering()
-    perseverance: int = 3
-
-
-    def next_state(self, entity: Entity):
-        stats = entity.components[Stats]
-        player = rhizome.game.world.player
-        player_position = player.components[Position]
-        distance = player_position - entity.components[Position]
-        adjacent = abs(distance.x) == 1 ^ abs(distance.y)==1
-        injured = stats.health < stats.max_health
-
-        match self.state:
-            case Wandering():
-                if adjacent and injured:
-                    return PillbugStrategy(Fighting())
-                else:
-                    return PillbugStrategy(Waiting(0))
-            case Fighting():
-                if not adjacent:
-                    return PillbugStrategy(Hunting())
-            case Hunting():
-                if adjacent:
-                    return PillbugStrategy(Fighting())
-                elif self.perseverance == 0:
-                    return PillbugStrategy(Wandering())
-                else:
-                    return PillbugStrategy(Hunting(), self.perseverance - 1)
-            case Waiting(_):
-                return PillbugStrategy(Wandering())
-
-        return self
-    
-
-    def movement(self, entity: Entity) -> Vector:
-        position = entity.components[Position]
-
-        match self.state:
-            case Waiting():
-                return Vector(0,0)
-            case Hunting() | Fighting():
-                target = rhizome.game.world.player.components[Position]
-                return move_towards(position, target)
-            case Wandering():
-                rng = entity.registry[None].components[Random]
-                direction = rng.choice([pos for pos in 
-                                       [(-1,0),(1,0),(0,1),(0,-1)]
-                                       if can_move(entity, pos)
-                ])
-                return Vector(*direction)
-
-        raise ValueError(f"Unable to match state {self.state}")
-
-@dataclass
-class BeetleStrategy: 
-    state: AiState = Wandering()
-    alert_radius: int = 5
-    perseverance: int = 2
-
-    def next_state(self, entity: Entity):
-        stats = entity.components[Stats]
-        player = rhizome.game.world.player
-        player_position = player.components[Position]
-        distance = player_position - entity.components[Position]
-        adjacent = abs(distance.x) == 1 ^ abs(distance.y)==1
-        injured = stats.health < stats.max_health
-
-        match self.state:
-            case Wandering():
-                if distance.x + distance.y  < self.alert_radius: 
-                    return BeetleStrategy(Hunting())
-                else:
-                    return BeetleStrategy(Waiting(0))
-            case Fighting():
-                if not adjacent:
-                    return BeetleStrategy(Hunting())
-            case Hunting():
-                if adjacent:
-                    return BeetleStrategy(Fighting())
-                elif self.perseverance == 0:
-                    return BeetleStrategy(Wandering())
-                else:
-                    return BeetleStrategy(Hunting(), self.alert_radius, self.perseverance - 1)
-            case Waiting(_):
-                return BeetleStrategy(Wandering())
-        return self
+    blocker = occupancy.solid_at(position)
+    return blocker is None or Player in blocker.tags
+
+
+def wander(entity: Entity, moves) -> Vector:
+    """
+    Pick one of `moves` the entity is able to make at random,
+    or stay put if it is boxed in
+    """
+    rng = entity.registry[None].components[AIRandom]
+    moves = [move for move in moves if can_move(entity, move)]
+    if not moves:
+        return Vector.offset(0, 0)
+    return Vector.offset(*rng.choice(moves))
+
+
+CONDITIONS: Final = ("visible", "near", "adjacent", "injured", "expired")
+"""
+What a transition can test, each optionally negated with a leading "!":
+    visible: the player is in view within the alert radius
+    near: the player is closer than the alert radius (manhattan distance)
+    adjacent: the player is next to the enemy
+    injured: the enemy has lost health
+    expired: the state's timer has run out
+"""
+
+MOVES: Final = ("stay", "wander", "chase")
+""" How an enemy can move while in a state """
+
+
+@dataclass(frozen=True, slots=True)
+class Transition:
+    conditions: tuple[tuple[str, bool], ...]
+    """ (condition, required value) pairs that must all hold """
+    to: int
+    timer: int = 0
+
+
+@dataclass(frozen=True, slots=True)
+class StateMachine:
+    """
+    The behaviour shared by every enemy of one kind
+
+    Each state has a movement and an ordered list of transitions.
+    Every turn the first transition out of the current state whose
+    conditions all hold fires, moving to its target state and setting
+    the timer. If none fires, a running timer counts down by one.
+    """
+    name: str
+    states: tuple[str, ...]
+    moves: tuple[tuple[str, int], ...]
+    transitions: tuple[tuple[Transition, ...], ...]
+    alert_radius: int = 0
+    initial: int = 0
+
+    @classmethod
+    def from_settings(cls, name: str, ai: dict) -> "StateMachine":
+        """
+        Compile the `[enemy.<name>.ai]` settings block
+
+        Raises ValueError if the block refers to unknown states,
+        movements or conditions
+        """
+        states = tuple(ai["states"])
+        if not states:
+            raise ValueError(f"{name}: no states declared")
+
+        def state_index(state):
+            try:
+                return states.index(state)
+            except ValueError:
+                raise ValueError(f"{name}: unknown state {state!r}") from None
+
+        speeds = ai.get("speed", {})
+        moves = []
+        for state, move in ai["states"].items():
+            if move not in MOVES:
+                raise ValueError(f"{name}: unknown movement {move!r} for {state!r}")
+            moves.append((move, int(speeds.get(state, 1))))
+        for state in speeds:
+            state_index(state)
+
+        transitions = [[] for _ in states]
+        for spec in ai.get("transitions", []):
+            when = spec.get("when", [])
+            conditions = []
+            for condition in [when] if isinstance(when, str) else when:
+                required = not condition.startswith("!")
+                condition = condition.lstrip("!")
+                if condition not in CONDITIONS:
+                    raise ValueError(f"{name}: unknown condition {condition!r}")
+                conditions.append((condition, required))
+            transitions[state_index(spec["from"])].append(
+                Transition(tuple(conditions), state_index(spec["to"]), int(spec.get("timer", 0)))
+            )
+
+        return cls(
+            name=name,
+            states=states,
+            moves=tuple(moves),
+            transitions=tuple(tuple(outgoing) for outgoing in transitions),
+            alert_radius=int(ai.get("alert_radius", 0)),
+            initial=state_index(ai.get("initial", states[0])),
+        )
+
+    def rules(self, kind: int = 0):
+        """ Every transition as a (kind, from state, transition) rule for `advance`, in firing order """
+        for state, transitions in enumerate(self.transitions):
+            for transition in transitions:
+                yield kind, state, transition
+
+
+def situation(context: Perception, x: np.ndarray, y: np.ndarray, alert_radius, health, max_health,
+              timer: np.ndarray) -> dict[str, np.ndarray]:
+    """ The value of each of the `CONDITIONS` for the enemies at `x`, `y`, as boolean arrays """
+    dx = context.player_position.x - x
+    dy = context.player_position.y - y
+    distance = np.abs(dx) + np.abs(dy)
+    return {
+        "visible": context.fov[y, x] & (dx ** 2 + dy ** 2 <= alert_radius ** 2),
+        "near": distance < alert_radius,
+        "adjacent": distance == 1,
+        "injured": health < max_health,
+        "expired": timer <= 0,
+    }
+
+
+def advance(rules, kind: np.ndarray, state: np.ndarray, timer: np.ndarray,
+            facts: dict[str, np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Advance enemies of the given `kind`s one turn through the `rules`
+    of their state machines, as `StateMachine` describes
+
+    returns: the new (state, timer) arrays
+    """
+    new_state, new_timer = state.copy(), timer.copy()
+    fired = np.zeros(len(state), dtype=bool)
+    for rule_kind, from_state, transition in rules:
+        mask = (kind == rule_kind) & (state == from_state) & ~fired
+        for condition, required in transition.conditions:
+            mask &= facts[condition] if required else ~facts[condition]
+        new_state[mask] = transition.to
+        new_timer[mask] = transition.timer
+        fired |= mask
+    counting = ~fired & (timer > 0)
+    new_timer[counting] -= 1
+    return new_state, new_timer
+
+
+@dataclass(slots=True)
+class Strategy:
+    """
+    An enemy's place in its `StateMachine`
+
+    The record is updated in place each turn; callers only need to
+    write it back to the entity when `next_state` reports a change.
+    """
+    machine: StateMachine
+    state: int = -1
+    timer: int = 0
+
+    def __post_init__(self):
+        if self.state < 0:
+            self.state = self.machine.initial
+
+    @property
+    def state_name(self) -> str:
+        return self.machine.states[self.state]
 
     def movement(self, entity: Entity) -> Vector:
+        move, distance = self.machine.moves[self.state]
+        match move:
+            case "stay":
+                return Vector.offset(0, 0)
+            case "chase":
+                target = entity.registry[None].components[PlayerEntity].components[Position]
+                return move_towards(entity.registry, entity.components[Position], target, distance)
+            case "wander":
+                return wander(entity, wander_moves(distance))
+        raise ValueError(f"Unable to match movement {move}")
+
+    def next_state(self, entity: Entity) -> bool:
+        """
+        Advance to this turn's state, by the same `advance` that `EnemyAI.step`
+        runs for the whole level
+
+        returns: whether the state or timer changed
+        """
         position = entity.components[Position]
-
-        match self.state:
-            case Waiting():
-                return Vector(0,0)
-            case Hunting():
-                target = rhizome.game.world.player.components[Position]
-                return move_towards(position, target, 2)
-            case Fighting():
-                target = rhizome.game.world.player.components[Position]
-                return move_towards(position, target, 1)
-            case Wandering():
-                world = entity.registry
-                rng = world[None].components[Random]
-                moves = [pos for pos in 
-                         [(-1,0),(1,0),(0,1),(0,-1), (-2,0),(2,0),(0,2),(0,2)]
-                         if can_move(entity, pos)
-                ]
-                direction = rng.choice(moves)
-                return Vector(*direction)
-
-        raise ValueError(f"Unable to match state {self.state}")
-
-
-STRATEGIES = {
-    PillBug: PillbugStrategy,
-    Spider: SpiderStrategy, 
-    Centipede: SpiderStrategy,
-    Beetle: BeetleStrategy
-}
\ No newline at end of file
+        stats = entity.components.get(Stats)
+        health, max_health = np.array([(stats.health, stats.max_health) if stats is not None else (0, 0)]).T
+        state, timer = np.array([self.state]), np.array([self.timer])
+        facts = situation(perception(entity.registry), np.array([position.x]), np.array([position.y]),
+                          self.machine.alert_radius, health, max_health, timer)
+        state, timer = advance(self.machine.rules(), np.zeros(1, dtype=np.int8), state, timer, facts)
+        changed = (int(state[0]), int(timer[0])) != (self.state, self.timer)
+        self.state, self.timer = int(state[0]), int(timer[0])
+        return changed
+
+@cache
+def wander_moves(distance: int) -> tuple[tuple[int, int], ...]:
+    """ The moves a wandering enemy picks from, by how far it can move """
+    return tuple((dx * step, dy * step) for step in range(1, distance + 1)
+                 for dx, dy in ((-1,0),(1,0),(0,1),(0,-1)))
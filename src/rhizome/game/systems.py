@@ -1,19 +1,21 @@
-import random
+import numpy as np
 from tcod.ecs import Entity
-from tcod.ecs.query import BoundQuery
 
-from rhizome.game import world
-from rhizome.game.strategies import Strategy
-from rhizome.game.ui_manager import UIManager
+from rhizome.game.ai import EnemyAI, get_enemy_ai
+from rhizome.game.combat import Attacks, resolve
+from rhizome.game.strategies import Strategy, perception
 from .components import *
-from rhizome.game.world import get_player, get_world, new_level, settings, add_item
+from rhizome.game.world import Session, acquire_trait, add_item, get_config, get_session, new_level
 from rhizome.game.tags import *
 from rhizome.game.logging import log
+from rhizome.game.profiling import profiler
+from rhizome.game.spatial import get_occupancy
+from rhizome.game.stats import get_stats_store
 
 from .components import Name
 from .components import Trait
 
-def collide_entity(entity: Entity, direction: Vector) -> BoundQuery:
+def collide_entity(entity: Entity, direction: Vector) -> list[Entity]:
     """
     Attempts to move an entity in the given direction 
 
@@ -28,23 +30,17 @@ def collide_entity(entity: Entity, direction: Vector) -> BoundQuery:
     pos = entity.components[Position]
     new_position = pos + direction
     
-    map = world[None].components[Map]
-    try:
-        if map[new_position.y, new_position.x]:
-            return []
-    except IndexError:
+    occupancy = get_occupancy(world)
+    if occupancy.is_wall(new_position):
         return []
 
-    collision = world.Q.all_of(tags=[new_position])
-    for obj in collision:
-        if Solid in obj.tags:
-            break
-    else:
+    collision = occupancy.entities_at(new_position)
+    if occupancy.solid_at(new_position) is None:
         entity.components[Position] = new_position
     return [ent for ent in collision if ent is not entity]
 
-def move_player(direction: Vector) -> Entity:
-    player = get_player()
+def move_player(session: Session, direction: Vector) -> Entity:
+    player = session.player
     collision = collide_entity(player,  direction=direction)
     for entity in collision:
         if Solid in entity.tags:
@@ -56,14 +52,14 @@ def move_player(direction: Vector) -> Entity:
     return player
 
 def handle_trigger(entity1, entity2):
-    print(f"{entity1.components[Name]} triggered {entity2.components[Name]}")
     if entity1.components[Name] == "Player":
         assert Player in entity1.tags
     if entity2.components[Name] == "Hole":
         assert Hole in entity2.tags
     if Player in entity1.tags and Hole in entity2.tags:
-        new_level(entity1.registry[None].components[UIManager], new_game=False)
-        return get_player()
+        session = get_session(entity1.registry)
+        new_level(session, new_game=False)
+        return session.player
     return entity1
     
 
@@ -74,24 +70,28 @@ def handle_rest(entity1: Entity, entity2: Entity):
     return entity1
 
 def handle_collision(collider: Entity, collided: Entity):
-    collider_stats = collider.components.get(Stats)
-    collided_stats = collided.components.get(Stats)
-    if collided_stats and collider_stats:
-        damage_dealt = damage(collider_stats, collided_stats)
-        log(f"{collider.components.get(Name, "(unnamed)")} dealt {damage_dealt} to {collided.components.get(Name, "(unnamed)")}")
-        collided_stats.health -= damage_dealt
+    attacks = Attacks()
+    declare_attack(attacks, collider, collided)
+    resolve_attacks(collider.registry, attacks)
     return collider
 
-def damage(attacker: Stats, attacked: Stats) -> int:
-    damage_dealt = attacker.strength + random.randint(*attacker.damage_range) - attacked.toughness
-    return min(damage_dealt, attacked.health)
+def declare_attack(attacks: Attacks, attacker: Entity, defender: Entity):
+    if Stats in attacker.components and Stats in defender.components:
+        attacks.declare(attacker, defender)
+
+def resolve_attacks(world, attacks: Attacks):
+    resolve(world, attacks)
+    ai = world[None].components.get(EnemyAI)
+    if ai is not None:
+        for defender in attacks.defenders:
+            ai.noise(defender.components[Position])
 
 
 def kill(entity: Entity):
     position = entity.components[Position]
     name = entity.components[Name]
     if Enemy in entity.tags:
-        corpse_graphic = Graphic(**settings["items"]["corpse"]["graphic"])
+        corpse_graphic = get_config(entity.registry).corpse
         corpse = add_item(entity.registry, position=position,graphic=corpse_graphic,tags={Edible}, name=f"{name} corpse")
         corpse.components[Size] = entity.components.get(Size,1)
         traits = entity.components.get(Trait)
@@ -100,9 +100,8 @@ def kill(entity: Entity):
     entity.clear()
 
 
-def player_dead():
-    player = get_player()
-    return player.components[Stats].health <= 0
+def player_dead(session: Session):
+    return session.player.components[Stats].health <= 0
     
 
 def digest(entity: Entity, corpse: Entity):
@@ -114,41 +113,58 @@ def digest(entity: Entity, corpse: Entity):
     size -= amount_eaten
     if size <= 0:
         log(f"consumed {corpse.components[Name]}")
-        trait = corpse.components[Trait]
+        trait = corpse.components.get(Trait)
         if trait: 
             log(f"Its {trait} has made you stronger")
-        world.acquire_trait(entity, trait)
+            acquire_trait(entity, trait)
         corpse.clear() 
     else:
         corpse.components[Size] = size
 
 
 
-def move_enemies():
-    world = get_world()
-    enemies = world.Q.all_of(tags=[Enemy])
-    for enemy in enemies:
-        strategy = enemy.components.get(Strategy)
-        if not strategy:
-            raise ValueError(f"no strategy for entity {enemy.components.get(Name, "???")}")
-        direction = strategy.movement(enemy)
-        collisions = collide_entity(enemy,direction)
-        for collision in collisions:
-            handle_collision(enemy, collision)
-
-
-    for enemy in enemies:
-        strategy = enemy.components[Strategy]
-        new_strategy = enemy.components[Strategy].next_state(enemy)
-        enemy.components[Strategy] = new_strategy
-
-    for enemy in enemies: 
-        stats = enemy.components[Stats]
-        if stats.health <= 0:
-            kill(enemy)
+def move_enemies(session: Session):
+    world = session.world
+    ai = get_enemy_ai(world)
+    context = perception(world)
+    camera = None
+    for cam_ent in world.Q.all_of(components=[Camera]):
+        camera = cam_ent.components[Camera].bounding_box(cam_ent.components[Position])
+    scheduled = ai.schedule(context.player_position, camera)
+    attacks = Attacks()
+
+    with profiler.stage("enemy movement"):
+        for row in np.flatnonzero(scheduled):
+            enemy = ai.entities[row]
+            strategy = enemy.components.get(Strategy)
+            if not strategy:
+                raise ValueError(f"no strategy for entity {enemy.components.get(Name, "???")}")
+            direction = strategy.movement(enemy)
+            collisions = collide_entity(enemy,direction)
+            for collision in collisions:
+                declare_attack(attacks, enemy, collision)
+
+    with profiler.stage("combat"):
+        # every enemy attack of the turn lands at once, in the order they moved
+        resolve_attacks(world, attacks)
+
+    with profiler.stage("next_state"):
+        # enemies woken by this turn's fighting still need their state and health checked
+        rows = np.flatnonzero(scheduled | ai.awake())
+        health, max_health = ai.gather(rows)
+        ai.step(context, rows, health, max_health)
+
+    with profiler.stage("kills"):
+        # one sweep over the level's health column, so an enemy killed by
+        # another while dormant doesn't linger until its next turn
+        for entity in get_stats_store(world).dead():
+            if Enemy in entity.tags:
+                kill(entity)
+    profiler.count("enemies", len(ai))
+    profiler.count("active enemies", len(rows))
  
-def move_camera(direction: Vector):
-    player = get_player()
+def move_camera(session: Session, direction: Vector):
+    player = session.player
     world = player.registry
     map = world[None].components[Map]
     player_position = player.components[Position]
@@ -34,9 +34,14 @@ class State(Protocol):
     def update(*args, **kwargs) -> None:
         ...
 
+class Recorder(Protocol):
+    def record(self, event: Event) -> None:
+        ...
+
 class UIManager:
-    def __init__(self, initial_states: List[State]):
+    def __init__(self, initial_states: List[State], recorder: Recorder | None = None):
         self.states = initial_states
+        self.recorder = recorder
 
     def update(self, action: StateAction):
         match action:
@@ -61,3 +66,5 @@ class UIManager:
     def on_event(self,event: Event):
         action = self.states[-1].on_event(event)
         self.update(action)
+        if self.recorder is not None:
+            self.recorder.record(event)
@@ -3,13 +3,15 @@ import itertools
 from typing import Any, Final, List, Callable
 import tcod.constants
 from tcod.event import KeySym, KeyboardEvent, Quit
-from rhizome.game import maps, systems, tags
+from rhizome.game import maps, snapshots, systems
 from rhizome.game.components import Camera, Graphic, Map, Name, Position, Stats, Vector
-from rhizome.game.world import FloorTile, WallTile, get_player, get_world, new_level, settings
+from rhizome.game.rendering import get_sprite_layer
+from rhizome.game.world import FloorTile, Session, WallTile, new_level
 from tcod.console import Console
 from tcod.ecs import Entity
 from rhizome.game.ui_manager import Push, Pop, Replace, Update
-from rhizome.game.logging import logger
+from rhizome.game.logging import log, logger
+from rhizome.game.profiling import profiler
 
 
 __all__ = ["GameState", "MenuState"]
@@ -96,14 +98,40 @@ class HistoryWindow:
                           message)
 
 
+@dataclass
+class ProfilerWindow:
+    height: int
+    width: int
+    position: Vector
+
+    def draw(self, console: Console):
+        console.draw_frame(
+            self.position.x, self.position.y,
+            self.width, self.height,
+            "Profiler"
+        )
+        lines = [f"{'stage':<15}{'p50':>6}{'p95':>6}{'max':>6}  ms"]
+        for name, p50, p95, worst in profiler.summary():
+            lines.append(f"{name[:15]:<15}{p50 * 1e3:>6.1f}{p95 * 1e3:>6.1f}{worst * 1e3:>6.1f}")
+        lines.extend(f"{name}: {value}" for name, value in profiler.counts.items())
+        for lineno, line in enumerate(lines[:self.height - 2]):
+            console.print(self.position.x + 1, self.position.y + 1 + lineno, line)
+
+
 class GameState:
-    def __init__(self):
-        self.console = Console(width=settings["map"]["width"], height=settings["map"]["height"])
-        info_window_position = Vector(settings["camera"]["width"], 0)
-        history_position = Vector(settings["camera"]["width"], settings["screen"]["height"]//2)
-        subject = get_player()
-        height=settings["screen"]["height"] // 2
-        width=settings["screen"]["width"] - settings["camera"]["width"]
+    def __init__(self, session: Session):
+        self.session = session
+        self.terrain = None
+        self.terrain_map = None
+        config = session.config
+        if config.debug:
+            profiler.enable(window=config.profiler.window, trace=config.profiler.trace)
+        panes = 3 if profiler.enabled else 2
+        subject = session.player
+        height=config.screen.height // panes
+        width=config.screen.width - config.camera.width
+        info_window_position = Vector(config.camera.width, 0)
+        history_position = Vector(config.camera.width, height)
         self.info_window = InfoWindow(position=info_window_position,
                                       subject=subject,
                                       height=height,
@@ -113,62 +141,95 @@ class GameState:
             position = history_position,
             height = height, width=width
         )
+        self.profiler_window = None
+        if profiler.enabled:
+            self.profiler_window = ProfilerWindow(
+                position = Vector(config.camera.width, 2 * height),
+                height = config.screen.height - 2 * height, width=width
+            )
 
 
     def on_event(self, event):
         match event:
             case KeyboardEvent(sym=key_sim, type=type_):
                 if type_ == "KEYDOWN" and key_sim in DIRECTION_KEYS:
-                    movement_direction = Vector(*DIRECTION_KEYS[key_sim])
-                    player = systems.move_player(movement_direction)
-                    systems.move_enemies()
-                    systems.move_camera(movement_direction)
-                    if systems.player_dead():
+                    movement_direction = Vector.offset(*DIRECTION_KEYS[key_sim])
+                    with profiler.stage("move_player"):
+                        player = systems.move_player(self.session, movement_direction)
+                    with profiler.stage("move_enemies"):
+                        systems.move_enemies(self.session)
+                    with profiler.stage("move_camera"):
+                        systems.move_camera(self.session, movement_direction)
+                    if self.session.autosave is not None:
+                        with profiler.stage("autosave"):
+                            self.session.autosave.end_turn()
+                    profiler.end_turn()
+                    if systems.player_dead(self.session):
                         return Pop()
                     self.info_window.subject = player
                         
+                elif type_ == "KEYDOWN" and key_sim == KeySym.F5:
+                    snapshots.save(self.session.world, self.quicksave_path)
+                    log("saved")
+                elif type_ == "KEYDOWN" and key_sim == KeySym.F9:
+                    try:
+                        world = snapshots.load(self.quicksave_path, self.session)
+                    except (OSError, ValueError):
+                        log("no quicksave to load")
+                        return
+                    self.session.enter(world)
+                    self.info_window.subject = self.session.player
+                    log("loaded")
                 elif key_sim == KeySym.ESCAPE:
-                    return Push(main_menu())
+                    return Push(main_menu(self.session))
             case Quit():
                 raise SystemExit
 
+    @property
+    def quicksave_path(self) -> str:
+        return self.session.config.saves.quicksave
 
-    def draw_entity(self, entity):
-        position = entity.components[Position]
-        graphic = entity.components[Graphic]
-        self.console.rgb['ch'][position.y, position.x] = graphic.ch
-        self.console.rgb['fg'][position.y, position.x] = graphic.fg
-        self.console.rgb['bg'][position.y, position.x] = graphic.bg
 
+    def terrain_for(self, map):
+        """
+        The rendered terrain of `map`, rebuilt only when the level changes
+        """
+        if map is not self.terrain_map:
+            self.terrain = maps.to_rgb(map, wall=WallTile, floor=FloorTile)
+            self.terrain_map = map
+        return self.terrain
 
     def draw(self, console: Console):
-        world = get_world()
+        with profiler.stage("draw"):
+            self.draw_frame(console)
+
+    def draw_frame(self, console: Console):
+        world = self.session.world
         (cam_ent,) = world.Q.all_of(components=[Camera])
         camera = cam_ent.components[Camera]
         position = cam_ent.components[Position]
         bounds = camera.bounding_box(position)
 
-        map = world[None].components[Map]
-
-        self.console.rgb[:] = maps.to_rgb(map, wall=WallTile, floor=FloorTile)
-        for entity in world.Q.all_of(components=[Graphic,Position]):
-            if tags.Player not in entity.tags:
-                self.draw_entity(entity)
-        self.draw_entity(get_player())
-        console.rgb[:camera.height, :camera.width] = self.console.rgb[bounds.top:bounds.bottom, bounds.left:bounds.right]
+        terrain = self.terrain_for(world[None].components[Map])
+        viewport = console.rgb[:camera.height, :camera.width]
+        viewport[:] = terrain[bounds.top:bounds.bottom, bounds.left:bounds.right]
+        get_sprite_layer(world).draw(viewport, bounds)
         self.info_window.draw(console)
         self.history_window.draw(console)
+        if self.profiler_window is not None:
+            self.profiler_window.draw(console)
 
     def update(self, new_subject: Entity, *args,**kwargs):
         self.info_window.subject = new_subject
 
 
 class InfoState:
-    def __init__(self, cursor_position: Vector):
+    def __init__(self, session: Session, cursor_position: Vector):
+        self.session = session
         self.cursor = cursor_position
 
     def on_event(self, event):
-        world = get_world()
+        world = self.session.world
         map = world[None].components[Map]
         match event:
             case KeyboardEvent(sym=sym, type="KEYDOWN"):
@@ -246,12 +307,13 @@ class MenuState:
 
 
 class MessageBox:
-    def __init__(self, message, alignment = tcod.constants.LEFT):
+    def __init__(self, session: Session, message, alignment = tcod.constants.LEFT):
+        camera = session.config.camera
         self.message = message
         self.height = 10
-        self.width = settings["camera"]["width"] // 2
-        self.x = settings["camera"]["width"] // 4
-        self.y = settings["camera"]["height"] - (self.height + 3)
+        self.width = camera.width // 2
+        self.x = camera.width // 4
+        self.y = camera.height - (self.height + 3)
         self.alignment = alignment
 
     def on_event(self, event):
@@ -265,24 +327,24 @@ class MessageBox:
         console.print_box(self.x+1, self.y+1, self.width-2, self.height-2, self.message, alignment=self.alignment)
 
 
-def main_menu():
+def main_menu(session: Session):
     def exit():
         return [Pop(), Pop()]
     def restart():
-        new_level()
-        return [Pop(), Update(new_subject=get_player())]
+        new_level(session)
+        return [Pop(), Update(new_subject=session.player)]
     continue_  =MenuState.MenuItem("Continue", lambda: Pop())
     restart = MenuState.MenuItem("Restart", restart)
     quit = MenuState.MenuItem("Quit", exit)
 
     return MenuState([continue_, restart, quit],Vector(10,10))
 
-def game_over():
+def game_over(session: Session):
     def exit():
         raise SystemExit
     def restart():
-        new_level()
-        return [Pop(), Update(new_subject=get_player())]
+        new_level(session)
+        return [Pop(), Update(new_subject=session.player)]
     restart = MenuState.MenuItem("Restart", restart)
     quit = MenuState.MenuItem("Quit", exit)
 
@@ -290,9 +352,10 @@ def game_over():
 
 
 class IntroScreen:
-    def __init__(self, title):
-        self.width = settings["screen"]["width"]
-        self.height = settings["screen"]["height"]
+    def __init__(self, title, session: Session):
+        self.session = session
+        self.width = session.config.screen.width
+        self.height = session.config.screen.height
         self.game_title = title
         self.player_location = Vector(self.width // 2, 12)
 
@@ -303,8 +366,8 @@ class IntroScreen:
                           alignment=tcod.constants.CENTER)
         
         console.print(self.player_location.x, self.player_location.y, 
-            settings["player"]["graphic"]["char"], 
-            fg = settings["player"]["graphic"]["fg"],
+            self.session.config.player.graphic.char,
+            fg = self.session.config.player.graphic.fg,
         )
 
         console.print_box(0, 20, self.width, 14,
@@ -321,8 +384,8 @@ class IntroScreen:
             case KeyboardEvent(sym=sym, type="KEYDOWN"):
                 match sym:
                     case KeySym.RETURN | KeySym.RETURN2 | KeySym.SPACE:
-                        new_level(self)
-                        return Push(GameState())
+                        new_level(self.session)
+                        return Push(GameState(self.session))
                     case KeySym.ESCAPE:
                         return Pop()
                     case _: 
@@ -1,16 +1,20 @@
 import itertools
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 import math
 import numpy as np
 from tcod.ecs import Registry, Entity
 from random import Random
 from rhizome.game.components import move_inside
-from rhizome.game.ui_manager import UIManager
 from .components import *
-from .components import LevelNo
-from .maps import create_map, to_rgb
+from .components import AIRandom, CombatRandom, LevelNo, PlayerEntity, Seed
+from .config import Config, EnemyConfig, intern_stats, load_config
+from .maps import FreeCells, create_map, to_rgb
 from .tags import *
 from typing import Dict
 import rhizome.game.strategies as strategies
+import rhizome.game.ai as ai
+from .stats import get_stats_store
 import tomllib
 import pkgutil
 
@@ -19,49 +23,49 @@ FloorTile = Graphic(".")
 
 PLAYER_COLOR = [0xc6, 0xd3, 0x13]
 
-player: Entity
-""" The player in the game"""
-
-world: Registry
-""" The global ECS registry"""
-
 settings: Dict = tomllib.loads(
     pkgutil.get_data("rhizome.data", "settings.toml").decode()
 )
 
+CONFIG: Config = load_config(settings)
+""" The default settings, checked and compiled; code that runs during play reads these, never `settings` """
+
+STATE_MACHINES: Dict[str, strategies.StateMachine] = {kind: enemy.machine for kind, enemy in CONFIG.enemies.items()}
+""" The AI of each kind of enemy, compiled from its `[enemy.<kind>.ai]` settings """
+
 def add_player(world, position: Vector, stats: Stats | None = None)->Entity:
-    player_settings = settings["player"]
-    graphic = Graphic(**player_settings["graphic"])
-    stats = stats or Stats(player_settings["health"],player_settings["health"],player_settings["strength"])
+    player_config = get_config(world).player
+    stats = stats or player_config.stats.copy()
 
     player = world.new_entity()
+    player.tags |= {Player, Actor, Solid}
     player.components[Position] = position
-    player.components[Graphic] = graphic
+    player.components[Graphic] = player_config.graphic
     player.components[Stats] = stats
     player.components[Name] = "Player"
-    player.tags |= {Player, Actor, Solid}
+    world[None].components[PlayerEntity] = player
     return player    
 
 
 def add_item(world: Registry, position, graphic, tags, name="")->Entity:
     item = world.new_entity()
+    item.tags |= {Item} | tags
     item.components[Position] = position
     item.components[Graphic] = graphic
     item.components[Name] = name
-    item.tags |= {Item} | tags
 
     return item
 
 
 def add_camera(world: Registry, position: Vector) -> Entity:
     map = world[None].components[Map]
-    camera = Camera(**settings["camera"])
+    camera = get_config(world).camera
     camera_ent = world.new_entity()
     camera_bounds = BoundingBox.centered(position, height=camera.height, width=camera.width)
     map_bounds = BoundingBox(Vector(0,0), Vector(map.shape[1], map.shape[0]))
     camera_bounds = move_inside(camera_bounds, map_bounds)
-    camera_ent.components[Position] = camera_bounds.top_left
     camera_ent.components[Camera] = camera
+    camera_ent.components[Position] = camera_bounds.top_left
     return camera_ent
 
 
@@ -70,112 +74,197 @@ def add_hole(world: Registry, position: Vector) -> Entity:
     Holes take you deeper into the cave
     """
     entity = world.new_entity()
+    entity.tags |= {Hole}
     entity.components[Position] = position
-    entity.components[Graphic] = Graphic(**settings["hole"]["graphic"])
+    entity.components[Graphic] = get_config(world).hole
     entity.components[Name] = "Hole"
-    entity.tags |= {Hole}
     return entity
 
 
-def take_position(free_positions, condition=None):
+def take_position(world: Registry, free_cells: FreeCells, mask: np.ndarray | None = None) -> Vector:
     rng = world[None].components[Random]
-    valid = free_positions if condition is None else [p for p in free_positions if condition(p)]
-    pos = rng.choice(valid)
-    free_positions.remove(pos)
-    return Vector(pos[1], pos[0])
+    row, column = free_cells.sample(rng, mask)
+    return Vector(column, row)
 
 
-def get_trait(rng: Random, trait_dict: dict):
-    kinds = list(trait_dict.keys()) + [None]
-    probabilities = list(trait_dict.values())
-    probabilities.append(1 - sum(probabilities))
-    return rng.choices(kinds, probabilities)[0]
+def corner_masks(shape) -> list[np.ndarray]:
+    """
+    Masks selecting the four corner regions of a map of the given shape,
+    in clockwise order from the top left
+    """
+    rows, columns = np.ogrid[:shape[0], :shape[1]]
+    top, bottom = rows < shape[0] / 3, rows > 2 * shape[0] / 3
+    left, right = columns < shape[1] / 3, columns > 2 * shape[1] / 3
+    return [top & left, top & right, bottom & right, bottom & (columns < shape[1] / 2)]
+
+
+SCALED_STATS = ("health", "max_health", "strength", "toughness", "toxicity", "camoflauge", "digestion")
+""" The stats multiplied by a level's scaling factor; the damage range is widened instead """
+
 
 def scale(stats, level):
     factor = math.pow(1.3,level)
-    for stat in vars(stats):
-        value = getattr(stats,stat)
-        match value:
-            case int():
-                value = int(value * factor)
-            case (low, high):
-                value = (low, high + int(factor))
-        setattr(stats, stat,value)
-
-def populate_enemies(world :Registry, open_positions, level_number: int):
-    rng = world[None].components[Random]
-    for (enemy_kind, enemy_settings) in settings['enemy'].items():
-        for _ in range(5 * (level_number + 1)):
+    for stat in SCALED_STATS:
+        setattr(stats, stat, int(getattr(stats, stat) * factor))
+    low, high = stats.damage_range
+    stats.damage_range = (low, high + int(factor))
+
+
+TRAIT_BONUSES: Dict[Trait, Dict[str, int]] = {
+    Trait.Jaws: {"strength": 1},
+    Trait.Shell: {"toughness": 1},
+    Trait.Fangs: {"damage_range": 1},
+    Trait.VenomSacs: {"digestion": 1},
+    Trait.Bristles: {"toxicity": 1},
+}
+""" What each trait adds to the stats of whoever has it; fangs raise the top of the damage range """
+
+
+def add_bonus(stats: Stats, trait: Trait | None):
+    for stat, bonus in TRAIT_BONUSES.get(trait, {}).items():
+        value = getattr(stats, stat)
+        if stat == "damage_range":
+            value = value[0], value[1] + bonus
+        else:
+            value = value + bonus
+        setattr(stats, stat, value)
+
+
+@dataclass(frozen=True)
+class Archetype:
+    """
+    One kind of enemy compiled for one level: the parts its enemies share
+
+    `stats` holds the finished stats for each trait the kind can roll,
+    with the trait's bonus and the level's scaling already applied; each
+    enemy gets its own copy. `graphic` and `machine` are shared as they are.
+    """
+    kind: str
+    graphic: Graphic
+    machine: strategies.StateMachine
+    traits: tuple
+    """ The traits the kind can roll, None for no trait, with their `weights` """
+    weights: tuple[float, ...]
+    stats: Dict[Trait | None, Stats]
+    sizes: tuple[int, ...]
+
+    @classmethod
+    def compile(cls, enemy: EnemyConfig, level_number: int) -> "Archetype":
+        traits = tuple(trait for trait, _ in enemy.traits) + (None,)
+        weights = tuple(probability for _, probability in enemy.traits)
+        weights += (1 - sum(weights),)
+        stats = {}
+        for trait in traits:
+            trait_stats = enemy.stats.copy()
+            add_bonus(trait_stats, trait)
+            scale(trait_stats, level_number)
+            stats[trait] = intern_stats(trait_stats)
+        return cls(enemy.kind, enemy.graphic, enemy.machine, traits, weights, stats, enemy.sizes)
+
+    def spawn(self, world: Registry, free_cells: FreeCells, count: int) -> list[Entity]:
+        """
+        Spawn `count` enemies of this kind on free cells of the level,
+        drawing their places, traits and sizes in one go
+        """
+        rng = world[None].components[Random]
+        rows, columns = free_cells.sample_many(rng, count)
+        traits = rng.choices(self.traits, self.weights, k=count)
+        sizes = rng.choices(self.sizes, k=count)
+        tags = {Actor, Enemy, self.kind, Solid}
+        enemies = []
+        for x, y, trait, size in zip(columns.tolist(), rows.tolist(), traits, sizes):
             enemy = world.new_entity()
-            enemy.components[Position] = take_position(open_positions)
-            stats = enemy.components[Stats] = Stats(enemy_settings["health"], enemy_settings["health"], enemy_settings["strength"])
-            enemy.components[Graphic] = Graphic(**enemy_settings["graphic"])
-            enemy.components[strategies.Strategy] = strategies.STRATEGIES[enemy_kind]()
-            trait = enemy.components[Trait] = get_trait(rng,enemy_settings["traits"])
-            acquire_trait(enemy,trait)
-            scale(stats, level_number)
-            enemy.components[Size] = rng.choice(enemy_settings.get("size_range", [1]))
-            enemy.tags |= {Actor, Enemy, enemy_kind, Solid}
-            enemy.components[Name] = enemy_kind
+            enemy.tags |= tags
+            enemy.components.update({
+                Position: Vector(x, y),
+                Stats: self.stats[trait].copy(),
+                Graphic: self.graphic,
+                strategies.Strategy: strategies.Strategy(self.machine),
+                Trait: trait,
+                Size: size,
+                Name: self.kind,
+            })
+            enemies.append(enemy)
+        return enemies
+
+
+def compile_archetypes(config: Config, level_number: int) -> Dict[str, Archetype]:
+    return {kind: Archetype.compile(enemy, level_number) for kind, enemy in config.enemies.items()}
+
+
+_ARCHETYPES: Dict[int, Dict[str, Archetype]] = {}
+""" Archetypes compiled from the default settings, for levels built outside a session """
+
+
+def get_archetypes(world: Registry, level_number: int) -> Dict[str, Archetype]:
+    """
+    The archetype of every enemy kind on level `level_number`,
+    compiled on first use and cached by the level's session
+    """
+    session = get_session(world)
+    cache = session.archetypes if session is not None else _ARCHETYPES
+    archetypes = cache.get(level_number)
+    if archetypes is None:
+        archetypes = cache[level_number] = compile_archetypes(get_config(world), level_number)
+    return archetypes
 
 
+def populate_enemies(world :Registry, free_cells: FreeCells, level_number: int):
+    for archetype in get_archetypes(world, level_number).values():
+        archetype.spawn(world, free_cells, 5 * (level_number + 1))
+
 
 def acquire_trait(entity: Entity, trait: Trait):
-    ent_stats = entity.components[Stats]
-    print(f"starting stats: {vars(ent_stats)}")
-    print(f"trait: {str(trait)}")
-    if trait == Trait.Jaws:
-        ent_stats.strength = ent_stats.strength + 1
-    elif trait == Trait.Shell:
-        ent_stats.toughness += 1
-    elif trait == Trait.Fangs: 
-        ent_stats.damage_range = ent_stats.damage_range[0], ent_stats.damage_range[1] + 1
-    elif trait == Trait.VenomSacs:
-        ent_stats.digestion += 1
-    elif trait == Trait.Bristles:
-        ent_stats.toxicity += 1
-    print(f"ending stats: {vars(ent_stats)}")
-
-
-
-
-def new_level(ui: UIManager | None = None , new_game: bool = True) -> Registry:
-    global world
-    
-    level_number = 0 if new_game else world[None].components[LevelNo] + 1
-    ui = ui if ui is not None else world[None].components[UIManager]
+    add_bonus(entity.components[Stats], trait)
 
-    world = Registry()
-    # global RNG
-    
 
-    world[None].components[UIManager] = ui
-    world[None].components[LevelNo] = level_number
+def seed_level(world: Registry, seed: int, level_number: int) -> np.random.Generator:
+    """
+    Give the level in `world` its random streams: `Random` for spawning,
+    `AIRandom` and `CombatRandom`. They are drawn from the game's `seed`
+    and the level number alone, so the same game seed replays the same levels
+
+    returns: the generator for the level's map
+    """
+    map_seed, spawn_seed, ai_seed, combat_seed = np.random.SeedSequence([seed, level_number]).spawn(4)
+    world[None].components[Seed] = seed
+    world[None].components[Random] = Random(int(spawn_seed.generate_state(1)[0]))
+    world[None].components[AIRandom] = Random(int(ai_seed.generate_state(1)[0]))
+    world[None].components[CombatRandom] = np.random.default_rng(combat_seed)
+    return np.random.default_rng(map_seed)
+
 
-    global player
-    print("building level")
-    map = create_map(closed=True, **settings["map"])
+def build_level(session: "Session", level_number: int, seed: int, stats: Stats | None = None) -> Registry:
+    """
+    Build level `level_number` of the game with the given `seed`, without
+    making it the session's current level
+
+    stats: the player's stats to carry onto the level; fresh ones by default
+    """
+    world = Registry()
+    world[None].components[Session] = session
+    world[None].components[LevelNo] = level_number
+    map_rng = seed_level(world, seed, level_number)
+    # enemies join the AI and stats arrays as they spawn, so their rows follow the spawn order
+    ai.get_enemy_ai(world)
+    get_stats_store(world)
+
+    map_config = session.config.map
+    map = create_map(map_config.height, map_config.width, map_config.wall_threshold,
+                     closed=True, backend=map_config.backend, rng=map_rng)
     world[None].components[Map] = map
-    free_positions = [idx for idx, value in np.ndenumerate(map) if not value]
-
-    rng = world[None].components[Random] = Random()
-    fns = [lambda p: p[0] < map.shape[0] / 3 and p[1] < map.shape[1] / 3,
-            lambda p: p[0] < map.shape[0] / 3 and p[1] > 2 * map.shape[1] / 3,
-            lambda p: p[0] > 2 * map.shape[0] / 3 and p[1] > 2 * map.shape[1] / 3,
-            lambda p: p[0] > 2 * map.shape[0] / 3 and p[1] < map.shape[1] / 2
-    ]
+    free_cells = FreeCells(map)
+
+    rng = world[None].components[Random]
+    corners = corner_masks(map.shape)
     player_corner = rng.randint(0,3)
     hole_corner = (player_corner + 2) % 4
-    player_position =take_position(free_positions, fns[player_corner])
+    player_position =take_position(world, free_cells, corners[player_corner])
     assert player_position 
-    hole_position = take_position(free_positions,fns[hole_corner])
-    if new_game:
-        player = add_player(world, player_position)
-    else:
-        stats = player.components[Stats]
-        player = add_player(world,player_position,stats)
+    hole_position = take_position(world, free_cells,corners[hole_corner])
+    add_player(world, player_position, stats)
 
-    populate_enemies(world, free_positions, level_number)
+    populate_enemies(world, free_cells, level_number)
     add_hole(world, player_position + (1,1))
     # add_hole(world, hole_position)
 
@@ -183,11 +272,142 @@ def new_level(ui: UIManager | None = None , new_game: bool = True) -> Registry:
     return world
 
 
-def get_world():
-    global world
+def new_level(session: "Session", new_game: bool = True, seed: int | None = None) -> Registry:
+    """
+    Build the next level of the session's game, or the first level of a
+    new game, and make it the session's current level
+
+    seed: the seed for a new game; by default the next one from the session
+    """
+    if new_game:
+        level_number, stats = 0, None
+        if seed is None:
+            seed = session.next_game_seed()
+    else:
+        level_number = session.world[None].components[LevelNo] + 1
+        seed = session.world[None].components[Seed]
+        stats = session.player.components[Stats]
+    world = session.take_prefetched(level_number, seed)
+    if world is None:
+        world = build_level(session, level_number, seed, stats)
+    elif stats is not None:
+        world[None].components[PlayerEntity].components[Stats] = stats
+    session.enter(world)
     return world
 
 
-def get_player():
-    global player
-    return player
\ No newline at end of file
+class Session:
+    """
+    One game in progress: the level being played, the settings the game is
+    built from, and the seed sequence each new game draws its seed from
+
+    Nothing about a game is kept in module state, so any number of
+    sessions can be played side by side. Each level points back to its
+    session through its `Session` component.
+
+    With `prefetch`, the level below the current one is built on a
+    background thread as soon as the current one starts, so descending a
+    hole only has to swap it in. A level depends only on the game seed and
+    its number, so a prefetched level is the same as one built on demand.
+    A prefetching session should be `close`d when the game ends.
+    """
+
+    def __init__(self, seed: int | None = None, config: Config | Dict | None = None, prefetch: bool = False):
+        if config is None:
+            config = CONFIG
+        elif not isinstance(config, Config):
+            config = load_config(config)
+        self.config = config
+        self.state_machines = {kind: enemy.machine for kind, enemy in config.enemies.items()}
+        self.archetypes: Dict[int, Dict[str, Archetype]] = {}
+        """ The enemy archetypes of each level number, compiled on first use """
+        self.seeds = np.random.SeedSequence(seed)
+        self.world: Registry | None = None
+        self.autosave = None
+        """ An `autosave.Autosave` to tell about the end of every turn, if any """
+        self.prefetch = prefetch
+        self._executor: ThreadPoolExecutor | None = None
+        self._prefetched: tuple[tuple[int, int], Future] | None = None
+
+    @property
+    def seed(self) -> int:
+        """ The seed of the session, to play the same games again """
+        return self.seeds.entropy
+
+    @property
+    def player(self) -> Entity:
+        return get_player(self.world)
+
+    def enter(self, world: Registry):
+        """
+        Make `world` the current level, whether freshly built or loaded
+        from a snapshot, and start prefetching the level below it
+        """
+        self.world = world
+        seed = world[None].components.get(Seed)
+        if seed is not None:
+            self.prefetch_level(world[None].components[LevelNo] + 1, seed)
+
+    def next_game_seed(self) -> int:
+        return int(self.seeds.spawn(1)[0].generate_state(1)[0])
+
+    def prefetch_level(self, level_number: int, seed: int):
+        """
+        Start building level `level_number` of the game with `seed` in
+        the background, replacing any earlier prefetch
+        """
+        if not self.prefetch:
+            return
+        if self._prefetched is not None:
+            self._prefetched[1].cancel()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        future = self._executor.submit(build_level, self, level_number, seed)
+        self._prefetched = ((seed, level_number), future)
+
+    def take_prefetched(self, level_number: int, seed: int) -> Registry | None:
+        """
+        Return the prefetched level `level_number` of the game with `seed`,
+        waiting for it if it is being built
+
+        Returns None, for the caller to build the level itself, if a
+        different level was prefetched, the build hasn't started yet,
+        or it failed
+        """
+        if self._prefetched is None:
+            return None
+        key, future = self._prefetched
+        self._prefetched = None
+        if key != (seed, level_number) or future.cancel():
+            future.cancel()
+            return None
+        try:
+            return future.result()
+        except Exception:
+            return None
+
+    def close(self):
+        """ Stop prefetching; a build in progress is left to finish """
+        if self._prefetched is not None:
+            self._prefetched[1].cancel()
+            self._prefetched = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+def get_session(world: Registry) -> Session | None:
+    return world[None].components.get(Session)
+
+
+def get_config(world: Registry) -> Config:
+    """
+    The settings the level in `world` was built from; the
+    default settings for a level built outside any session
+    """
+    session = world[None].components.get(Session)
+    return session.config if session is not None else CONFIG
+
+
+def get_player(world: Registry) -> Entity:
+    return world[None].components[PlayerEntity]
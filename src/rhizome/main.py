@@ -2,14 +2,27 @@
 
 from tcod import context as tcontext, tileset, console as tconsole, event as tevent
 from rhizome.game import ui_states
-from rhizome.game.world import new_level, settings
+from rhizome.game.autosave import Autosave, recover
+from rhizome.game.world import Session
 from rhizome.game.ui_manager import *
-from rhizome.game.world import settings
+from rhizome.replay import Recorder, TITLE
+import argparse
 import pathlib
 
 HERE = pathlib.Path(__file__).parent
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", type=int, help="seed for the session's games; random by default")
+    parser.add_argument("--record", type=pathlib.Path, help="record the session to this file, for rhizome.replay")
+    parser.add_argument("--resume", action="store_true", help="carry on from the autosaved level")
+    args = parser.parse_args()
+    session = Session(seed=args.seed, prefetch=True)
+    recorder = Recorder(args.record, session) if args.record else None
+    saves = session.config.saves
+    if saves.autosave:
+        session.autosave = Autosave(saves.autosave, session, saves.compact_every)
+
     tiles = tileset.load_tilesheet(
         HERE / 'data/Alloy_curses_12x12.png',
         columns=16,
@@ -17,17 +30,29 @@ def main():
         charmap=tileset.CHARMAP_CP437
     )
     tileset.procedural_block_elements(tileset=tiles)
-    console = tconsole.Console(**settings["screen"])
-    state_manager = UIManager([ui_states.IntroScreen(title="Rhizome")])
+    console = tconsole.Console(session.config.screen.width, session.config.screen.height)
+    states = [ui_states.IntroScreen(title=TITLE, session=session)]
+    if args.resume:
+        world = recover(saves.autosave, session) if saves.autosave else None
+        if world is None:
+            parser.error("there is no autosaved level to resume")
+        session.enter(world)
+        states.append(ui_states.GameState(session))
+    state_manager = UIManager(states, recorder=recorder)
 
-    with tcontext.new(console=console,tileset=tiles) as ctx:
-        while True:
-            for event in tevent.wait():
-                state_manager.on_event(event)
-                if not state_manager.states:
-                    raise SystemExit
-            state_manager.draw(console)
-            ctx.present(console)
+    try:
+        with tcontext.new(console=console,tileset=tiles) as ctx:
+            while True:
+                for event in tevent.wait():
+                    state_manager.on_event(event)
+                    if not state_manager.states:
+                        raise SystemExit
+                state_manager.draw(console)
+                ctx.present(console)
+    finally:
+        if session.autosave is not None:
+            session.autosave.close()
+        session.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,166 @@
+#! python3
+"""
+Replay a recorded session without a window, as fast as it will go
+
+    python -m rhizome.main --seed 7 --record session.jsonl
+    python -m rhizome.replay session.jsonl
+
+A recording holds the seed the session's games were drawn from and every
+key press the `UIManager` handled. Every few key presses it also holds a
+checksum of the level; the replay recomputes them and reports any that
+differ, which means the game no longer plays out the same way.
+"""
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+import sys
+import time
+from dataclasses import dataclass, field
+from tcod.ecs import Registry
+from tcod.event import Event, KeyDown, KeyboardEvent, KeySym, Modifier, Scancode
+from rhizome.game import ui_states
+from rhizome.game.components import LevelNo, Name, Position, Seed, Stats
+from rhizome.game.strategies import Strategy
+from rhizome.game.ui_manager import UIManager
+from rhizome.game.world import Session
+
+VERSION = 1
+TITLE = "Rhizome"
+
+
+def checksum(world: Registry | None) -> str:
+    """
+    A digest of everything about the level that play can change:
+    where each entity is, its stats and its AI state
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if world is None:
+        return digest.hexdigest()
+    digest.update(repr((world[None].components.get(Seed), world[None].components.get(LevelNo))).encode())
+    entities = []
+    for entity in world.Q.all_of(components=[Position]):
+        stats = entity.components.get(Stats)
+        strategy = entity.components.get(Strategy)
+        entities.append(repr((
+            entity.components.get(Name, ""),
+            (entity.components[Position].x, entity.components[Position].y),
+            stats.asdict() if stats else None,
+            (strategy.state, strategy.timer) if strategy else None,
+        )))
+    # query order isn't stable between runs, so hash in a canonical order
+    for line in sorted(entities):
+        digest.update(line.encode())
+    return digest.hexdigest()
+
+
+class Recorder:
+    """
+    Write the seed of `session` and each key press handled by a `UIManager`
+    to `path`, one JSON object per line, with a checksum of the session's
+    level every `checkpoint_every` key presses
+    """
+
+    def __init__(self, path: str | os.PathLike, session: Session, checkpoint_every: int = 25):
+        self.file = open(path, "w", buffering=1)
+        self.session = session
+        self.checkpoint_every = checkpoint_every
+        self.keys = 0
+        self._write({"version": VERSION, "seed": session.seed, "checkpoint_every": checkpoint_every})
+
+    def _write(self, line: dict):
+        self.file.write(json.dumps(line) + "\n")
+
+    def record(self, event: Event):
+        if not isinstance(event, KeyboardEvent) or event.type != "KEYDOWN":
+            return
+        self._write({"key": [int(event.scancode), int(event.sym), int(event.mod), event.repeat]})
+        self.keys += 1
+        if self.keys % self.checkpoint_every == 0:
+            self._write({"checkpoint": self.keys, "checksum": checksum(self.session.world)})
+
+    def close(self):
+        self.file.close()
+
+
+@dataclass
+class Recording:
+    seed: int
+    keys: list[KeyDown] = field(default_factory=list)
+    checkpoints: dict[int, str] = field(default_factory=dict)
+    """ The checksum expected after each checkpointed number of key presses """
+
+    @classmethod
+    def load(cls, path: str | os.PathLike) -> "Recording":
+        with open(path) as file:
+            header = json.loads(file.readline())
+            if header.get("version") != VERSION:
+                raise ValueError(f"Unsupported recording version {header.get('version')!r}")
+            recording = cls(header["seed"])
+            for line in file:
+                entry = json.loads(line)
+                if "key" in entry:
+                    scancode, sym, mod, repeat = entry["key"]
+                    recording.keys.append(KeyDown(Scancode(scancode), KeySym(sym), Modifier(mod), repeat))
+                elif "checkpoint" in entry:
+                    recording.checkpoints[entry["checkpoint"]] = entry["checksum"]
+        return recording
+
+
+@dataclass
+class ReplayResult:
+    keys: int = 0
+    checked: int = 0
+    mismatches: list[int] = field(default_factory=list)
+    """ The checkpoints whose checksum differed from the recording """
+    seconds: float = 0.0
+
+    def __str__(self):
+        rate = self.keys / self.seconds if self.seconds else 0.0
+        verdict = f"{len(self.mismatches)} mismatched" if self.mismatches else "all match"
+        return (f"{self.keys} key presses in {self.seconds:.2f}s ({rate:.0f}/s); "
+                f"{self.checked} checkpoints, {verdict}")
+
+
+def replay(recording: Recording) -> ReplayResult:
+    """
+    Play `recording` from the start of its session, checking the level
+    against each of its checkpoints
+    """
+    result = ReplayResult()
+    start = time.perf_counter()
+    session = Session(seed=recording.seed)
+    ui = UIManager([ui_states.IntroScreen(title=TITLE, session=session)])
+    for key in recording.keys:
+        if not ui.states:
+            break
+        try:
+            ui.on_event(key)
+        except SystemExit:
+            break
+        result.keys += 1
+        expected = recording.checkpoints.get(result.keys)
+        if expected is not None:
+            result.checked += 1
+            if checksum(session.world) != expected:
+                result.mismatches.append(result.keys)
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", type=pathlib.Path)
+    args = parser.parse_args()
+
+    recording = Recording.load(args.recording)
+    result = replay(recording)
+    print(result)
+    if result.mismatches:
+        print(f"first mismatch after key press {result.mismatches[0]}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
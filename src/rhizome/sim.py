@@ -0,0 +1,340 @@
+#! python3
+"""
+Run the game without a window or input, as fast as it will go
+
+    python -m rhizome.sim --policy greedy --turns 5000
+
+The player is driven by a policy; each turn goes through the same
+`move_player`, `move_enemies` and `move_camera` pipeline as the real game,
+and nothing is drawn. When the player dies a new game starts, until the
+requested number of turns or games has been played.
+
+    python -m rhizome.sim --batch 2000 --workers 8 --out games.jsonl
+
+plays many independent seeded games across a pool of processes instead,
+printing running totals as the games finish and, with `--out`, writing a
+JSON line summarising each game.
+"""
+import argparse
+import collections
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Callable
+import numpy as np
+from tcod.ecs import Entity, Registry
+from rhizome.game import systems
+from rhizome.game.components import KilledBy, LevelNo, Name, Position, Vector
+from rhizome.game.profiling import profiler
+from rhizome.game.spatial import get_occupancy
+from rhizome.game.stats import get_stats_store
+from rhizome.game.strategies import CARDINALS, FlowField
+from rhizome.game.tags import Enemy, Hole
+from rhizome.game.world import Session, new_level
+
+type Policy = Callable[[Registry, Entity], Vector]
+""" Chooses the player's move for this turn """
+
+WAIT: Vector = Vector.offset(0, 0)
+
+SCRIPT_KEYS = {
+    "h": Vector.offset(-1, 0), "a": Vector.offset(-1, 0),
+    "l": Vector.offset(1, 0), "d": Vector.offset(1, 0),
+    "k": Vector.offset(0, -1), "w": Vector.offset(0, -1),
+    "j": Vector.offset(0, 1), "s": Vector.offset(0, 1),
+    ".": WAIT, " ": WAIT,
+}
+
+
+class RandomWalk:
+    """ Move in a random direction, or wait, each turn """
+
+    def __init__(self, seed: int | None = None):
+        self.rng = random.Random(seed)
+
+    def __call__(self, world: Registry, player: Entity) -> Vector:
+        return self.rng.choice(CARDINALS + (WAIT,))
+
+
+class Greedy:
+    """
+    Head straight for the hole, fighting anything in the way
+
+    Wanders at random when the hole can't be reached
+    """
+
+    def __init__(self, seed: int | None = None):
+        self.fallback = RandomWalk(seed)
+        self.world: Registry | None = None
+        self.field: FlowField | None = None
+
+    def __call__(self, world: Registry, player: Entity) -> Vector:
+        occupancy = get_occupancy(world)
+        if world is not self.world:
+            # kept apart from the level's own flow field, which follows the player
+            self.world, self.field = world, None
+            holes = [hole.components[Position] for hole in world.Q.all_of(components=[Position], tags=[Hole])]
+            holes = [hole for hole in holes if occupancy.in_bounds(hole)]
+            if holes:
+                self.field = FlowField(occupancy.walls, holes[0])
+        if self.field is None:
+            return self.fallback(world, player)
+        field = self.field.distance
+        position = player.components[Position]
+        best, best_distance = None, field[position.y, position.x]
+        for step in CARDINALS:
+            neighbour = position + step
+            if not occupancy.is_wall(neighbour) and field[neighbour.y, neighbour.x] < best_distance:
+                best, best_distance = step, field[neighbour.y, neighbour.x]
+        return best if best is not None else self.fallback(world, player)
+
+
+class Scripted:
+    """
+    Replay a fixed sequence of moves, written with the game's movement
+    keys (hjkl or wasd, and '.' or ' ' to wait), looping at the end
+    """
+
+    def __init__(self, script: str):
+        try:
+            self.moves = [SCRIPT_KEYS[key] for key in script.lower()]
+        except KeyError as error:
+            raise ValueError(f"Unknown move {error.args[0]!r} in script") from None
+        if not self.moves:
+            raise ValueError("Empty script")
+        self.turn = 0
+
+    def __call__(self, world: Registry, player: Entity) -> Vector:
+        move = self.moves[self.turn % len(self.moves)]
+        self.turn += 1
+        return move
+
+
+@dataclass
+class SimResult:
+    turns: int = 0
+    games: int = 0
+    levels: int = 0
+    seconds: float = 0.0
+
+    @property
+    def turns_per_second(self) -> float:
+        return self.turns / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (f"{self.turns} turns, {self.games} games, {self.levels} levels "
+                f"in {self.seconds:.2f}s: {self.turns_per_second:.1f} turns/s")
+
+
+def play_turn(session: Session, policy: Policy) -> bool:
+    """
+    Play one turn of `session` with the move chosen by `policy`
+
+    returns: whether the player survived the turn
+    """
+    return play_counted_turn(session, policy)[0]
+
+
+def play_counted_turn(session: Session, policy: Policy) -> tuple[bool, int]:
+    """
+    Play one turn like `play_turn`, counting the enemies the player kills
+
+    Only the player's own move can kill an enemy on its behalf, and the
+    dead lie where they fell until `move_enemies` sweeps them away, so
+    they are counted in between.
+
+    returns: (whether the player survived the turn, the enemies it killed)
+    """
+    direction = policy(session.world, session.player)
+    with profiler.stage("move_player"):
+        systems.move_player(session, direction)
+    kills = player_kills(session)
+    with profiler.stage("move_enemies"):
+        systems.move_enemies(session)
+    with profiler.stage("move_camera"):
+        systems.move_camera(session, direction)
+    profiler.end_turn()
+    return not systems.player_dead(session), kills
+
+
+def player_kills(session: Session) -> int:
+    """ How many of the dead enemies on the level were killed by the player """
+    name = session.player.components[Name]
+    return sum(Enemy in entity.tags and entity.components.get(KilledBy) == name
+               for entity in get_stats_store(session.world).dead())
+
+
+def run(policy: Policy, turns: int | None = None, games: int | None = None, seed: int | None = None) -> SimResult:
+    """
+    Play until `turns` turns or `games` games have been played,
+    whichever limit comes first, with games drawn from `seed`
+    """
+    if turns is None and games is None:
+        raise ValueError("Need a limit on turns or games")
+    result = SimResult()
+    start = time.perf_counter()
+    # building levels ahead only pays off when someone is waiting on a keypress
+    session = Session(seed)
+    world = new_level(session)
+    while (turns is None or result.turns < turns) and (games is None or result.games < games):
+        alive = play_turn(session, policy)
+        result.turns += 1
+        if session.world is not world:
+            world = session.world
+            result.levels += 1
+        if not alive:
+            result.games += 1
+            world = new_level(session)
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+@dataclass
+class GameSummary:
+    seed: int
+    depth: int
+    """ The level number the game ended on """
+    turns: int
+    kills: int
+    cause: str
+    """ What killed the player, or "survived" if the game hit the turn limit """
+
+
+def play_game(policy: Policy, seed: int, max_turns: int) -> GameSummary:
+    """
+    Play one game from `seed` until the player dies or `max_turns` is up
+    """
+    session = Session()
+    new_level(session, seed=seed)
+    turns = kills = 0
+    alive = True
+    while alive and turns < max_turns:
+        alive, killed = play_counted_turn(session, policy)
+        turns += 1
+        kills += killed
+    world = session.world
+    cause = session.player.components.get(KilledBy, "unknown") if not alive else "survived"
+    return GameSummary(seed, world[None].components[LevelNo], turns, kills, cause)
+
+
+POLICIES = {
+    "random": lambda seed, script: RandomWalk(seed),
+    "greedy": lambda seed, script: Greedy(seed),
+    "scripted": lambda seed, script: Scripted(script),
+}
+
+
+def play_batch_game(policy: str, seed: int, max_turns: int, script: str) -> GameSummary:
+    """ Play one game in a worker process """
+    return play_game(POLICIES[policy](seed, script), seed, max_turns)
+
+
+@dataclass
+class BatchTotals:
+    games: int = 0
+    turns: int = 0
+    kills: int = 0
+    depths: collections.Counter = field(default_factory=collections.Counter)
+    causes: collections.Counter = field(default_factory=collections.Counter)
+
+    def add(self, summary: GameSummary):
+        self.games += 1
+        self.turns += summary.turns
+        self.kills += summary.kills
+        self.depths[summary.depth] += 1
+        self.causes[summary.cause] += 1
+
+    def __str__(self):
+        games = max(self.games, 1)
+        depths = ", ".join(f"{depth}: {count}" for depth, count in sorted(self.depths.items()))
+        causes = ", ".join(f"{cause}: {count}" for cause, count in self.causes.most_common())
+        return (f"{self.games} games, {self.turns / games:.1f} turns and {self.kills / games:.2f} kills per game\n"
+                f"  depth reached  {depths}\n"
+                f"  cause of death {causes}")
+
+
+def run_batch(games: int, workers: int | None = None, policy: str = "random", seed: int = 0,
+              max_turns: int = 5000, script: str = ""):
+    """
+    Play `games` games across a pool of `workers` processes, each from
+    its own seed drawn from `seed`
+
+    yields: a `GameSummary` for each game, in the order they finish
+    """
+    seeds = (int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(games))
+    workers = workers or os.cpu_count() or 1
+    # sessions may have prefetch threads running, which fork doesn't copy safely
+    context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(workers, mp_context=context) as executor:
+        # keep a bounded number of games in flight rather than queueing them all
+        limit = 2 * workers
+        pending = set()
+        for game_seed in seeds:
+            pending.add(executor.submit(play_batch_game, policy, game_seed, max_turns, script))
+            if len(pending) >= limit:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                yield from (future.result() for future in done)
+        for future in concurrent.futures.as_completed(pending):
+            yield future.result()
+
+
+def main_batch(args):
+    totals = BatchTotals()
+    out = open(args.out, "w") if args.out else None
+    start = time.perf_counter()
+    try:
+        for summary in run_batch(args.batch, args.workers, args.policy, args.seed, args.max_turns, args.script):
+            totals.add(summary)
+            if out is not None:
+                out.write(json.dumps(asdict(summary)) + "\n")
+            if totals.games % args.report_every == 0 and totals.games < args.batch:
+                print(f"{totals.games}/{args.batch} games", file=sys.stderr)
+    finally:
+        if out is not None:
+            out.close()
+    seconds = time.perf_counter() - start
+    print(totals)
+    print(f"{seconds:.2f}s: {totals.games / seconds:.1f} games/s, {totals.turns / seconds:.0f} turns/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--policy", choices=POLICIES, default="random")
+    parser.add_argument("--turns", type=int, help="stop after this many turns")
+    parser.add_argument("--games", type=int, help="stop after this many games")
+    parser.add_argument("--script", default="llll.jjjj.hhhh.kkkk.", help="moves for the scripted policy")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--profile", action="store_true", help="report timings for each stage of the turn")
+    parser.add_argument("--trace", help="with --profile, write a JSON line per turn to this file")
+    parser.add_argument("--batch", type=int, help="play this many independent games across a process pool")
+    parser.add_argument("--workers", type=int, help="with --batch, how many processes to use; one per core by default")
+    parser.add_argument("--max-turns", type=int, default=5000, help="with --batch, end a game that lasts this long")
+    parser.add_argument("--out", help="with --batch, write a JSON line per game to this file")
+    parser.add_argument("--report-every", type=int, default=100, help="with --batch, report progress this often")
+    args = parser.parse_args()
+    if args.policy == "scripted":
+        Scripted(args.script)  # reject a bad script before starting
+    if args.batch:
+        return main_batch(args)
+    if args.turns is None and args.games is None:
+        args.turns = 1000
+
+    policy = POLICIES[args.policy](args.seed, args.script)
+    if args.profile:
+        profiler.enable(window=max(args.turns or 0, 1024), trace=args.trace)
+    result = run(policy, turns=args.turns, games=args.games, seed=args.seed)
+    print(result)
+    if args.profile:
+        profiler.disable()
+        print(f"{'stage':<16}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}")
+        for name, p50, p95, worst in profiler.summary():
+            print(f"{name:<16}{p50 * 1e3:>9.3f}{p95 * 1e3:>9.3f}{worst * 1e3:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
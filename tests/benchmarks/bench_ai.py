@@ -0,0 +1,82 @@
+"""
+Time enemy turns at increasing population sizes
+
+Compares advancing every enemy's state with the per-entity
+`Strategy.next_state` calls against the vectorized `EnemyAI.step`,
+and reports the cost of a whole `move_enemies` turn.
+
+Run with `python tests/benchmarks/bench_ai.py [--counts 50 500 5000]`
+"""
+import argparse
+import time
+import numpy as np
+from tcod.ecs import Registry
+from rhizome.game import systems
+from rhizome.game.ai import get_enemy_ai
+from rhizome.game.components import Map, Position, Stats
+from rhizome.game.maps import FreeCells, create_map
+from rhizome.game.strategies import Strategy, perception
+from rhizome.game.tags import Actor, Enemy, Solid
+from rhizome.game.world import STATE_MACHINES, Session, add_player, seed_level, take_position
+
+
+def build_level(count: int, seed: int = 0) -> Session:
+    """
+    Build a level with `count` enemies on a map sized to leave
+    room for them, as the current level of a new session
+    """
+    size = max(100, int(np.sqrt(count * 12)))
+    session = Session(seed)
+    world = session.world = Registry()
+    world[None].components[Session] = session
+    map_rng = seed_level(world, seed, 0)
+    map = world[None].components[Map] = create_map(size, size, 0.42, closed=True, backend="summed_area", rng=map_rng)
+    free_cells = FreeCells(map)
+    add_player(world, take_position(world, free_cells))
+    kinds = list(STATE_MACHINES)
+    for i in range(count):
+        kind = kinds[i % len(kinds)]
+        enemy = world.new_entity()
+        enemy.tags |= {Actor, Enemy, Solid, kind}
+        enemy.components[Position] = take_position(world, free_cells)
+        enemy.components[Stats] = Stats(1000, 1000, 0)
+        enemy.components[Strategy] = Strategy(STATE_MACHINES[kind])
+    return session
+
+
+def per_entity_states(world: Registry):
+    for enemy in world.Q.all_of(components=[Strategy]):
+        strategy = enemy.components[Strategy]
+        if strategy.next_state(enemy):
+            enemy.components[Strategy] = strategy
+
+
+def vectorized_states(world: Registry):
+    ai = get_enemy_ai(world)
+    rows = np.arange(len(ai))
+    ai.step(perception(world), rows, *ai.gather(rows))
+
+
+def time_turns(fn, argument, turns: int) -> float:
+    start = time.perf_counter()
+    for _ in range(turns):
+        fn(argument)
+    return (time.perf_counter() - start) / turns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--counts", type=int, nargs="+", default=[50, 500, 5000])
+    parser.add_argument("--turns", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'enemies':>8} {'next_state ms':>14} {'EnemyAI ms':>11} {'turn ms':>9}")
+    for count in args.counts:
+        per_entity = time_turns(per_entity_states, build_level(count).world, args.turns)
+        vectorized = time_turns(vectorized_states, build_level(count).world, args.turns)
+        turn = time_turns(systems.move_enemies, build_level(count), args.turns)
+        print(f"{count:>8} {per_entity * 1e3:>14.2f} {vectorized * 1e3:>11.2f} {turn * 1e3:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Measure how `create_map` scales with map size for each backend
+
+Run with `python tests/benchmarks/bench_maps.py [--sizes 128 512 2048]`
+"""
+import argparse
+import time
+import tracemalloc
+import numpy as np
+from rhizome.game.maps import BACKENDS, create_map
+
+
+def measure(size: int, backend: str, seed: int = 0):
+    """
+    Generate one `size` x `size` map
+
+    returns: (seconds taken, peak traced memory in bytes)
+    """
+    np.random.seed(seed)
+    tracemalloc.start()
+    start = time.perf_counter()
+    create_map(size, size, 0.42, closed=True, backend=backend)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 256, 512, 1024, 2048])
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS))
+    args = parser.parse_args()
+
+    print(f"{'size':>6} {'backend':>12} {'seconds':>10} {'peak MiB':>10}")
+    for size in args.sizes:
+        for backend in args.backends:
+            elapsed, peak = measure(size, backend)
+            print(f"{size:>6} {backend:>12} {elapsed:>10.4f} {peak / 2**20:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Compare the occupancy grid against tag-based position lookups
+
+Run with `python tests/benchmarks/bench_occupancy.py [--counts 1000 10000]`
+"""
+import argparse
+import time
+import numpy as np
+from tcod.ecs import Registry
+from rhizome.game.components import Map, Position, Vector
+from rhizome.game.spatial import get_occupancy
+from rhizome.game.tags import Solid
+
+DIRECTIONS = [Vector(1,0), Vector(-1,0), Vector(0,1), Vector(0,-1)]
+
+
+def populate(count: int, size: int, rng: np.random.Generator):
+    world = Registry()
+    world[None].components[Map] = np.zeros((size, size), dtype=bool)
+    cells = rng.choice(size * size, count, replace=False)
+    entities = []
+    for cell in cells:
+        entity = world.new_entity()
+        entity.tags.add(Solid)
+        position = Vector(int(cell % size), int(cell // size))
+        entity.components[Position] = position
+        # the tag index the occupancy grid replaces
+        entity.tags.add(position)
+        entities.append(entity)
+    return world, entities
+
+
+def time_it(fn, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+def run(count: int, size: int, lookups: int):
+    rng = np.random.default_rng(0)
+    world, entities = populate(count, size, rng)
+    occupancy = get_occupancy(world)
+    probes = [Vector(int(x), int(y)) for x, y in rng.integers(0, size, (lookups, 2))]
+
+    def tag_lookup():
+        for probe in probes:
+            any(Solid in entity.tags for entity in world.Q.all_of(tags=[probe]))
+
+    def grid_lookup():
+        for probe in probes:
+            occupancy.is_blocked(probe)
+
+    steps = []
+    for i, entity in enumerate(entities):
+        old = entity.components[Position]
+        new = old + DIRECTIONS[i % 4]
+        new = Vector(new.x % size, new.y % size)
+        steps.append((entity, old, new))
+
+    def tag_moves():
+        for entity, old, new in steps:
+            entity.tags.discard(old)
+            entity.tags.add(new)
+            entity.tags.discard(new)
+            entity.tags.add(old)
+
+    def grid_moves():
+        for entity, old, new in steps:
+            occupancy.remove(entity, old, release=False)
+            occupancy.add(entity, new)
+            occupancy.remove(entity, new, release=False)
+            occupancy.add(entity, old)
+
+    def solids_scan():
+        cost = np.ones((size, size), dtype=np.int8)
+        for entity in world.Q.all_of(components=[Position], tags=[Solid]):
+            position = entity.components[Position]
+            cost[position.y, position.x] = 0
+
+    def solids_grid():
+        ~occupancy.solid
+
+    results = {
+        "lookup (tags)": time_it(tag_lookup, 3) / lookups,
+        "lookup (grid)": time_it(grid_lookup, 3) / lookups,
+        "move (tags)": time_it(tag_moves, 3) / count,
+        "move (grid)": time_it(grid_moves, 3) / count,
+        "solid cost (scan)": time_it(solids_scan, 3),
+        "solid cost (grid)": time_it(solids_grid, 3),
+    }
+    for name, seconds in results.items():
+        print(f"{count:>7} {name:>20} {seconds * 1e6:>12.2f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--counts", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--size", type=int, default=256)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+    print(f"{'entities':>7} {'operation':>20} {'time':>15}")
+    for count in args.counts:
+        run(count, args.size, args.lookups)
+
+
+if __name__ == "__main__":
+    main()
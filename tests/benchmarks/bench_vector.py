@@ -0,0 +1,57 @@
+"""
+Time the operations every move and collision check does with a `Vector`
+
+Compares the current slotted `Vector` with the frozen dataclass it
+replaced, on construction, addition of a vector and of a pair,
+hashing into a dict, and equality.
+
+Run with `python tests/benchmarks/bench_vector.py [--number 200000]`
+"""
+import argparse
+import timeit
+from dataclasses import dataclass
+from rhizome.game.components import Vector
+
+
+@dataclass(frozen=True)
+class DataclassVector:
+    """ The old `Vector`, kept here as the point of comparison """
+    x: int
+    y: int
+
+    def __add__(self, other):
+        if isinstance(other, int):
+            return DataclassVector(self.x + other, self.y + other)
+        if isinstance(other, DataclassVector):
+            return DataclassVector(self.x + other.x, self.y + other.y)
+        return DataclassVector(self.x + other[0], self.y + other[1])
+
+
+def cases(cls):
+    a, b = cls(3, 4), cls(1, -1)
+    lookup = {cls(x, y): None for x in range(32) for y in range(32)}
+    return {
+        "construct": lambda: cls(3, 4),
+        "add vector": lambda: a + b,
+        "add pair": lambda: a + (1, -1),
+        "dict lookup": lambda: cls(7, 9) in lookup,
+        "hash": lambda: hash(a),
+        "equal": lambda: a == b,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=200_000, help="calls per timing")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    old, new = cases(DataclassVector), cases(Vector)
+    print(f"{'case':<14}{'dataclass ns':>14}{'slotted ns':>12}{'speedup':>9}")
+    for name in old:
+        before = min(timeit.repeat(old[name], number=args.number, repeat=args.repeat)) / args.number
+        after = min(timeit.repeat(new[name], number=args.number, repeat=args.repeat)) / args.number
+        print(f"{name:<14}{before * 1e9:>14.1f}{after * 1e9:>12.1f}{before / after:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+Time the game's hot paths and check them against a stored baseline
+
+    python tests/benchmarks/suite.py run [--save]
+    python tests/benchmarks/suite.py compare [--threshold 0.2]
+
+`run` times every case and prints the results; with `--save` they are
+written to the baseline file (tests/benchmarks/baseline.json by default).
+`compare` times the cases again and flags every one whose fastest run is
+more than `--threshold` slower than the baseline's (the fastest run is the
+least disturbed by the rest of the machine), exiting with status 1 if any
+regressed. `--only` restricts either mode to cases whose name contains
+one of the given strings.
+
+Every case seeds numpy and the stdlib RNGs, so repeated runs do the same
+work. Timings are still machine specific: save a baseline on the machine
+you compare on.
+"""
+import argparse
+import json
+import pathlib
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable
+import numpy as np
+from tcod.console import Console
+from tcod.ecs import Registry
+from rhizome.game import snapshots, systems
+from rhizome.game.combat import Attacks, resolve
+from rhizome.game.components import LevelNo, Map, Position
+from rhizome.game.maps import FreeCells, create_map
+from rhizome.game.strategies import FlowField, Perception, Strategy, move_towards, perception
+from rhizome.game.tags import Enemy
+from rhizome.game.ui_states import GameState
+from rhizome.game.world import CONFIG, Session, add_player, new_level, populate_enemies, seed_level, take_position
+from bench_ai import build_level
+
+HERE = pathlib.Path(__file__).parent
+BASELINE = HERE / "baseline.json"
+SEED = 0
+
+type Setup = Callable[[], Callable[[], object]]
+""" Prepares one repetition of a case and returns the function to time """
+
+CASES: dict[str, Setup] = {}
+
+
+def case(name: str):
+    def register(setup: Setup) -> Setup:
+        CASES[name] = setup
+        return setup
+    return register
+
+
+def seed_all(seed: int = SEED):
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def map_case(size: int):
+    def setup():
+        seed_all()
+        return lambda: create_map(size, size, CONFIG.map.wall_threshold,
+                                  closed=True, backend=CONFIG.map.backend)
+    return setup
+
+
+for size in (100, 256, 512):
+    case(f"create_map[{size}]")(map_case(size))
+
+
+@case("new_level")
+def new_level_setup():
+    seed_all()
+    return lambda: new_level(Session(), seed=SEED)
+
+
+@case("populate_enemies")
+def populate_enemies_setup():
+    seed_all()
+    world = Registry()
+    world[None].components[LevelNo] = 2
+    map = world[None].components[Map] = create_map(CONFIG.map.height, CONFIG.map.width, CONFIG.map.wall_threshold,
+                                                   closed=True, backend=CONFIG.map.backend,
+                                                   rng=seed_level(world, SEED, 2))
+    free_cells = FreeCells(map)
+    add_player(world, take_position(world, free_cells))
+    return lambda: populate_enemies(world, free_cells, 2)
+
+
+def move_enemies_case(count: int, turns: int = 10):
+    def setup():
+        seed_all()
+        session = build_level(count, SEED)
+
+        def play():
+            for _ in range(turns):
+                systems.move_enemies(session)
+        return play
+    return setup
+
+
+for count in (50, 500, 2000):
+    case(f"move_enemies[{count}]")(move_enemies_case(count))
+
+
+@case("combat[2000]")
+def combat_setup():
+    seed_all()
+    session = build_level(2000, SEED)
+    world = session.world
+    enemies = list(world.Q.all_of(components=[Position], tags=[Enemy]))
+    # every enemy strikes its neighbour in the list, and every tenth the player
+    pairs = [(enemy, enemies[i - 1]) for i, enemy in enumerate(enemies)]
+    pairs += [(enemy, session.player) for enemy in enemies[::10]]
+
+    def play():
+        attacks = Attacks()
+        for attacker, defender in pairs:
+            attacks.declare(attacker, defender)
+        resolve(world, attacks)
+    return play
+
+
+@case("move_towards")
+def move_towards_setup():
+    seed_all()
+    session = build_level(500, SEED)
+    world = session.world
+    target = session.player.components[Position]
+    positions = [enemy.components[Position] for enemy in world.Q.all_of(components=[Position], tags=[Enemy])]
+
+    def play():
+        # drop the cached flow field so it is rebuilt, as it is whenever the player moves
+        world[None].components.pop(FlowField, None)
+        for position in positions:
+            move_towards(world, position, target)
+    return play
+
+
+@case("next_state_fov")
+def next_state_setup():
+    seed_all()
+    world = build_level(500, SEED).world
+    enemies = list(world.Q.all_of(components=[Strategy]))
+
+    def play():
+        # drop the cached field of view so it is recomputed, as it is whenever the player moves
+        world[None].components.pop(Perception, None)
+        perception(world)
+        for enemy in enemies:
+            enemy.components[Strategy].next_state(enemy)
+    return play
+
+
+@case("draw")
+def draw_setup():
+    seed_all()
+    session = Session()
+    new_level(session, seed=SEED)
+    state = GameState(session)
+    console = Console(CONFIG.screen.width, CONFIG.screen.height)
+    state.draw(console)
+    return lambda: state.draw(console)
+
+
+def snapshot_case(count: int, load: bool):
+    def setup():
+        seed_all()
+        session = build_level(count, SEED)
+        path = pathlib.Path(tempfile.gettempdir()) / f"rhizome-bench-{count}.rhz"
+        snapshots.save(session.world, path)
+        if load:
+            return lambda: snapshots.load(path, session)
+        return lambda: snapshots.save(session.world, path)
+    return setup
+
+
+for count in (500, 2000):
+    case(f"snapshot_save[{count}]")(snapshot_case(count, load=False))
+    case(f"snapshot_load[{count}]")(snapshot_case(count, load=True))
+
+
+def time_case(setup: Setup, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        fn = setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {"median": statistics.median(times), "min": min(times), "repeat": repeat}
+
+
+def run(names: list[str], repeat: int) -> dict:
+    results = {}
+    for name in names:
+        results[name] = time_case(CASES[name], repeat)
+    return results
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Print `results` beside `baseline`
+
+    returns: the names of the cases more than `threshold` slower than the baseline
+    """
+    regressions = []
+    print(f"{'case':<22} {'baseline ms':>12} {'now ms':>10} {'change':>8}")
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<22} {'-':>12} {result['min'] * 1e3:>10.2f} {'new':>8}")
+            continue
+        change = result["min"] / before["min"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<22} {before['min'] * 1e3:>12.2f} {result['min'] * 1e3:>10.2f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", choices=["run", "compare"])
+    parser.add_argument("--baseline", type=pathlib.Path, default=BASELINE)
+    parser.add_argument("--save", action="store_true", help="write the results to the baseline file")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="fraction slower than the baseline that counts as a regression")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="+", help="only run cases whose names contain one of these")
+    args = parser.parse_args()
+
+    names = [name for name in CASES if not args.only or any(part in name for part in args.only)]
+    results = run(names, args.repeat)
+
+    if args.mode == "compare":
+        baseline = json.loads(args.baseline.read_text())
+        regressions = compare(results, baseline["cases"], args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        return
+
+    print(f"{'case':<22} {'median ms':>10} {'min ms':>10}")
+    for name, result in results.items():
+        print(f"{name:<22} {result['median'] * 1e3:>10.2f} {result['min'] * 1e3:>10.2f}")
+    if args.save:
+        args.baseline.write_text(json.dumps({"environment": environment(), "cases": results}, indent=2) + "\n")
+        print(f"saved to {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+from random import Random
+import numpy as np
+import pytest
+from tcod.ecs import Registry
+
+from rhizome.game.ai import get_enemy_ai
+from rhizome.game.components import Map, Position, Stats, Vector
+from rhizome.game.strategies import StateMachine, Strategy, perception
+from rhizome.game.tags import Enemy, Solid
+from rhizome.game.world import STATE_MACHINES, add_player, seed_level
+
+
+@pytest.fixture
+def world():
+    world = Registry()
+    world[None].components[Map] = np.zeros((12, 12), dtype=bool)
+    seed_level(world, 0, 0)
+    add_player(world, Vector(5,5))
+    return world
+
+
+def test_step_matches_next_state(world):
+    rng = Random(0)
+    machines = list(STATE_MACHINES.values())
+    enemies = []
+    for y in range(12):
+        for x in range(12):
+            if (x, y) == (5, 5):
+                continue
+            enemy = world.new_entity()
+            enemy.tags |= {Enemy, Solid}
+            enemy.components[Position] = Vector(x, y)
+            enemy.components[Stats] = Stats(rng.randint(1, 5), 5, 1)
+            machine = rng.choice(machines)
+            enemy.components[Strategy] = Strategy(
+                machine, rng.randrange(len(machine.states)), rng.randint(0, 4)
+            )
+            enemies.append(enemy)
+
+    expected = {}
+    for enemy in enemies:
+        strategy = enemy.components[Strategy]
+        copy = Strategy(strategy.machine, strategy.state, strategy.timer)
+        copy.next_state(enemy)
+        expected[enemy] = (copy.state, copy.timer)
+
+    ai = get_enemy_ai(world)
+    rows = np.arange(len(ai))
+    ai.step(perception(world), rows, *ai.gather(rows))
+    for enemy in enemies:
+        strategy = enemy.components[Strategy]
+        assert (strategy.state, strategy.timer) == expected[enemy]
+
+
+def test_next_state_negated_condition(world):
+    machine = StateMachine.from_settings("test", {
+        "states": {"waiting": "stay", "fleeing": "wander"},
+        "transitions": [{"from": "waiting", "when": "!injured", "to": "fleeing"}],
+    })
+    enemy = world.new_entity()
+    enemy.components[Position] = Vector(1,1)
+    enemy.components[Stats] = Stats(5, 5, 1)
+    strategy = Strategy(machine)
+    assert strategy.next_state(enemy)
+    assert strategy.state_name == "fleeing"
+
+
+def test_rows_follow_components(world):
+    enemy = world.new_entity()
+    enemy.components[Position] = Vector(1,1)
+    enemy.components[Strategy] = Strategy(STATE_MACHINES["spider"])
+    ai = get_enemy_ai(world)
+    assert ai.entities == [enemy]
+    other = world.new_entity()
+    other.components[Strategy] = Strategy(STATE_MACHINES["beetle"])
+    enemy.clear()
+    assert ai.entities == [other]
+
+
+COUNTDOWN = {
+    "states": {"waiting": "stay", "wandering": "wander"},
+    "transitions": [{"from": "waiting", "when": "expired", "to": "wandering"}],
+}
+
+
+def test_parse_countdown():
+    machine = StateMachine.from_settings("test", COUNTDOWN)
+    assert machine.states == ("waiting", "wandering")
+    assert machine.transitions[0][0].conditions == (("expired", True),)
+
+
+def test_countdown(world):
+    enemy = world.new_entity()
+    enemy.components[Position] = Vector(1,1)
+    enemy.components[Stats] = Stats(5, 5, 1)
+    enemy.components[Strategy] = Strategy(StateMachine.from_settings("test", COUNTDOWN), timer=3)
+    ai = get_enemy_ai(world)
+    rows = np.arange(len(ai))
+    seen = []
+    for _ in range(4):
+        ai.step(perception(world), rows, *ai.gather(rows))
+        strategy = enemy.components[Strategy]
+        seen.append((strategy.state_name, strategy.timer))
+    assert seen == [("waiting", 2), ("waiting", 1), ("waiting", 0), ("wandering", 0)]
+
+
+@pytest.mark.parametrize("ai", [
+    {"states": {}},
+    {"states": {"waiting": "dance"}},
+    {"states": {"waiting": "stay"}, "transitions": [{"from": "waiting", "to": "sleeping"}]},
+    {"states": {"waiting": "stay"}, "transitions": [{"from": "waiting", "when": "!hungry", "to": "waiting"}]},
+])
+def test_invalid_machines(ai):
+    with pytest.raises(ValueError):
+        StateMachine.from_settings("test", ai)
+
+
+def test_dormant_enemies(world):
+    ai = get_enemy_ai(world)
+    ai.activation_radius, ai.region_size, ai.dormant_period = 2, 0, 4
+    near = world.new_entity()
+    near.components[Position] = Vector(6,5)
+    near.components[Strategy] = Strategy(STATE_MACHINES["spider"])
+    far = world.new_entity()
+    far.components[Position] = Vector(11,11)
+    far.components[Strategy] = Strategy(STATE_MACHINES["spider"])
+
+    scheduled = [ai.schedule(Vector(5,5)) for _ in range(4)]
+    assert all(mask[0] for mask in scheduled)
+    assert sum(mask[1] for mask in scheduled) == 1
+
+    ai.noise(Vector(10,10))
+    assert ai.awake()[1]
+    assert ai.schedule(Vector(5,5))[1]
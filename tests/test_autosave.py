@@ -0,0 +1,64 @@
+from rhizome.game.autosave import Autosave, recover
+from rhizome.game.logging import logger
+from rhizome.game.world import Session, new_level
+from rhizome.replay import checksum
+from rhizome.sim import RandomWalk, play_turn
+
+
+def play(session, policy, turns):
+    for _ in range(turns):
+        play_turn(session, policy)
+        session.autosave.end_turn()
+
+
+def test_recovers_snapshot_and_deltas(tmp_path):
+    session = Session(4)
+    session.autosave = Autosave(tmp_path / "autosave", session, compact_every=10)
+    new_level(session)
+    play(session, RandomWalk(1), 25)
+    session.autosave.close()
+
+    log = (tmp_path / "autosave.log").read_text().splitlines()
+    assert len(log) > 1
+    recovered = recover(tmp_path / "autosave", Session(4))
+    assert checksum(recovered) == checksum(session.world)
+
+
+def test_ignores_torn_last_line(tmp_path):
+    session = Session(4)
+    session.autosave = Autosave(tmp_path / "autosave", session, compact_every=50)
+    new_level(session)
+    play(session, RandomWalk(2), 10)
+    before_last = checksum(session.world)
+    play(session, RandomWalk(3), 1)
+    session.autosave.close()
+
+    log = tmp_path / "autosave.log"
+    text = log.read_text()
+    assert '"turn": 10' in text.splitlines()[-1]
+    log.write_text(text[:-10])
+    recovered = recover(tmp_path / "autosave", Session(4))
+    assert checksum(recovered) == before_last
+
+
+def test_nothing_to_recover(tmp_path):
+    assert recover(tmp_path / "autosave") is None
+
+
+def test_reports_write_failure(tmp_path):
+    session = Session(4)
+    # the snapshot can't be written into a directory that isn't there
+    autosave = session.autosave = Autosave(tmp_path / "missing" / "autosave", session)
+    new_level(session)
+    messages = list(logger.messages)
+    try:
+        play(session, RandomWalk(1), 5)
+        autosave.close()
+        assert isinstance(autosave.error, FileNotFoundError)
+        autosave.end_turn()
+        autosave.end_turn()
+        # reported once, whichever turn first saw the failure
+        reported = logger.messages[len(messages):]
+        assert sum(message.startswith("Autosave failed") for message in reported) == 1
+    finally:
+        logger.messages[:] = messages
@@ -0,0 +1,30 @@
+import numpy as np
+from rhizome.balance import duel, simulate
+from rhizome.game.components import Stats
+from rhizome.game.world import CONFIG, compile_archetypes
+
+
+def test_fixed_duel():
+    # no dice: the player deals 4 - 1 = 3 a blow and takes 2 back until the enemy falls
+    player = Stats(20, 20, 4)
+    enemy = Stats(10, 10, 2, toughness=1)
+    won, lost, taken, rounds = duel(player, enemy, 5, np.random.default_rng(0))
+    assert won.all() and not lost.any()
+    assert (rounds == 4).all()
+    assert (taken == 6).all()
+
+
+def test_unwinnable_duel_is_a_draw():
+    won, lost, taken, rounds = duel(Stats(20, 20, 1), Stats(10, 10, 0, toughness=5),
+                                    3, np.random.default_rng(0), max_rounds=7)
+    assert not won.any() and not lost.any()
+    assert (rounds == 7).all()
+
+
+def test_simulate_covers_every_trait():
+    rows = simulate([0, 2], duels=200)
+    for level in (0, 2):
+        for kind, archetype in compile_archetypes(CONFIG, level).items():
+            traits = [row.trait for row in rows if row.level == level and row.kind == kind]
+            assert len(traits) == len(archetype.traits) + 1 and traits[-1] == "(any)"
+    assert all(0 <= row.win_rate + row.loss_rate <= 1 + 1e-9 for row in rows)
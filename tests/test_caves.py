@@ -21,11 +21,84 @@
 
 #     assert np.all(caves.generation(cave) == updated)
 
+from random import Random
+import numpy as np
+import pytest
 from rhizome.game.components import Vector
+from rhizome.game.maps import BACKENDS, FreeCells, create_map
 
 
 def test_vector():
     assert Vector(1,0)
     assert Vector(0,1)
     assert Vector(-1,-1)
-    assert not Vector(0,0)
\ No newline at end of file
+    assert not Vector(0,0)
+
+
+@pytest.mark.parametrize("closed", [True, False])
+@pytest.mark.parametrize("height, width", [(100, 100), (37, 53), (2, 3)])
+def test_backends_agree(height, width, closed):
+    maps = []
+    for backend in BACKENDS:
+        np.random.seed(1234)
+        maps.append(create_map(height, width, 0.42, closed=closed, backend=backend))
+    for map in maps[1:]:
+        assert np.array_equal(maps[0], map)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_map(10, 10, 0.42, backend="nonsense")
+
+
+def test_free_cells_sample_all():
+    map = np.array([
+        [1,0,0],
+        [0,1,0],
+        [0,0,1]
+    ], dtype=bool)
+    cells = FreeCells(map)
+    assert len(cells) == 6
+    rng = Random(0)
+    taken = {cells.sample(rng) for _ in range(6)}
+    assert taken == {tuple(idx) for idx in np.argwhere(~map)}
+    assert len(cells) == 0
+    with pytest.raises(IndexError):
+        cells.sample(rng)
+
+
+def test_free_cells_mask():
+    map = np.zeros((4,4), dtype=bool)
+    cells = FreeCells(map)
+    mask = np.zeros_like(map)
+    mask[:2, :2] = True
+    rng = Random(0)
+    for _ in range(4):
+        row, column = cells.sample(rng, mask)
+        assert row < 2 and column < 2
+    with pytest.raises(IndexError):
+        cells.sample(rng, mask)
+    assert len(cells) == 12
+
+
+def test_free_cells_take():
+    cells = FreeCells(np.zeros((2,2), dtype=bool))
+    cells.take((1,1))
+    assert (1,1) not in cells
+    cells.take((1,1))
+    assert len(cells) == 3
+
+
+def test_free_cells_sample_many():
+    map = np.zeros((5,5), dtype=bool)
+    map[2] = True
+    cells = FreeCells(map)
+    rows, columns = cells.sample_many(Random(0), 12)
+    assert len(set(zip(rows.tolist(), columns.tolist()))) == 12
+    assert not map[rows, columns].any()
+    assert len(cells) == 8
+    assert all((row, column) not in cells for row, column in zip(rows, columns))
+    remaining = {cells.sample(Random(1)) for _ in range(8)}
+    assert remaining.isdisjoint(zip(rows.tolist(), columns.tolist()))
+    with pytest.raises(IndexError):
+        cells.sample_many(Random(0), 1)
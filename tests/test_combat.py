@@ -0,0 +1,79 @@
+import copy
+import random
+import numpy as np
+import pytest
+from tcod.ecs import Registry
+from rhizome.game.combat import Attacks, resolve
+from rhizome.game.components import CombatRandom, KilledBy, Name, Stats
+from rhizome.game.logging import logger
+
+
+@pytest.fixture(autouse=True)
+def quiet_log():
+    # combat reports every blow to the game's log, which other tests count
+    messages = list(logger.messages)
+    yield
+    logger.messages[:] = messages
+
+
+def fighters(world, count, rng):
+    entities = []
+    for i in range(count):
+        entity = world.new_entity()
+        entity.components[Name] = f"fighter {i}"
+        low = rng.randint(0, 2)
+        entity.components[Stats] = Stats(rng.randint(-2, 12), 12, rng.randint(0, 4), (low, low + rng.randint(0, 3)),
+                                         toughness=rng.randint(0, 3))
+        entities.append(entity)
+    return entities
+
+
+def one_at_a_time(attacks, rolls):
+    """ The old way: each attack lands on its own, in order """
+    health = {defender: defender.components[Stats].health for defender in attacks.defenders}
+    dealt, killed_by = [], {}
+    for attacker, defender, roll in zip(attacks.attackers, attacks.defenders, rolls):
+        amount = attacker.components[Stats].strength + roll - defender.components[Stats].toughness
+        amount = min(amount, health[defender])
+        if health[defender] > 0 and health[defender] - amount <= 0:
+            killed_by[defender] = attacker.components[Name]
+        health[defender] -= amount
+        dealt.append(amount)
+    return dealt, health, killed_by
+
+
+def test_batch_matches_one_attack_at_a_time():
+    rng = random.Random(3)
+    for trial in range(50):
+        world = Registry()
+        world[None].components[CombatRandom] = np.random.default_rng(trial)
+        entities = fighters(world, 6, rng)
+        attacks = Attacks()
+        for _ in range(rng.randint(1, 15)):
+            attacks.declare(*rng.sample(entities, 2))
+        generator = copy.deepcopy(world[None].components[CombatRandom])
+        low = [attacker.components[Stats].damage_range[0] for attacker in attacks.attackers]
+        high = [attacker.components[Stats].damage_range[1] for attacker in attacks.attackers]
+        expected_dealt, expected_health, killed_by = one_at_a_time(attacks, generator.integers(low, high, endpoint=True))
+
+        dealt, fatal = resolve(world, attacks)
+        assert dealt.tolist() == expected_dealt
+        for defender, health in expected_health.items():
+            assert defender.components[Stats].health == health
+        assert {attacks.defenders[index] for index in fatal} == set(killed_by)
+        for defender, name in killed_by.items():
+            assert defender.components[KilledBy] == name
+
+
+def test_same_seed_same_fight():
+    outcomes = []
+    for _ in range(2):
+        world = Registry()
+        world[None].components[CombatRandom] = np.random.default_rng(7)
+        entities = fighters(world, 4, random.Random(1))
+        attacks = Attacks()
+        for attacker, defender in [(0, 1), (2, 1), (3, 0), (1, 2)]:
+            attacks.declare(entities[attacker], entities[defender])
+        dealt, fatal = resolve(world, attacks)
+        outcomes.append((dealt.tolist(), fatal.tolist()))
+    assert outcomes[0] == outcomes[1]
@@ -0,0 +1,52 @@
+import copy
+import pytest
+
+from rhizome.game.components import Graphic
+from rhizome.game.config import load_config
+from rhizome.game.world import CONFIG, Session, settings
+
+
+def test_default_settings_compile():
+    assert CONFIG.map.height == settings["map"]["height"]
+    assert CONFIG.camera.width == settings["camera"]["width"]
+    assert CONFIG.player.graphic == Graphic(settings["player"]["graphic"]["char"],
+                                            tuple(settings["player"]["graphic"]["fg"]))
+    assert set(CONFIG.enemies) == set(settings["enemy"])
+
+
+def test_graphics_and_stats_are_interned():
+    again = load_config(settings)
+    assert again.corpse is CONFIG.corpse
+    assert again.enemies["beetle"].graphic is CONFIG.enemies["beetle"].graphic
+    assert again.player.stats is CONFIG.player.stats
+
+
+def test_config_is_frozen():
+    with pytest.raises(AttributeError):
+        CONFIG.map.height = 3
+
+
+@pytest.mark.parametrize("path, value, message", [
+    (["map", "backend"], "nonsense", "map.backend"),
+    (["map", "height"], "tall", "map.height"),
+    (["camera", "width"], None, "camera"),
+    (["player", "health"], 0, "player.health"),
+    (["player", "graphic", "fg"], [0, 0, 300], "player.graphic.fg"),
+    (["enemy", "beetle", "traits", "wings"], 0.1, "enemy.beetle.traits"),
+    (["enemy", "beetle", "traits", "jaws"], 0.9, "enemy.beetle.traits"),
+    (["enemy", "beetle", "size_range"], [], "enemy.beetle.size_range"),
+    (["screen", "depth"], 3, "screen"),
+])
+def test_malformed_settings_fail_at_load(path, value, message):
+    raw = copy.deepcopy(settings)
+    table = raw
+    for key in path[:-1]:
+        table = table[key]
+    if value is None:
+        del table[path[-1]]
+    else:
+        table[path[-1]] = value
+    with pytest.raises(ValueError, match=message):
+        load_config(raw)
+    with pytest.raises(ValueError, match=message):
+        Session(config=raw)
@@ -1,11 +1,12 @@
 
+import copy
 import numpy as np
 from tcod.path import SimpleGraph, Pathfinder
 from tcod.ecs import *
 
-from rhizome.game import systems
+from rhizome.game import strategies, systems
 from rhizome.game.components import Map, Stats, Vector
-from rhizome.game.world import add_player
+from rhizome.game.world import Session, add_player, settings
 
 def test_pf():
 
@@ -30,4 +31,61 @@ def test_collisions():
     collisions  = systems.collide_entity(player, Vector(0,0))
     assert not collisions
     collisions = systems.collide_entity(player, Vector(1,0))
-    assert not collisions
\ No newline at end of file
+    assert not collisions
+
+def test_flow_field():
+    map = np.array([
+        [0,0,0],
+        [1,1,0],
+        [0,0,0],
+    ], dtype=bool)
+    field = strategies.FlowField(map, Vector(0,0))
+    assert field.distance[0,0] == 0
+    assert field.distance[2,0] == 6
+    assert field.distance[1,0] == strategies.UNREACHABLE
+
+
+def test_move_towards():
+    map = np.zeros((3,3), dtype=bool)
+    world = Registry()
+    world[None].components[Map] = map
+    add_player(world, Vector(2,2))
+
+    assert strategies.move_towards(world, Vector(0,2), Vector(2,2)) == Vector(1,0)
+    assert strategies.move_towards(world, Vector(0,2), Vector(2,2), 2) == Vector(2,0)
+    # a solid entity in the way stops the move short
+    add_player(world, Vector(1,2))
+    assert strategies.move_towards(world, Vector(0,2), Vector(2,2)) == Vector(0,0)
+
+
+def situation(context, position, alert_radius):
+    """ The conditions as plain bools for one unhurt enemy at `position` """
+    facts = strategies.situation(context, np.array([position.x]), np.array([position.y]),
+                                 alert_radius, np.array([5]), np.array([5]), np.array([0]))
+    return {condition: bool(value[0]) for condition, value in facts.items()}
+
+
+def test_perception():
+    map = np.zeros((5,5), dtype=bool)
+    map[:4, 2] = True
+    context = strategies.Perception(~map, Vector(0,0))
+    assert situation(context, Vector(1,1), 10)["visible"]
+    assert not situation(context, Vector(4,0), 10)["visible"]
+    assert not situation(context, Vector(1,1), 1)["visible"]
+    assert situation(context, Vector(0,1), 10)["adjacent"]
+    assert not situation(context, Vector(1,1), 10)["adjacent"]
+    assert situation(context, Vector(3,4), 8)["near"]
+    assert not situation(context, Vector(3,4), 7)["near"]
+    assert not situation(context, Vector(3,4), 7)["injured"]
+
+
+def test_perception_reaches_the_most_alert_enemy():
+    raw = copy.deepcopy(settings)
+    raw["enemy"]["spider"]["ai"]["alert_radius"] = 30
+    world = Registry()
+    world[None].components[Session] = Session(config=raw)
+    world[None].components[Map] = np.zeros((40, 40), dtype=bool)
+    add_player(world, Vector(0,0))
+    assert strategies.perception_radius(world) == 30
+    context = strategies.perception(world)
+    assert situation(context, Vector(25,0), 30)["visible"]
@@ -0,0 +1,29 @@
+import json
+from rhizome.game.profiling import Profiler
+
+
+def test_disabled_records_nothing():
+    profiler = Profiler()
+    with profiler.stage("turn"):
+        pass
+    profiler.count("enemies", 3)
+    profiler.end_turn()
+    assert profiler.timings == {} and profiler.counts == {} and profiler.turn == 0
+
+
+def test_rolling_window_and_trace(tmp_path):
+    trace = tmp_path / "trace.jsonl"
+    profiler = Profiler()
+    profiler.enable(window=4, trace=str(trace))
+    for turn in range(10):
+        profiler.record("move", turn / 1000)
+        profiler.count("enemies", turn)
+        profiler.end_turn()
+    profiler.disable()
+
+    assert list(profiler.timings["move"]) == [0.006, 0.007, 0.008, 0.009]
+    ((name, p50, p95, worst),) = profiler.summary()
+    assert name == "move" and p50 == 0.0075 and worst == 0.009
+    lines = [json.loads(line) for line in trace.read_text().splitlines()]
+    assert len(lines) == 10
+    assert lines[-1] == {"turn": 10, "ms": {"move": 9.0}, "counts": {"enemies": 9}}
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from tcod.console import Console
+from tcod.ecs import Registry
+from tcod.event import KeyDown, KeySym, Modifier, Scancode
+
+from rhizome.game import maps, ui_states
+from rhizome.game.components import BoundingBox, Camera, Graphic, Map, Position, Vector
+from rhizome.game.logging import logger
+from rhizome.game.maps import to_rgb
+from rhizome.game.rendering import get_sprite_layer
+from rhizome.game.tags import Edible
+from rhizome.game.world import FloorTile, Session, WallTile, add_item, add_player, new_level
+
+
+def test_draw_order_and_culling():
+    world = Registry()
+    layer = get_sprite_layer(world)
+    add_item(world, Vector(2,2), Graphic("#"), tags={Edible})
+    player = add_player(world, Vector(2,2))
+    add_item(world, Vector(3,2), Graphic("%"), tags=set())
+    add_item(world, Vector(9,9), Graphic("&"), tags=set())
+
+    console = Console(4, 4)
+    bounds = BoundingBox(Vector(1,1), Vector(5,5))
+    layer.draw(console.rgb, bounds)
+    assert chr(console.rgb["ch"][1,1]) == player.components[Graphic].char
+    assert chr(console.rgb["ch"][1,2]) == "%"
+    assert "&" not in {chr(c) for c in console.rgb["ch"].ravel()}
+
+    player.clear()
+    console.clear()
+    layer.draw(console.rgb, bounds)
+    assert chr(console.rgb["ch"][1,1]) == "#"
+    assert len(layer) == 3
+
+
+@pytest.fixture
+def game(monkeypatch, tmp_path):
+    # quicksaves go to the working directory
+    monkeypatch.chdir(tmp_path)
+    messages = list(logger.messages)
+    session = Session(2)
+    new_level(session)
+    yield session, ui_states.GameState(session)
+    logger.messages[:] = messages
+
+
+def check_viewport(session, state, console):
+    """ Draw a frame and check the viewport is the camera's slice of the terrain under the sprites """
+    state.draw(console)
+    world = session.world
+    camera_entity, = world.Q.all_of(components=[Camera])
+    camera = camera_entity.components[Camera]
+    bounds = camera.bounding_box(camera_entity.components[Position])
+    terrain = to_rgb(world[None].components[Map], wall=WallTile, floor=FloorTile)
+    expected = terrain[bounds.top:bounds.bottom, bounds.left:bounds.right].copy()
+    get_sprite_layer(world).draw(expected, bounds)
+    assert np.array_equal(console.rgb[:camera.height, :camera.width], expected)
+
+
+def test_terrain_is_built_once_per_map(game, monkeypatch):
+    session, state = game
+    built = []
+    monkeypatch.setattr(maps, "to_rgb", lambda map, **tiles: built.append(map) or to_rgb(map, **tiles))
+    config = session.config.screen
+    console = Console(config.width, config.height)
+
+    check_viewport(session, state, console)
+    check_viewport(session, state, console)
+    assert built == [session.world[None].components[Map]]
+
+    new_level(session, new_game=False)
+    check_viewport(session, state, console)
+    assert len(built) == 2 and built[-1] is session.world[None].components[Map]
+
+    for sym in (KeySym.F5, KeySym.F9):
+        state.on_event(KeyDown(Scancode.UNKNOWN, sym, Modifier.NONE))
+    assert built[-1] is not session.world[None].components[Map]
+    check_viewport(session, state, console)
+    assert len(built) == 3 and built[-1] is session.world[None].components[Map]
+
+
+def test_viewport_at_the_map_edges(game):
+    session, state = game
+    config = session.config.screen
+    console = Console(config.width, config.height)
+    world = session.world
+    height, width = world[None].components[Map].shape
+    camera_entity, = world.Q.all_of(components=[Camera])
+    camera = camera_entity.components[Camera]
+    for corner in (Vector(0,0), Vector(width - camera.width, 0),
+                   Vector(0, height - camera.height), Vector(width - camera.width, height - camera.height)):
+        camera_entity.components[Position] = corner
+        check_viewport(session, state, console)
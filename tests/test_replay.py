@@ -0,0 +1,70 @@
+import json
+from tcod.event import KeyDown, KeySym, Modifier, Scancode
+
+from rhizome.game import ui_states
+from rhizome.game.components import Stats
+from rhizome.game.ui_manager import UIManager
+from rhizome.game.world import Session, new_level
+from rhizome.replay import Recorder, Recording, checksum, replay
+
+KEYS = [KeySym.SPACE] + [KeySym.d, KeySym.s, KeySym.a, KeySym.w, KeySym.d, KeySym.d, KeySym.SPACE] * 20
+
+
+def record(path, seed):
+    session = Session(seed)
+    recorder = Recorder(path, session, checkpoint_every=10)
+    ui = UIManager([ui_states.IntroScreen(title="Rhizome", session=session)], recorder=recorder)
+    for sym in KEYS:
+        if not ui.states:
+            break
+        ui.on_event(KeyDown(Scancode.UNKNOWN, sym, Modifier.NONE))
+    recorder.close()
+
+
+def test_same_seed_same_level():
+    first = checksum(new_level(Session(), seed=3))
+    assert checksum(new_level(Session(), seed=3)) == first
+    assert checksum(new_level(Session(), seed=4)) != first
+
+
+def test_replay_matches_recording(tmp_path):
+    path = tmp_path / "session.jsonl"
+    record(path, seed=11)
+    recording = Recording.load(path)
+    assert recording.seed == 11 and len(recording.checkpoints) > 0
+
+    result = replay(recording)
+    assert result.checked == len(recording.checkpoints)
+    assert result.mismatches == []
+
+
+def test_replay_reports_mismatch(tmp_path):
+    path = tmp_path / "session.jsonl"
+    record(path, seed=11)
+    lines = path.read_text().splitlines()
+    for i, line in enumerate(lines):
+        entry = json.loads(line)
+        if "checkpoint" in entry:
+            entry["checksum"] = "0" * 32
+            lines[i] = json.dumps(entry)
+            break
+    path.write_text("\n".join(lines) + "\n")
+    assert replay(Recording.load(path)).mismatches == [entry["checkpoint"]]
+
+
+def test_prefetched_level_matches_built_level():
+    prefetching, building = Session(5, prefetch=True), Session(5)
+    try:
+        new_level(prefetching)
+        new_level(building)
+        prefetching.player.components[Stats].health = building.player.components[Stats].health = 7
+        stats = prefetching.player.components[Stats]
+        _, future = prefetching._prefetched
+        prefetched = future.result()
+
+        assert new_level(prefetching, new_game=False) is prefetched
+        assert prefetching.player.components[Stats] is stats
+        new_level(building, new_game=False)
+        assert checksum(prefetching.world) == checksum(building.world)
+    finally:
+        prefetching.close()
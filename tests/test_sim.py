@@ -0,0 +1,94 @@
+import pytest
+from rhizome import sim
+from rhizome.game.components import KilledBy, Name, Position, Stats, Vector
+from rhizome.game.spatial import get_occupancy
+from rhizome.game.tags import Enemy, Solid
+from rhizome.game.world import Session, new_level
+from rhizome.replay import checksum
+
+
+@pytest.mark.parametrize("policy", [sim.RandomWalk(0), sim.Greedy(0), sim.Scripted("llj.")])
+def test_run_turns(policy):
+    result = sim.run(policy, turns=50)
+    assert result.turns == 50
+    assert result.turns_per_second > 0
+
+
+def test_run_games():
+    result = sim.run(sim.RandomWalk(0), turns=5000, games=1)
+    assert result.games == 1 or result.turns == 5000
+
+
+def test_scripted_moves():
+    policy = sim.Scripted("wd.")
+    moves = [policy(None, None) for _ in range(4)]
+    assert moves == [Vector(0,-1), Vector(1,0), Vector(0,0), Vector(0,-1)]
+    with pytest.raises(ValueError):
+        sim.Scripted("wq")
+    with pytest.raises(ValueError):
+        sim.Scripted("")
+
+
+def test_play_game_is_repeatable():
+    first = sim.play_game(sim.RandomWalk(1), seed=5, max_turns=300)
+    second = sim.play_game(sim.RandomWalk(1), seed=5, max_turns=300)
+    assert first == second
+    assert first.cause == "survived" or first.turns < 300
+
+
+def test_run_batch():
+    summaries = list(sim.run_batch(4, workers=2, policy="random", seed=3, max_turns=100))
+    assert len(summaries) == 4
+    assert len({summary.seed for summary in summaries}) == 4
+    totals = sim.BatchTotals()
+    for summary in summaries:
+        totals.add(summary)
+    assert totals.games == 4 and sum(totals.causes.values()) == 4
+
+
+
+def test_sessions_are_independent():
+    def start(seed):
+        session = Session(seed)
+        new_level(session)
+        return session, sim.RandomWalk(0)
+
+    def play_turn(session, policy):
+        if not sim.play_turn(session, policy):
+            new_level(session)
+
+    alone = []
+    for seed in (1, 2):
+        session, policy = start(seed)
+        for _ in range(40):
+            play_turn(session, policy)
+        alone.append(checksum(session.world))
+
+    games = [start(1), start(2)]
+    for _ in range(40):
+        for session, policy in games:
+            play_turn(session, policy)
+    assert [checksum(session.world) for session, _ in games] == alone
+
+
+def test_counts_only_the_players_kills():
+    session = Session(1)
+    world = new_level(session)
+    player = session.player
+    position = player.components[Position]
+    get_occupancy(world).walls[position.y, position.x + 1] = False
+    for entity in world.Q.all_of(components=[Position], tags=[Enemy]):
+        entity.clear()
+    enemies = []
+    for health, spot in ((1, Vector(1,0)), (0, Vector(0,2))):
+        enemy = world.new_entity()
+        enemy.tags |= {Enemy, Solid}
+        enemy.components[Position] = position + spot
+        enemy.components[Name] = "spider"
+        enemy.components[Stats] = Stats(health, 5, 0)
+        enemies.append(enemy)
+    # the other was killed by one of its own
+    enemies[1].components[KilledBy] = "beetle"
+
+    assert sim.play_counted_turn(session, sim.Scripted("d")) == (True, 1)
+    assert all(not enemy.components for enemy in enemies)
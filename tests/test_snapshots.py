@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from rhizome.game import snapshots
+from rhizome.game.components import Map
+from rhizome.game.world import Session, new_level
+from rhizome.replay import checksum
+from rhizome.sim import Scripted, play_turn
+
+
+def test_round_trip(tmp_path):
+    session = Session(3)
+    world = new_level(session)
+    path = tmp_path / "level.rhz"
+    snapshots.save(world, path)
+
+    snapshot = snapshots.read(path)
+    # views onto the read-only mapping, not copies
+    assert not snapshot.arrays["position"].flags.writeable
+    assert snapshot.arrays["position"].dtype == np.int16
+    assert np.array_equal(snapshot.map, world[None].components[Map])
+
+    loaded = snapshots.load(snapshot, session)
+    assert checksum(loaded) == checksum(world)
+
+
+def test_loaded_level_plays_the_same(tmp_path):
+    session = Session(8)
+    new_level(session)
+    policy = Scripted("llljjjhhhkkk.")
+    for _ in range(5):
+        play_turn(session, policy)
+    path = tmp_path / "level.rhz"
+    snapshots.save(session.world, path)
+
+    resumed, resumed_policy = Session(8), Scripted("llljjjhhhkkk.")
+    resumed_policy.turn = policy.turn
+    resumed.enter(snapshots.load(path, resumed))
+    for _ in range(20):
+        play_turn(session, policy)
+        play_turn(resumed, resumed_policy)
+        assert checksum(resumed.world) == checksum(session.world)
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "level.rhz"
+    path.write_bytes(b"not a snapshot" * 8)
+    with pytest.raises(ValueError):
+        snapshots.read(path)
@@ -0,0 +1,100 @@
+import numpy as np
+from tcod.ecs import Registry
+
+from rhizome.game.components import BoundingBox, Camera, Map, Position, Vector
+from rhizome.game.spatial import get_occupancy
+from rhizome.game.tags import Solid
+from rhizome.game.world import CONFIG, add_item, add_player
+
+
+def make_world(height=5, width=5):
+    world = Registry()
+    map = np.zeros((height, width), dtype=bool)
+    map[0, :] = True
+    world[None].components[Map] = map
+    return world
+
+
+def test_tracks_moves():
+    world = make_world()
+    player = add_player(world, Vector(1,1))
+    occupancy = get_occupancy(world)
+    assert occupancy.entity_at(Vector(1,1)) is player
+    assert occupancy.is_blocked(Vector(1,1))
+
+    player.components[Position] = Vector(2,1)
+    assert occupancy.entity_at(Vector(1,1)) is None
+    assert not occupancy.is_blocked(Vector(1,1))
+    assert occupancy.solid_at(Vector(2,1)) is player
+
+    player.clear()
+    assert occupancy.entity_at(Vector(2,1)) is None
+    assert len(occupancy) == 0
+
+
+def test_walls_block():
+    world = make_world()
+    occupancy = get_occupancy(world)
+    assert occupancy.is_blocked(Vector(1,0))
+    assert occupancy.is_blocked(Vector(-1,2))
+    assert occupancy.is_blocked(Vector(2,5))
+    assert not occupancy.is_blocked(Vector(2,2))
+
+
+def test_stacked_entities():
+    world = make_world()
+    item = add_item(world, Vector(2,2), graphic=None, tags=set())
+    player = add_player(world, Vector(2,2))
+    occupancy = get_occupancy(world)
+    assert occupancy.solid_at(Vector(2,2)) is player
+    assert set(occupancy.entities_at(Vector(2,2))) == {item, player}
+
+    player.components[Position] = Vector(3,3)
+    assert occupancy.solid_at(Vector(2,2)) is None
+    assert occupancy.entity_at(Vector(2,2)) is item
+
+
+def test_range_queries():
+    world = make_world(10, 10)
+    near = add_item(world, Vector(4,4), graphic=None, tags={Solid})
+    far = add_item(world, Vector(8,8), graphic=None, tags=set())
+    occupancy = get_occupancy(world)
+    assert occupancy.in_box(BoundingBox(Vector(0,0), Vector(5,5))) == [near]
+    assert set(occupancy.in_box(BoundingBox(Vector(-3,-3), Vector(20,20)))) == {near, far}
+    assert occupancy.in_radius(Vector(5,5), 2) == [near]
+    assert set(occupancy.in_radius(Vector(6,6), 3)) == {near, far}
+
+
+def test_indexes_entities_placed_before_the_map():
+    world = Registry()
+    rock = world.new_entity()
+    rock.tags.add(Solid)
+    rock.components[Position] = Vector(2,2)
+    camera = world.new_entity()
+    camera.components[Camera] = CONFIG.camera
+    camera.components[Position] = Vector(0,0)
+    world[None].components[Map] = np.zeros((5, 5), dtype=bool)
+    occupancy = get_occupancy(world)
+    assert occupancy.entities_at(Vector(2,2)) == [rock]
+    assert occupancy.solid_at(Vector(2,2)) is rock
+    assert occupancy.in_box(BoundingBox(Vector(0,0), Vector(5,5))) == [rock]
+
+
+def test_follows_the_solid_tag():
+    world = make_world()
+    rock = world.new_entity()
+    rock.components[Position] = Vector(2,2)
+    item = add_item(world, Vector(2,2), graphic=None, tags=set())
+    assert get_occupancy(world).solid_at(Vector(2,2)) is None
+
+    rock.tags.add(Solid)
+    occupancy = get_occupancy(world)
+    assert occupancy.solid_at(Vector(2,2)) is rock
+    assert occupancy.entity_at(Vector(2,2)) is rock
+    assert occupancy.is_blocked(Vector(2,2))
+
+    rock.tags.discard(Solid)
+    occupancy = get_occupancy(world)
+    assert occupancy.solid_at(Vector(2,2)) is None
+    assert not occupancy.is_blocked(Vector(2,2))
+    assert set(occupancy.entities_at(Vector(2,2))) == {rock, item}
@@ -0,0 +1,71 @@
+from tcod.ecs import Registry
+from rhizome.game.components import Stats
+from rhizome.game.stats import get_stats_store
+
+
+def spawn(world, count):
+    entities = []
+    for i in range(count):
+        entity = world.new_entity()
+        entity.components[Stats] = Stats(10 + i, 20, 2, (0, 3), toughness=1)
+        entities.append(entity)
+    return entities
+
+
+def test_views_read_and_write_the_store():
+    world = Registry()
+    entities = spawn(world, 5)
+    store = get_stats_store(world)
+    assert len(store) == 5
+    stats = entities[2].components[Stats]
+    stats.health -= 4
+    assert store.health[store.rows[entities[2]]] == 8
+    store.strength[:] += 1
+    assert stats.strength == 3 and isinstance(stats.strength, int)
+    assert stats.damage_range == (0, 3)
+
+
+def test_removing_keeps_other_views_and_detaches():
+    world = Registry()
+    entities = spawn(world, 4)
+    store = get_stats_store(world)
+    removed = entities[1].components[Stats]
+    entities[1].clear()
+    assert len(store) == 3
+    assert removed.health == 11
+    removed.health = 1
+    for i, entity in enumerate(entities):
+        if i != 1:
+            assert entity.components[Stats].health == 10 + i
+
+
+def test_stats_move_with_the_entity_between_levels():
+    first, second = Registry(), Registry()
+    player, = spawn(first, 1)
+    stats = player.components[Stats]
+    other = second.new_entity()
+    other.components[Stats] = stats
+    assert len(get_stats_store(first)) == 0 and len(get_stats_store(second)) == 1
+    stats.health = 3
+    assert get_stats_store(second).health[0] == 3
+
+
+def test_sharing_stats_on_one_level():
+    world = Registry()
+    first, second, third = spawn(world, 3)
+    store = get_stats_store(world)
+    third.components[Stats] = first.components[Stats]
+    assert len(store) == 2 and set(store.entities) == {second, third}
+    assert [store.rows[entity] for entity in store.entities] == [0, 1]
+    assert third.components[Stats].health == 10
+    assert second.components[Stats].health == 11
+    third.components[Stats].health = 4
+    assert store.health[store.rows[third]] == 4
+
+
+def test_dead():
+    world = Registry()
+    entities = spawn(world, 3)
+    store = get_stats_store(world)
+    store.health[:] = [0, 5, -2]
+    assert store.dead() == [entities[0], entities[2]]
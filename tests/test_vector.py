@@ -0,0 +1,39 @@
+import dataclasses
+import pickle
+import pytest
+from rhizome.game.components import OFFSETS, Vector
+
+
+def test_arithmetic():
+    v = Vector(3, 4)
+    assert v + Vector(1, 2) == Vector(4, 6)
+    assert v + (1, 2) == Vector(4, 6)
+    assert v + 1 == Vector(4, 5)
+    assert v - Vector(1, 2) == Vector(2, 2)
+    assert v - 1 == Vector(2, 3)
+    assert v * 2 == Vector(6, 8)
+    assert v // (2, 3) == Vector(1, 1)
+
+
+def test_clamp():
+    assert Vector(-5, 20).clamp(Vector(0, 0), Vector(10, 10)) == Vector(0, 9)
+    assert Vector(4, 5).clamp(Vector(0, 0), Vector(10, 10)) == Vector(4, 5)
+
+
+def test_frozen_and_hashable():
+    v = Vector(3, 4)
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        v.x = 1
+    assert hash(v) == hash(Vector(3, 4)) == hash(v)
+    assert {v: 1}[Vector(3, 4)] == 1
+    assert v != (3, 4)
+    assert pickle.loads(pickle.dumps(v)) == v
+
+
+def test_offsets_are_interned():
+    assert Vector.offset(1, 0) is OFFSETS[(1, 0)] is Vector.offset(1, 0)
+    assert Vector.offset(0, 0) is OFFSETS[(0, 0)]
+    assert Vector.offset(2, 0) == Vector(2, 0)
+    match Vector.offset(0, -1):
+        case Vector(0, y):
+            assert y == -1
@@ -0,0 +1,39 @@
+from rhizome.game.components import Graphic, Name, Stats, Trait
+from rhizome.game.tags import Enemy
+from rhizome.game.world import CONFIG, Session, TRAIT_BONUSES, get_archetypes, new_level, scale, settings
+
+
+def test_archetype_stats_match_trait_then_scale():
+    session = Session(0)
+    world = new_level(session)
+    archetypes = get_archetypes(world, 2)
+    assert get_archetypes(world, 2) is archetypes
+    for kind, archetype in archetypes.items():
+        enemy_settings = settings["enemy"][kind]
+        assert archetype.graphic is CONFIG.enemies[kind].graphic
+        for trait, stats in archetype.stats.items():
+            expected = Stats(enemy_settings["health"], enemy_settings["health"], enemy_settings["strength"],
+                             tuple(enemy_settings.get("damage_range", (0, 0))))
+            for stat, bonus in TRAIT_BONUSES.get(trait, {}).items():
+                if stat == "damage_range":
+                    low, high = expected.damage_range
+                    expected.damage_range = (low, high + bonus)
+                else:
+                    setattr(expected, stat, getattr(expected, stat) + bonus)
+            scale(expected, 2)
+            assert stats == expected
+
+
+def test_spawned_enemies_share_graphic_not_stats():
+    session = Session(0)
+    world = new_level(session)
+    enemies = list(world.Q.all_of(components=[Stats], tags=[Enemy]))
+    assert len(enemies) == 5 * len(settings["enemy"])
+    by_kind = {}
+    for enemy in enemies:
+        by_kind.setdefault(enemy.components[Name], []).append(enemy)
+    assert len(by_kind) == len(settings["enemy"])
+    first, second = next(iter(by_kind.values()))[:2]
+    assert first.components[Graphic] is second.components[Graphic]
+    assert first.components[Stats] is not second.components[Stats]
+    assert all(enemy.components[Trait] in (None, *Trait) for enemy in enemies)